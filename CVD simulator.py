@@ -1,25 +1,36 @@
+import os
+import threading
+from functools import lru_cache
+
 import cv2
 import numpy as np
-import matplotlib.pyplot as plt
 from PIL import Image
-import ipywidgets as widgets
-from IPython.display import display
 
-# Define CVD transformation matrices
+# matplotlib and ipywidgets are imported by the functions that draw, so the simulation
+# functions can be imported without a notebook environment.
+from cvd_transforms import simulation_matrix
+from result_cache import ResultCache, image_key, make_key, resolve_cache
+
+DEFAULT_IMAGE_PATH = r"D:\MIT FULL NOTES\MIT PROJECT\MIT PROJECT MATERIALS\Research\CIE COLOR SPACE\own pictures\Project pictures\1000_F_953211589_iL6dkUpvwRCgobq2ezIW3xCjgjbsboI1.jpg"
+PREVIEW_SIZE = 640  # Longest side of the pyramid level used while sliders move
+RENDER_DELAY = 0.15  # Seconds without slider changes before a preview is rendered
+
+# CVD simulation matrices (severity 1.0) from the shared transform library
 cvd_matrices = {
-    'Protanopia': np.array([[0.56667, 0.43333, 0.0],
-                            [0.55833, 0.44167, 0.0],
-                            [0.0, 0.24167, 0.75833]]),
-    'Deuteranopia': np.array([[0.625, 0.375, 0.0],
-                              [0.7, 0.3, 0.0],
-                              [0.0, 0.3, 0.7]]),
-    'Tritanopia': np.array([[0.95, 0.05, 0.0],
-                            [0.0, 0.43333, 0.56667],
-                            [0.0, 0.475, 0.525]]),
+    'Protanopia': simulation_matrix('protan'),
+    'Deuteranopia': simulation_matrix('deutan'),
+    'Tritanopia': simulation_matrix('tritan'),
 }
 
-# Function to apply CVD filter using LAB adjustments
-def apply_cvd_lab_simulation(image, cvd_matrix, brightness=0, contrast=1, hue_shift=0):
+# Function to apply CVD filter using LAB adjustments. With `cache` (a result_cache.ResultCache,
+# or True for the shared one) results are looked up by image content and parameters first.
+def apply_cvd_lab_simulation(image, cvd_matrix, brightness=0, contrast=1, hue_shift=0, cache=None):
+    if cache:
+        key = make_key("cvd_lab_simulation", image_key(image), np.asarray(cvd_matrix, dtype=np.float64),
+                       brightness, contrast, hue_shift)
+        return resolve_cache(cache).get_or_compute(
+            key, lambda: apply_cvd_lab_simulation(image, cvd_matrix, brightness, contrast, hue_shift))
+
     # Convert the image from RGB to LAB
     img_lab = cv2.cvtColor(image, cv2.COLOR_RGB2LAB).astype(np.float32)
     
@@ -50,20 +61,129 @@ def apply_cvd_lab_simulation(image, cvd_matrix, brightness=0, contrast=1, hue_sh
     final_image = cv2.cvtColor(img_lab_final, cv2.COLOR_LAB2RGB)
     return final_image
 
-# Function to display original and simulated images with widget adjustments
-def display_cvd_simulations_lab(image_path, brightness=0, contrast=1, hue_shift=0):
+# Load an image once and keep a pyramid of halved copies for previews. Only the current image is
+# kept, a full-resolution level is too large to hold several of.
+@lru_cache(maxsize=1)
+def _load_pyramid(image_path, mtime):
+    level = np.array(Image.open(image_path).convert("RGB"))
+    level.setflags(write=False)
+    pyramid = [level]
+    while max(level.shape[:2]) > 1 and max(level.shape[:2]) // 2 >= 64:
+        level = cv2.resize(level, (max(1, level.shape[1] // 2), max(1, level.shape[0] // 2)),
+                           interpolation=cv2.INTER_AREA)
+        level.setflags(write=False)
+        pyramid.append(level)
+    return tuple(pyramid)
+
+def load_image_level(image_path, max_side=None):
+    """Return the largest pyramid level whose longest side fits `max_side` (full resolution if None)."""
+    pyramid = _load_pyramid(image_path, os.path.getmtime(image_path))
+    if max_side is None:
+        return pyramid[0]
+    for level in pyramid:
+        if max(level.shape[:2]) <= max_side:
+            return level
+    return pyramid[-1]
+
+# Cache rendered previews, so returning to earlier slider values costs nothing. Full-resolution
+# renders are not kept here but in the size-bounded, memory-only `full_render_cache`.
+full_render_cache = ResultCache(disk_bytes=0)
+
+@lru_cache(maxsize=256)
+def _render_cached(image_path, mtime, max_side, cvd_type, matrix_bytes, brightness, contrast, hue_shift):
+    image = load_image_level(image_path, max_side)
+    matrix = np.frombuffer(matrix_bytes, dtype=np.float64).reshape(3, 3)
+    rendered = apply_cvd_lab_simulation(image, matrix, brightness, contrast, hue_shift)
+    rendered.setflags(write=False)
+    return rendered
+
+def render_cvd_simulation(image_path, cvd_type, brightness=0, contrast=1, hue_shift=0, max_side=PREVIEW_SIZE,
+                          severity=1.0, cache=None):
+    """
+    Render one CVD simulation through the render cache.
+
+    Parameters:
+        image_path (str): Image file.
+        cvd_type (str): Key of `cvd_matrices`.
+        brightness, contrast, hue_shift: Adjustments passed to `apply_cvd_lab_simulation()`.
+        max_side (int, optional): Render from the pyramid level that fits this size,
+            None renders at full resolution.
+        severity (float): Severity of the deficiency, from 0 (normal vision) to 1.
+        cache (ResultCache or bool, optional): Cache for full-resolution renders; defaults to the
+            memory-only `full_render_cache`, True uses the shared disk-backed cache.
+
+    Returns:
+        numpy array: Read-only RGB image.
+    """
+    if cvd_type not in cvd_matrices:
+        raise ValueError("Invalid CVD type.")
+    matrix = np.ascontiguousarray(simulation_matrix(cvd_type, severity), dtype=np.float64)
+    if max_side is None:
+        return apply_cvd_lab_simulation(load_image_level(image_path), matrix, brightness, contrast, hue_shift,
+                                        cache=cache or full_render_cache)
+    return _render_cached(image_path, os.path.getmtime(image_path), max_side, cvd_type, matrix.tobytes(),
+                          brightness, contrast, hue_shift)
+
+def _render_all(image_path, max_side, matrices_bytes, brightness, contrast, hue_shift):
+    from contact_sheet import apply_lab_simulations
+
+    image = load_image_level(image_path, max_side)
+    matrices = np.frombuffer(matrices_bytes, dtype=np.float64).reshape(-1, 3, 3)
+    rendered = [np.empty(image.shape[:2] + (3,), dtype=np.uint8) for _ in matrices]
+    apply_lab_simulations(image, list(matrices), rendered, brightness, contrast, hue_shift)
+    for image in rendered:
+        image.setflags(write=False)
+    return tuple(rendered)
+
+@lru_cache(maxsize=64)
+def _render_all_cached(image_path, mtime, max_side, matrices_bytes, brightness, contrast, hue_shift):
+    return _render_all(image_path, max_side, matrices_bytes, brightness, contrast, hue_shift)
+
+def render_cvd_simulations(image_path, brightness=0, contrast=1, hue_shift=0, max_side=None, severity=1.0):
+    """
+    Render every simulation of `cvd_matrices` in a single pass over the image.
+
+    The LAB brightness/contrast work is shared and the three matrices are applied with one
+    stacked matmul (see contact_sheet.py); each result equals `render_cvd_simulation()`.
+
+    Returns:
+        dict: CVD type -> read-only RGB image.
+    """
+    matrices = np.ascontiguousarray([simulation_matrix(cvd_type, severity) for cvd_type in cvd_matrices],
+                                    dtype=np.float64)
+    if max_side is None:
+        # Full resolution is rendered every time, the previews are the ones worth keeping
+        rendered = _render_all(image_path, max_side, matrices.tobytes(), brightness, contrast, hue_shift)
+    else:
+        rendered = _render_all_cached(image_path, os.path.getmtime(image_path), max_side, matrices.tobytes(),
+                                      brightness, contrast, hue_shift)
+    return dict(zip(cvd_matrices, rendered))
+
+# Function to display original and simulated images with widget adjustments.
+# With `save_path` the comparison sheet is written as an image file instead, without matplotlib.
+def display_cvd_simulations_lab(image_path, brightness=0, contrast=1, hue_shift=0, max_side=None, severity=1.0,
+                                save_path=None):
+    if save_path:
+        from contact_sheet import make_contact_sheet
+
+        variants = [(cvd_type, simulation_matrix(cvd_type, severity)) for cvd_type in cvd_matrices]
+        sheet = make_contact_sheet(load_image_level(image_path, max_side), variants, "lab",
+                                   brightness=brightness, contrast=contrast, hue_shift=hue_shift)
+        Image.fromarray(sheet).save(save_path)
+        return save_path
+
     # Load original image
-    original_img = Image.open(image_path).convert("RGB")
-    original_img = np.array(original_img)
+    original_img = load_image_level(image_path, max_side)
+    simulations = render_cvd_simulations(image_path, brightness, contrast, hue_shift, max_side, severity)
     
     # Plot original and each CVD simulation
+    import matplotlib.pyplot as plt
     fig, axes = plt.subplots(1, 4, figsize=(20, 5))
     axes[0].imshow(original_img)
     axes[0].set_title("Original")
     
-    # Apply and display each CVD filter with adjustments
-    for i, (cvd_type, matrix) in enumerate(cvd_matrices.items(), start=1):
-        cvd_img = apply_cvd_lab_simulation(original_img, matrix, brightness, contrast, hue_shift)
+    # Display each CVD filter with adjustments
+    for i, (cvd_type, cvd_img) in enumerate(simulations.items(), start=1):
         axes[i].imshow(cvd_img)
         axes[i].set_title(f"{cvd_type}\nBrightness: {brightness}, Contrast: {contrast}, Hue Shift: {hue_shift}")
     
@@ -73,51 +193,113 @@ def display_cvd_simulations_lab(image_path, brightness=0, contrast=1, hue_shift=
     
     plt.show()
 
-# Primary sliders for brightness, contrast, and hue shift
-brightness_slider = widgets.IntSlider(value=0, min=-100, max=100, step=5, description="Brightness")
-contrast_slider = widgets.FloatSlider(value=1.0, min=0.5, max=2.0, step=0.1, description="Contrast")
-hue_shift_slider = widgets.IntSlider(value=0, min=-50, max=50, step=5, description="Hue Shift")
-
-# Range sliders to control the min and max for the main sliders
-brightness_range = widgets.IntRangeSlider(value=[-100, 100], min=-200, max=200, step=10, description="Brightness Range")
-contrast_range = widgets.FloatRangeSlider(value=[0.5, 2.0], min=0.1, max=3.0, step=0.1, description="Contrast Range")
-hue_shift_range = widgets.IntRangeSlider(value=[-50, 50], min=-100, max=100, step=5, description="Hue Shift Range")
-
-# Update functions to dynamically change slider ranges
-def update_brightness_range(change):
-    brightness_slider.min = brightness_range.value[0]
-    brightness_slider.max = brightness_range.value[1]
-
-def update_contrast_range(change):
-    contrast_slider.min = contrast_range.value[0]
-    contrast_slider.max = contrast_range.value[1]
-
-def update_hue_shift_range(change):
-    hue_shift_slider.min = hue_shift_range.value[0]
-    hue_shift_slider.max = hue_shift_range.value[1]
-
-# Observe range changes to update main sliders
-brightness_range.observe(update_brightness_range, 'value')
-contrast_range.observe(update_contrast_range, 'value')
-hue_shift_range.observe(update_hue_shift_range, 'value')
-
-# Interactive display update function
-def update_display(brightness, contrast, hue_shift):
-    display_cvd_simulations_lab(r"D:\MIT FULL NOTES\MIT PROJECT\MIT PROJECT MATERIALS\Research\CIE COLOR SPACE\own pictures\Project pictures\1000_F_953211589_iL6dkUpvwRCgobq2ezIW3xCjgjbsboI1.jpg", brightness, contrast, hue_shift)
-
-# Display layout with main sliders and range controls
-ui = widgets.VBox([
-    brightness_range, brightness_slider,
-    contrast_range, contrast_slider,
-    hue_shift_range, hue_shift_slider
-])
-
-# Output interactive display
-out = widgets.interactive_output(update_display, {
-    'brightness': brightness_slider, 
-    'contrast': contrast_slider, 
-    'hue_shift': hue_shift_slider
-})
-
-# Display UI and output
-display(ui, out)
+class DebouncedRenderer:
+    """
+    Run `render(args, is_current)` once the requests stop for `delay` seconds.
+
+    Every new request supersedes the previous one; `is_current()` lets a render in progress
+    notice that it is stale and stop early.
+    """
+
+    def __init__(self, render, delay=RENDER_DELAY):
+        self.render = render
+        self.delay = delay
+        self.generation = 0
+        self._timer = None
+        self._lock = threading.Lock()
+
+    def request(self, *args):
+        with self._lock:
+            self.generation += 1
+            generation = self.generation
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = threading.Timer(self.delay, self._run, (generation, args))
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _run(self, generation, args):
+        self.render(args, lambda: generation == self.generation)
+
+def _png_bytes(image):
+    ok, encoded = cv2.imencode(".png", cv2.cvtColor(np.asarray(image), cv2.COLOR_RGB2BGR))
+    return encoded.tobytes()
+
+def build_ui(image_path=DEFAULT_IMAGE_PATH):
+    """Build the slider UI; previews render from the pyramid, 'Full resolution' renders on demand."""
+    import ipywidgets as widgets
+
+    # Primary sliders for brightness, contrast, and hue shift
+    brightness_slider = widgets.IntSlider(value=0, min=-100, max=100, step=5, description="Brightness")
+    contrast_slider = widgets.FloatSlider(value=1.0, min=0.5, max=2.0, step=0.1, description="Contrast")
+    hue_shift_slider = widgets.IntSlider(value=0, min=-50, max=50, step=5, description="Hue Shift")
+    severity_slider = widgets.FloatSlider(value=1.0, min=0.0, max=1.0, step=0.1, description="Severity")
+
+    # Range sliders to control the min and max for the main sliders
+    brightness_range = widgets.IntRangeSlider(value=[-100, 100], min=-200, max=200, step=10, description="Brightness Range")
+    contrast_range = widgets.FloatRangeSlider(value=[0.5, 2.0], min=0.1, max=3.0, step=0.1, description="Contrast Range")
+    hue_shift_range = widgets.IntRangeSlider(value=[-50, 50], min=-100, max=100, step=5, description="Hue Shift Range")
+
+    # Update functions to dynamically change slider ranges
+    def update_brightness_range(change):
+        brightness_slider.min = brightness_range.value[0]
+        brightness_slider.max = brightness_range.value[1]
+
+    def update_contrast_range(change):
+        contrast_slider.min = contrast_range.value[0]
+        contrast_slider.max = contrast_range.value[1]
+
+    def update_hue_shift_range(change):
+        hue_shift_slider.min = hue_shift_range.value[0]
+        hue_shift_slider.max = hue_shift_range.value[1]
+
+    # Observe range changes to update main sliders
+    brightness_range.observe(update_brightness_range, 'value')
+    contrast_range.observe(update_contrast_range, 'value')
+    hue_shift_range.observe(update_hue_shift_range, 'value')
+
+    # One image panel per simulation, updated in place instead of drawing a new figure
+    panels = [widgets.Image(format="png", width=300) for _ in range(len(cvd_matrices) + 1)]
+    titles = [widgets.Label("Original")] + [widgets.Label(cvd_type) for cvd_type in cvd_matrices]
+    status = widgets.Label()
+    full_button = widgets.Button(description="Full resolution")
+
+    def render(args, is_current):
+        brightness, contrast, hue_shift, severity, max_side = args
+        panels[0].value = _png_bytes(load_image_level(image_path, max_side))
+        for panel, title, cvd_type in zip(panels[1:], titles[1:], cvd_matrices):
+            if not is_current():
+                return  # A newer slider value is waiting, drop this render
+            panel.value = _png_bytes(render_cvd_simulation(image_path, cvd_type, brightness, contrast,
+                                                           hue_shift, max_side, severity))
+            title.value = f"{cvd_type}  Brightness: {brightness}, Contrast: {contrast}, Hue Shift: {hue_shift}"
+        status.value = "Full resolution" if max_side is None else f"Preview ({PREVIEW_SIZE}px)"
+
+    renderer = DebouncedRenderer(render)
+
+    def on_change(change=None, max_side=PREVIEW_SIZE):
+        status.value = "Rendering..."
+        renderer.request(brightness_slider.value, contrast_slider.value, hue_shift_slider.value,
+                         severity_slider.value, max_side)
+
+    for slider in (brightness_slider, contrast_slider, hue_shift_slider, severity_slider):
+        slider.observe(on_change, 'value')
+    full_button.on_click(lambda _: on_change(max_side=None))
+    on_change()
+
+    # Display layout with main sliders and range controls
+    controls = widgets.VBox([
+        brightness_range, brightness_slider,
+        contrast_range, contrast_slider,
+        hue_shift_range, hue_shift_slider,
+        severity_slider,
+        widgets.HBox([full_button, status]),
+    ])
+    images = widgets.HBox([widgets.VBox([title, panel]) for title, panel in zip(titles, panels)])
+    return widgets.VBox([controls, images])
+
+if __name__ == "__main__":
+    from IPython.display import display
+
+    # Display UI and output
+    display(build_ui())
@@ -3,14 +3,23 @@
 #  Extracted cluster palettes are a visually organized collection of key colors from an image,
 #  created through automated processes that identify and group similar colors effectively.
 
-from sklearn.cluster import KMeans
+# sklearn, matplotlib and tkinter are imported where they are used, so importing this module
+# for its palette functions stays fast.
 from PIL import Image
 import numpy as np
-import matplotlib.pyplot as plt
+import argparse
 import colorsys
 import random
-import tkinter as tk
-from tkinter import filedialog
+import time
+import tracemalloc
+
+from image_decode import decode_image
+from instrumentation import add_trace_arguments, enable_from_args, tracer
+from octree_quantizer import octree_palette
+from result_cache import file_key, make_key, resolve_cache
+
+PALETTE_ENGINES = ("kmeans", "octree")
+KMEANS_SIZE = (300, 300)  # The KMeans engine clusters the image resized to this size
 
 def rgb_to_hsv(color):
     """Convert an RGB color to HSV."""
@@ -24,16 +33,13 @@ def hsv_to_rgb(color):
     r, g, b = colorsys.hsv_to_rgb(h, s, v)
     return [int(r * 255), int(g * 255), int(b * 255)]  # Convert back to [0, 255]
 
-def generate_random_color():
+def generate_random_color(rng=random):
     """Generate a random RGB color."""
-    return [random.randint(0, 255) for _ in range(3)]
+    return [rng.randint(0, 255) for _ in range(3)]
 
-def extract_color_palettes(image_path, n_colors, grid_rows, grid_cols, max_iterations=10):
-    # Load and preprocess the image
-    image = Image.open(image_path).convert("RGB")  # Ensure the image is in RGB format
-    image = image.resize((300, 300))  # Resize for efficiency
-    image_np = np.array(image).reshape((-1, 3))  # Reshape to (pixels, RGB)
-    
+def kmeans_colors(image_np, n_colors, max_iterations=10):
+    """Collect up to `n_colors` colors with repeated KMeans fits on an (N, 3) pixel list."""
+    from sklearn.cluster import KMeans
     # Prepare to collect all colors
     all_colors = []
     
@@ -54,54 +60,165 @@ def extract_color_palettes(image_path, n_colors, grid_rows, grid_cols, max_itera
         if len(image_np) < 1:  # Break if no pixels remain
             break
 
-    # Ensure at least n_colors by repeating or padding
-    while len(all_colors) < n_colors:
-        all_colors.append([255, 255, 255])  # Add white as padding if necessary
+    return all_colors
+
+def extract_palette_colors(image, n_colors, max_iterations=10, engine="kmeans"):
+    """
+    Extract the raw palette colors of a PIL image with the selected engine.
+
+    Parameters:
+        image (PIL Image): RGB image.
+        n_colors (int): Number of colors wanted.
+        max_iterations (int): Maximum number of KMeans rounds ('kmeans' engine only).
+        engine (str): 'kmeans' clusters a KMEANS_SIZE resize of the image, 'octree' quantizes the
+            full-resolution color histogram and is deterministic.
+
+    Returns:
+        list: RGB colors as lists of ints; `n_colors` of them unless the image has fewer distinct
+            colors (or, for 'kmeans', runs out of pixels far enough from the colors already found).
+    """
+    if engine == "kmeans":
+        image = image.resize(KMEANS_SIZE)  # Resize for efficiency, free if decoded at that size
+        image_np = np.array(image).reshape((-1, 3))  # Reshape to (pixels, RGB)
+        return kmeans_colors(image_np, n_colors, max_iterations)
+    elif engine == "octree":
+        palette, _ = octree_palette(np.asarray(image), n_colors)
+        return palette.astype(int).tolist()
+    raise ValueError("Invalid palette engine.")
+
+def extract_color_palettes(image_path, n_colors, grid_rows, grid_cols, max_iterations=10, engine="kmeans", show=True,
+                           cache=None):
+    """
+    Extract a palette of `n_colors` colors grouped by hue into a grid_rows x grid_cols grid.
+
+    Returns the (grid_rows, grid_cols, 3) array of RGB colors; the matplotlib figure is only
+    drawn when `show` is True. With `cache` (a result_cache.ResultCache, or True for the shared
+    one) the grid is looked up by file content and settings before anything is decoded.
+
+    The grid is only padded with (seeded) random colors when the engine returns fewer than
+    `n_colors` colors, i.e. when the image has fewer distinct colors, and to replace near-white
+    entries, which the grid leaves out.
+    """
+    # KMeans only sees KMEANS_SIZE pixels, so JPEGs are decoded directly at reduced scale
+    decode_size = KMEANS_SIZE if engine == "kmeans" else None
+    if cache:
+        key = make_key("color_palettes", file_key(image_path), n_colors, grid_rows, grid_cols, max_iterations, engine,
+                       decode_size)
+        grouped_rgb_colors = resolve_cache(cache).get_or_compute(
+            key, lambda: extract_color_palettes(image_path, n_colors, grid_rows, grid_cols, max_iterations, engine,
+                                                show=False))
+        if show:
+            show_palette_grid(grouped_rgb_colors)
+        return grouped_rgb_colors
+
+    # Load and preprocess the image
+    with tracer.stage("decode") as stage:
+        image = decode_image(image_path, decode_size, fit=False)  # RGB, reduced for KMeans
+        stage.add_pixels(image.width * image.height)
+    with tracer.stage(f"quantize[{engine}]", pixels=image.width * image.height):
+        all_colors = extract_palette_colors(image, n_colors, max_iterations, engine)
+    rng = random.Random(42)  # Seeded so the same image always gives the same palette
+
     all_colors = all_colors[:n_colors]  # Trim excess colors
 
-    # Remove white colors (close to [255, 255, 255]) and replace with random colors
+    # Remove white colors (close to [255, 255, 255]); they and any colors the image is short of
+    # are replaced with random colors below
     all_colors = [color for color in all_colors if not (color[0] > 240 and color[1] > 240 and color[2] > 240)]
     
     while len(all_colors) < n_colors:
-        all_colors.append(generate_random_color())  # Replace with a new random color
-
-    # Sort colors based on their hue and saturation in HSV color space for better visual grouping
-    all_colors_hsv = [rgb_to_hsv(color) for color in all_colors]
-    
-    # Sort primarily by hue and secondarily by saturation for better grouping of similar colors
-    sorted_colors_hsv = sorted(all_colors_hsv, key=lambda x: (x[0], x[1]))  
-    sorted_rgb_colors = [hsv_to_rgb(color) for color in sorted_colors_hsv]
+        all_colors.append(generate_random_color(rng))  # Replace with a new random color
 
-    # Reshape sorted colors into a grid for vertical grouping (columns represent similar hues)
-    grouped_rgb_colors = np.array(sorted_rgb_colors).reshape(grid_cols, grid_rows, -1).transpose(1, 0, 2)
+    with tracer.stage("group"):
+        # Sort colors based on their hue and saturation in HSV color space for better visual grouping
+        all_colors_hsv = [rgb_to_hsv(color) for color in all_colors]
+        
+        # Sort primarily by hue and secondarily by saturation for better grouping of similar colors
+        sorted_colors_hsv = sorted(all_colors_hsv, key=lambda x: (x[0], x[1]))  
+        sorted_rgb_colors = [hsv_to_rgb(color) for color in sorted_colors_hsv]
 
-    # Create the grid for the palette
-    fig, ax = plt.subplots(grid_rows, grid_cols, figsize=(14, 7))
-    fig.suptitle("Extracted Color Palettes", fontsize=16)
+        # Reshape sorted colors into a grid for vertical grouping (columns represent similar hues)
+        grouped_rgb_colors = np.array(sorted_rgb_colors).reshape(grid_cols, grid_rows, -1).transpose(1, 0, 2)
+    if show:
+        show_palette_grid(grouped_rgb_colors)
+    return grouped_rgb_colors
 
-    for i in range(grid_rows):
-        for j in range(grid_cols):
-            ax[i][j].axis("off")
-            color = grouped_rgb_colors[i][j] / 255.0  # Normalize RGB for display
-            ax[i][j].imshow([[color]])  # Pass normalized RGB as a 2D array
+def show_palette_grid(grouped_rgb_colors):
+    """Plot a (grid_rows, grid_cols, 3) palette grid with matplotlib."""
+    grid_rows, grid_cols = grouped_rgb_colors.shape[:2]
 
-    plt.tight_layout()
+    # Create the grid for the palette
+    import matplotlib.pyplot as plt
+    with tracer.stage("render"):
+        fig, ax = plt.subplots(grid_rows, grid_cols, figsize=(14, 7))
+        fig.suptitle("Extracted Color Palettes", fontsize=16)
+
+        for i in range(grid_rows):
+            for j in range(grid_cols):
+                ax[i][j].axis("off")
+                color = grouped_rgb_colors[i][j] / 255.0  # Normalize RGB for display
+                ax[i][j].imshow([[color]])  # Pass normalized RGB as a 2D array
+
+        plt.tight_layout()
+    if tracer.enabled:
+        fig.text(0.01, 0.01, "   ".join(tracer.summary_lines()), fontsize=8, family="monospace")
     plt.show()
 
+def compare_engines(image_path, n_colors=98, max_iterations=10):
+    """
+    Time each palette engine on one image and record its peak traced memory.
+
+    Returns:
+        list of dict: engine, image size, number of colors, seconds and peak MB.
+    """
+    image = Image.open(image_path).convert("RGB")
+    results = []
+    for engine in PALETTE_ENGINES:
+        owns_tracing = not tracemalloc.is_tracing()  # Leave --trace-memory tracing running
+        if owns_tracing:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        start = time.perf_counter()
+        colors = extract_palette_colors(image, n_colors, max_iterations, engine)
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        if owns_tracing:
+            tracemalloc.stop()
+        results.append({"engine": engine, "size": image.size, "colors": len(colors),
+                        "seconds": elapsed, "peak_mb": peak / 1e6})
+    return results
+
 def main():
-    root = tk.Tk()
-    root.withdraw()  # Hide the root window
-    
-    # Prompt user to select an image file
-    image_path = filedialog.askopenfilename(title="Select an Image", filetypes=[("Image Files", "*.png;*.jpg;*.jpeg;*.bmp;*.gif")])
+    parser = argparse.ArgumentParser(description="Extracted cluster color palette generator.")
+    parser.add_argument("image", nargs="?", help="Image to use (a file dialog opens when omitted)")
+    parser.add_argument("--engine", choices=PALETTE_ENGINES, default="kmeans", help="Palette engine")
+    parser.add_argument("--benchmark", action="store_true", help="Compare the engines instead of plotting")
+    parser.add_argument("--cache", action="store_true", help="Reuse palettes of identical images through the shared result cache")
+    add_trace_arguments(parser)
+    args = parser.parse_args()
+    enable_from_args(args)
+
+    image_path = args.image
+    if not image_path:
+        import tkinter as tk
+        from tkinter import filedialog
+        root = tk.Tk()
+        root.withdraw()  # Hide the root window
+
+        # Prompt user to select an image file
+        image_path = filedialog.askopenfilename(title="Select an Image", filetypes=[("Image Files", "*.png;*.jpg;*.jpeg;*.bmp;*.gif")])
     
     if image_path: 
         n_colors = 98   # Total number of colors needed (7 rows x 14 columns)
         grid_rows = 7   # Number of rows in the palette grid
         grid_cols = 14   # Number of columns in the palette grid
-        
-        extract_color_palettes(image_path, n_colors, grid_rows, grid_cols)
+
+        if args.benchmark:
+            for result in compare_engines(image_path, n_colors):
+                print(f"{result['engine']:<8} {result['size'][0]}x{result['size'][1]}  {result['colors']} colors  "
+                      f"{result['seconds']:.2f}s  peak {result['peak_mb']:.1f} MB")
+            return
+
+        extract_color_palettes(image_path, n_colors, grid_rows, grid_cols, engine=args.engine, cache=args.cache)
 
 if __name__ == "__main__":
     main()
-
@@ -1,28 +1,42 @@
+import argparse
+import queue
+import threading
+import time
+
 import cv2
-import numpy as np
-
-# Simplified color dictionary for basic hues (Red, Green, Blue, etc.)
-basic_color_dict = {
-    (255, 0, 0): 'Red',
-    (0, 255, 0): 'Green',
-    (255, 140, 0): 'Blue',
-    (0, 255, 255): 'Yellow',
-    (0, 0, 255): 'Orange',
-    (128, 0, 128): 'Purple',
-    (255, 255, 0): 'Cyan',
-    (255, 0, 255): 'Magenta',
-    (0, 0, 0): 'Black',
-    (255, 255, 255): 'White'
-}
+
+from color_names import get_color_namer
+from contour_index import ContourIndex, FrameResultCache
+from cvd_transforms import daltonization_matrix, matrix_kernel, simulation_matrix
+from image_decode import imread_reduced
+from instrumentation import add_trace_arguments, enable_from_args, tracer
+from object_stats import ObjectStats, hsv_mask, label_objects, object_contours
+from video_pipeline import (DropOldestQueue, StageStats, draw_stats_overlay,
+                            start_capture_thread, start_process_thread)
 
 # Global variables
 detection_active = True
 daltonize_active = False  # New state for daltonize mode
 cvd_type = 'None'  # Tracks CVD type
+simulate_active = False  # Show the simulated view instead of the daltonized one
+severity = 1.0  # Severity of the CVD, from 0 to 1
 mouse_color_label = ""  
 mouse_color_rgb = ""    
 mouse_x, mouse_y = -1, -1  
 image_index = 0  
+show_stats = True  # FPS/latency overlay in video mode
+frame = None  # Frame currently shown, used for color lookups on hover
+_image_cache = {}  # Decoded still images, keyed by path
+max_side = None  # Decode still images to fit this size (reduced JPEG decoding), None keeps full size
+color_namer = None  # Nearest color name lookup (color_names.py), built on first hover or in main()
+_frame_cache = FrameResultCache()  # Daltonized frame, contour index and object stats per (frame, settings)
+stats_active = False  # Label every object with its dominant color name ('o' key)
+stats_scale = 0.5  # Object statistics are computed on the frame resized by this factor
+
+# Object detection settings
+detection_lower = (0, 40, 40)  # HSV lower bound
+detection_upper = (180, 255, 255)  # HSV upper bound
+min_contour_area = 500
 
 # List of images
 image_paths = [
@@ -31,91 +45,138 @@ image_paths = [
     "D:\MIT FULL NOTES\MIT PROJECT\DATA SETS\Color Sets\P1 - 14-10-2024\colorful-collection-balls-with-lot-different-colors_931553-166354.jpg"
 ]
 
-# Daltonize matrices for different color vision deficiencies (simplified)
-cvd_matrices = {
-    'Protanopia': np.array([[0.567, 0.433, 0], [0.558, 0.442, 0], [0, 0.242, 0.758]]),
-    'Deuteranopia': np.array([[0.625, 0.375, 0], [0.7, 0.3, 0], [0, 0.3, 0.7]]),
-    'Tritanopia': np.array([[0.95, 0.05, 0], [0, 0.433, 0.567], [0, 0.475, 0.525]])
-}
+# Color vision deficiencies available on keys 1-3, see cvd_transforms.py
+cvd_types = ('Protanopia', 'Deuteranopia', 'Tritanopia')
 
-# Function to detect objects
+# Function to detect objects: the contours of the mask components with more than
+# min_contour_area pixels
 def detect_objects(frame):
-    hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
-    lower_val = np.array([0, 40, 40])
-    upper_val = np.array([180, 255, 255])
-    mask = cv2.inRange(hsv, lower_val, upper_val)
-    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-    return contours
-
-# Function to draw highlighted contours
-def draw_highlighted_contour(frame, contours):
-    highlighted = False
-    for cnt in contours:
-        if cv2.contourArea(cnt) > 500:
-            if cv2.pointPolygonTest(cnt, (mouse_x, mouse_y), False) >= 0:
-                cv2.drawContours(frame, [cnt], -1, (0, 255, 0), 2)
-                highlighted = True
-            else:
-                cv2.drawContours(frame, [cnt], -1, (255, 0, 0), 2)
-
-# Daltonization function
-def daltonize_image(image, cvd_type):
-    if cvd_type in cvd_matrices:
-        cvd_matrix = cvd_matrices[cvd_type]
-        reshaped_img = image.reshape((-1, 3)).astype(np.float32) / 255.0
-        transformed_img = np.dot(reshaped_img, cvd_matrix.T)
-        transformed_img = np.clip(transformed_img, 0, 1) * 255
-        return transformed_img.reshape(image.shape).astype(np.uint8)
+    return detect_object_components(frame)[0]
+
+# Same objects as detect_objects(), plus the labeled components for the object statistics
+def detect_object_components(frame):
+    mask = hsv_mask(frame, detection_lower, detection_upper)
+    components = label_objects(mask, min_contour_area)
+    return object_contours(components), components
+
+# Function to draw the contours, highlighting the one under the mouse. Takes a ContourIndex,
+# or a plain list of contours as before, which is then filtered and indexed here.
+def draw_highlighted_contour(frame, index):
+    if not isinstance(index, ContourIndex):
+        index = ContourIndex(index, frame.shape, min_contour_area)
+    hovered = index.hit(mouse_x, mouse_y)
+    index.draw(frame, highlight=hovered)
+    return hovered >= 0
+
+# Daltonization function, or simulation when simulate_active is set. Uses the fixed-point
+# kernel, which reuses its scratch buffers from frame to frame.
+def daltonize_image(image, cvd_type, out=None):
+    if cvd_type in cvd_types:
+        if simulate_active:
+            matrix = simulation_matrix(cvd_type, severity)
+        else:
+            matrix = daltonization_matrix(cvd_type, severity)
+        return matrix_kernel(matrix, bgr=True, fixed_point=True)(image, out)
     return image
 
 # Mouse callback function to display color and RGB values on hover
 def show_color(event, x, y, flags, param):
     global mouse_color_label, mouse_color_rgb, mouse_x, mouse_y
     mouse_x, mouse_y = x, y
-    if event == cv2.EVENT_MOUSEMOVE:
+    if event == cv2.EVENT_MOUSEMOVE and frame is not None and 0 <= y < frame.shape[0] and 0 <= x < frame.shape[1]:
         color = frame[y, x]
-        closest_color = min(basic_color_dict.keys(), key=lambda c: np.linalg.norm(np.array(color) - np.array(c)))
-        mouse_color_label = basic_color_dict[closest_color]
+        mouse_color_label = (color_namer or get_color_namer('css')).name(color, bgr=True)
         mouse_color_rgb = f"RGB: ({color[2]}, {color[1]}, {color[0]})"
 
-# Load the current image
+# Load the current image, decoding each path only once
 def load_image(index):
-    image = cv2.imread(image_paths[index])
-    if image is None:
-        print(f"Error: Unable to load image at {image_paths[index]}")
-    return image
+    path = image_paths[index]
+    if path not in _image_cache:
+        with tracer.stage("decode") as stage:
+            image = imread_reduced(path, (max_side, max_side) if max_side else None)
+            if image is not None:
+                stage.add_pixels(image.shape[0] * image.shape[1])
+        if image is None:
+            print(f"Error: Unable to load image at {path}")
+            return None
+        _image_cache[path] = image
+    return _image_cache[path]
 
-# Set mouse callback
-cv2.namedWindow("Image")
-cv2.setMouseCallback("Image", show_color)
+# Daltonize a frame and detect its objects, reusing the result while nothing changes
+def prepare_frame(frame):
+    settings = (cvd_type if daltonize_active else 'None', simulate_active, severity, detection_active,
+                detection_lower, detection_upper, min_contour_area, stats_active, stats_scale)
+    prepared = _frame_cache.get(frame, settings)
+    if prepared is None:
+        base_frame = frame
+        pixels = frame.shape[0] * frame.shape[1]
+        if daltonize_active and cvd_type != 'None':
+            with tracer.stage("transform", pixels=pixels):
+                base_frame = daltonize_image(frame, cvd_type)
+        index = None
+        object_stats = None
+        if detection_active:
+            with tracer.stage("detect", pixels=pixels):
+                contours, components = detect_object_components(base_frame)
+                index = ContourIndex(contours, base_frame.shape, min_area=None)
+            if stats_active:
+                # Same objects as the contours, colors from the original frame: base_frame is
+                # already daltonized or simulated
+                with tracer.stage("stats", pixels=pixels):
+                    object_stats = ObjectStats(frame, scale=stats_scale, severity=severity, components=components)
+        prepared = _frame_cache.put(frame, settings, (base_frame, index, object_stats))
+    return prepared
 
-# Display the image with highlighted objects
-while True:
-    frame = load_image(image_index)
-    
-    if frame is None:
-        key = cv2.waitKey(1)
-        continue
-    
-    display_frame = frame.copy()
+# Daltonize a frame and draw the detected objects on a copy of it
+def process_frame(frame):
+    base_frame, index, object_stats = prepare_frame(frame)
+    with tracer.stage("draw", pixels=frame.shape[0] * frame.shape[1]):
+        display_frame = base_frame.copy()
 
-    if daltonize_active and cvd_type != 'None':
-        display_frame = daltonize_image(display_frame, cvd_type)
+        if index is not None:
+            draw_highlighted_contour(display_frame, index)
+        if object_stats is not None:
+            draw_object_stats(display_frame, object_stats)
 
-    if detection_active:
-        contours = detect_objects(display_frame)
-        draw_highlighted_contour(display_frame, contours)
+    return display_frame
 
+# Label every object with the name of its dominant color; the hovered object also gets its
+# area and the names of its color as seen with each deficiency
+def draw_object_stats(display_frame, object_stats):
+    namer = color_namer or get_color_namer('css')
+    names = object_stats.names(namer)
+    for name, (x, y) in zip(names, object_stats.centroids.astype(int)):
+        cv2.putText(display_frame, name, (x, y), cv2.FONT_HERSHEY_SIMPLEX, 0.4, (255, 255, 255), 1)
+
+    hovered = object_stats.hit(mouse_x, mouse_y)
+    if hovered >= 0:
+        x, y, w, h = object_stats.bboxes[hovered]
+        cv2.rectangle(display_frame, (x, y), (x + w, y + h), (0, 255, 255), 1)
+        seen = ", ".join(f"{deficiency}: {namer.name(colors[hovered])}"
+                         for deficiency, colors in object_stats.simulated_colors.items())
+        text = f"Object: {names[hovered]}, {int(object_stats.areas[hovered])} px  ({seen})"
+        cv2.putText(display_frame, text, (10, display_frame.shape[0] - 15),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 241, 0), 1)
+
+# Draw the per-stage timings recorded by instrumentation.py (only while tracing is enabled)
+def draw_trace_overlay(display_frame, origin=(10, 60)):
+    x, y = origin
+    for line in tracer.summary_lines():
+        cv2.putText(display_frame, line, (x, y), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 255), 1)
+        y += 20
+
+# Draw the color name and RGB value under the mouse
+def draw_color_label(display_frame):
     if mouse_color_label:
         cv2.putText(display_frame, f"Color: {mouse_color_label}  {mouse_color_rgb}", 
                     (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 241, 0), 2)
 
-    cv2.imshow("Image", display_frame)
-
-    key = cv2.waitKey(1)
+# Handle a key press, returns False when the user wants to exit
+def handle_key(key):
+    global detection_active, daltonize_active, cvd_type, image_index, show_stats, simulate_active, severity, stats_active
 
     if key == 27:  # ESC key to exit
-        break
+        return False
     elif key == ord('d'):  # Toggle detection with 'd' key
         detection_active = not detection_active
     elif key == ord('n'):  # Next image with 'n' key
@@ -136,12 +197,121 @@ while True:
     elif key == ord('r'):  # Reset/Disable Daltonization
         daltonize_active = False
         cvd_type = 'None'
+    elif key == ord('s'):  # Toggle the FPS/latency overlay
+        show_stats = not show_stats
+    elif key == ord('o'):  # Toggle the object color labels
+        stats_active = not stats_active
+    elif key == ord('v'):  # Toggle between daltonized and simulated view
+        simulate_active = not simulate_active
+    elif key == ord('+') or key == ord('='):  # Increase severity
+        severity = round(min(1.0, severity + 0.1), 1)
+    elif key == ord('-'):  # Decrease severity
+        severity = round(max(0.0, severity - 0.1), 1)
+
+    return cv2.getWindowProperty("Image", cv2.WND_PROP_VISIBLE) >= 1
+
+# Display the still images with highlighted objects
+def run_images():
+    global frame
+
+    while True:
+        frame = load_image(image_index)
+
+        if frame is None:
+            key = cv2.waitKey(1)
+            if not handle_key(key):
+                break
+            continue
+
+        display_frame = process_frame(frame)
+        with tracer.stage("render"):
+            draw_color_label(display_frame)
+            if show_stats and tracer.enabled:
+                draw_trace_overlay(display_frame)
+            cv2.imshow("Image", display_frame)
+
+        if not handle_key(cv2.waitKey(1)):
+            break
+
+# Run capture, processing and display as separate stages on a live source
+def run_video(source, fps=None):
+    global frame
+
+    stats = StageStats()
+    stop_event = threading.Event()
+    captured_frames = DropOldestQueue(maxsize=2)
+    processed_frames = DropOldestQueue(maxsize=2)
+    start_capture_thread(source, captured_frames, stats, stop_event, fps)
+    start_process_thread(process_frame, captured_frames, processed_frames, stats, stop_event)
+
+    try:
+        while True:
+            try:
+                item = processed_frames.get(timeout=0.05)
+            except queue.Empty:
+                if not handle_key(cv2.waitKey(1)):
+                    break
+                continue
+            if item is None:  # Source exhausted
+                break
+
+            started = time.perf_counter()
+            frame, display_frame, captured = item
+            draw_color_label(display_frame)
+            if show_stats:
+                draw_stats_overlay(display_frame, stats, dropped=captured_frames.dropped + processed_frames.dropped)
+                if tracer.enabled:
+                    draw_trace_overlay(display_frame, origin=(10, 85 + 25 * len(stats.lines())))
+            with tracer.stage("render"):
+                cv2.imshow("Image", display_frame)
+            key = cv2.waitKey(1)
+            stats.record("display", time.perf_counter() - started)
+            stats.record("latency", time.perf_counter() - captured)
+            stats.tick()
+
+            if not handle_key(key):
+                break
+    finally:
+        stop_event.set()
+
+def main():
+    global image_paths, color_namer, max_side, stats_scale
+
+    parser = argparse.ArgumentParser(description="Color recognition with object segmentation for CVD.")
+    parser.add_argument("images", nargs="*", help="Still images to browse with 'n'/'p' (default: built-in list)")
+    parser.add_argument("--source", help="Live source: webcam index, video file or directory of frames")
+    parser.add_argument("--fps", type=float, help="Playback rate for video files and frame directories")
+    parser.add_argument("--color-names", default="css",
+                        help="Color dictionary: basic, css, xkcd or a .json/.csv file (default: css)")
+    parser.add_argument("--max-side", type=int,
+                        help="Decode still images to fit this size, e.g. 1280 (large JPEGs load much faster)")
+    parser.add_argument("--stats-scale", type=float, default=stats_scale,
+                        help="Resize factor for the object statistics of the 'o' key (default: 0.5)")
+    add_trace_arguments(parser)
+    args = parser.parse_args()
+    enable_from_args(args)
+
+    max_side = args.max_side
+    stats_scale = args.stats_scale
+    if args.images:
+        image_paths = args.images
+    color_namer = get_color_namer(args.color_names)
+
+    # Set mouse callback
+    cv2.namedWindow("Image")
+    cv2.setMouseCallback("Image", show_color)
+
+    if args.source is not None:
+        run_video(args.source, args.fps)
+    else:
+        run_images()
+
+    # Cleanup
+    cv2.destroyAllWindows()
 
-    if cv2.getWindowProperty("Image", cv2.WND_PROP_VISIBLE) < 1:
-        break
+if __name__ == "__main__":
+    main()
 
-# Cleanup
-cv2.destroyAllWindows()
 """""
 CVD mode switching:
 You can switch between different CVD modes using keys:
@@ -149,4 +319,8 @@ You can switch between different CVD modes using keys:
 '2' for Deuteranopia
 '3' for Tritanopia
 'r' to reset/disable Daltonize.
-"""
\ No newline at end of file
+'v' to switch between the daltonized and the simulated view.
+'+'/'-' to change the severity in steps of 0.1.
+'o' to label every object with its dominant color name (hover an object for its details).
+'s' to toggle the FPS/latency overlay in video mode (and the per-stage timings with --trace).
+"""
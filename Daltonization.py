@@ -1,100 +1,293 @@
 
 import numpy as np
-from PIL import Image, ImageTk
-import tkinter as tk
-from tkinter import filedialog, messagebox
+from PIL import Image
+import argparse
 import os
+import queue
+import threading
 
-def daltonize(image_array, deficiency):
+from cvd_transforms import apply_matrix, daltonization_matrix, simulation_matrix
+from image_decode import decode_image
+from instrumentation import add_trace_arguments, enable_from_args, tracer
+from result_cache import ResultCache, default_cache, image_key, make_key, resolve_cache
+
+PREVIEW_SIZE = (400, 400)  # Largest size shown in the window
+POLL_MS = 50  # How often the GUI picks up results finished in the background
+
+# Transformation matrices for the supported color vision deficiencies. Protan, deutan and
+# tritan are full daltonization (simulate, then redistribute the error) from cvd_transforms.py,
+# monochromacy is its achromatopsia simulation (Rec. 709 luminance).
+deficiency_matrices = {
+    'protan': daltonization_matrix('protan'),
+    'deutan': daltonization_matrix('deutan'),
+    'tritan': daltonization_matrix('tritan'),
+    'monochromacy': simulation_matrix('monochromacy'),
+    'enhance_r': np.array([[1.00, 0.00, 0.00],
+                           [0.00, 1.00, 0.00],
+                           [1.00, 0.00, 0.00]]),
+    'enhance_g': np.array([[1.00, 0.00, 0.00],
+                           [0.00, 1.00, 0.00],
+                           [0.00, 1.00, 0.00]]),
+}
+
+def deficiency_matrix(deficiency, severity=1.0):
+    """Return the transformation matrix for a deficiency, severity applies to protan, deutan and tritan."""
+    if deficiency not in deficiency_matrices:
+        raise ValueError("Invalid deficiency type.")
+    if severity != 1.0 and deficiency in ('protan', 'deutan', 'tritan'):
+        return daltonization_matrix(deficiency, severity)
+    return deficiency_matrices[deficiency]
+
+def daltonize_cache_key(image_array, deficiency, lut_size=None, severity=1.0):
+    """Return the result_cache key under which `daltonize()` stores this result."""
+    return make_key("daltonize", image_key(image_array), deficiency_matrix(deficiency, severity), lut_size)
+
+def daltonize(image_array, deficiency, lut_size=None, severity=1.0, out=None, cache=None):
     """
     Apply daltonization to an image based on the specified color vision deficiency.
     
     Parameters:
         image_array (numpy array): The RGB image array.
         deficiency (str): Type of color vision deficiency ('protan', 'deutan', 'tritan', 'monochromacy', 'enhance_r', 'enhance_g').
+        lut_size (int, optional): Use a cached 3D lookup table with this many points per axis
+            (256 for the exact full table, 33 or 65 for an interpolated lattice) instead of the matrix.
+        severity (float): Severity of a protan, deutan or tritan deficiency, from 0 to 1.
+        out (numpy array, optional): uint8 array of shape (H, W, 3) to write the result into.
+            The matrix path then works in bands of rows and allocates no full-size temporaries.
+        cache (ResultCache or bool, optional): Look the result up in a result_cache.ResultCache
+            (True for the shared default) and store it there on a miss. Cached results are read-only.
     
     Returns:
-        numpy array: The daltonized image array.
+        numpy array: The daltonized image array (`out` when given).
     """
-    # Define transformation matrices for different deficiencies
-    if deficiency == 'protan':
-        matrix = np.array([[0.56667, 0.43333, 0.00000],
-                           [0.55833, 0.44167, 0.00000],
-                           [0.00000, 0.24167, 0.75833]])
-    elif deficiency == 'deutan':
-        matrix = np.array([[0.4251, 0.6934, -0.1147],
-                           [0.3417, 0.5882, 0.0692],
-                           [-0.0105, 0.0234, 0.9870]])
-    elif deficiency == 'tritan':
-        matrix = np.array([[0.95000, 0.05000, 0.00000],
-                           [0.00000, 0.83333, 0.16700],
-                           [0.00000, 0.87500, 0.12500]])
-    elif deficiency == 'monochromacy':
-        matrix = np.array([[0.33, 0.33, 0.33],
-                           [0.33, 0.33, 0.33],
-                           [0.33, 0.33, 0.33]])
-    elif deficiency == 'enhance_r':
-        matrix = np.array([[1.00, 0.00, 0.00],
-                           [0.00, 1.00, 0.00],
-                           [1.00, 0.00, 0.00]])
-    elif deficiency == 'enhance_g':
-        matrix = np.array([[1.00, 0.00, 0.00],
-                           [0.00, 1.00, 0.00],
-                           [0.00, 1.00, 0.00]])
-    else:
-        raise ValueError("Invalid deficiency type.")
+    matrix = deficiency_matrix(deficiency, severity)
+
+    if cache:
+        cache = resolve_cache(cache)
+        key = daltonize_cache_key(image_array, deficiency, lut_size, severity)
+        result = cache.get_or_compute(key, lambda: daltonize(image_array, deficiency, lut_size, severity))
+        if out is None:
+            return result
+        out[...] = result
+        return out
+
+    if lut_size is not None:
+        if severity != 1.0:
+            raise ValueError("Lookup tables are only built for severity 1.0.")
+        from daltonize_lut import apply_lut, load_lut
+        result = apply_lut(image_array, load_lut(deficiency, lut_size))
+        if out is None:
+            return result
+        out[...] = result
+        return out
 
     # Apply the transformation
-    daltonized_image = np.dot(image_array[..., :3], matrix.T)
-    daltonized_image = np.clip(daltonized_image, 0, 255).astype(np.uint8)
-    
-    return daltonized_image
+    return apply_matrix(image_array, matrix, out=out)
 
 def open_image():
     """Open an image file."""
+    from tkinter import filedialog
     file_path = filedialog.askopenfilename(filetypes=[("Image files", "*.jpg *.jpeg *.png *.webp")])
     if file_path:
         load_and_display_image(file_path)
 
 def load_and_display_image(image_path):
-    """Load and display the selected image."""
-    global original_image_array, processed_image_array
-    original_image = Image.open(image_path).convert('RGB')
-    original_image_array = np.array(original_image)  # Convert to numpy array
+    """
+    Display the preview of the selected image at once and decode the full image in the background.
+
+    The preview is decoded directly at thumbnail size (reduced JPEG decoding), so the first paint
+    does not wait for the full-resolution decode; every deficiency is first applied to it.
+    """
+    global original_image_array, processed_image_array, preview_array, selected_deficiency, loaded_image_path
+    cancel_background_job()
+    with tracer.stage("decode[preview]") as stage:
+        preview = decode_image(image_path, PREVIEW_SIZE)
+        stage.add_pixels(preview.width * preview.height)
+    preview_array = np.asarray(preview)
+
+    loaded_image_path = image_path
+    original_image_array = None  # Set by poll_background_jobs once decoded
+    preview_results.clear()
+    full_results.clear()
     processed_image_array = None  # Reset processed image
-    show_image(original_image_array)
+    selected_deficiency = None
+    show_image(preview_array)
+    set_status("Preview loaded, decoding full resolution...")
+    threading.Thread(target=_background_decode, args=(image_path,), daemon=True).start()
+
+def decode_full_image(image_path):
+    with tracer.stage("decode") as stage:
+        image_array = np.asarray(decode_image(image_path))
+        stage.add_pixels(image_array.shape[0] * image_array.shape[1])
+    return image_array
+
+def _background_decode(image_path):
+    """Worker thread: decode the full-resolution image and hand it to Tk."""
+    _decoded.put((image_path, decode_full_image(image_path)))
 
 def show_image(image_array):
-    """Show the image in the Tkinter window."""
-    image = Image.fromarray(image_array)
-    image.thumbnail((400, 400))  # Resize for display
-    img_tk = ImageTk.PhotoImage(image)
+    """Show the image in the Tkinter window, updating the existing label and photo in place."""
+    global display_photo
+    from PIL import ImageTk
+    with tracer.stage("render", pixels=image_array.shape[0] * image_array.shape[1]):
+        image = Image.fromarray(image_array)
+        if image.width > PREVIEW_SIZE[0] or image.height > PREVIEW_SIZE[1]:
+            image.thumbnail(PREVIEW_SIZE)  # Resize for display
+
+        if display_photo is not None and (display_photo.width(), display_photo.height()) == image.size:
+            display_photo.paste(image)  # Same size, only the pixels change
+        else:
+            display_photo = ImageTk.PhotoImage(image)
+            image_label.configure(image=display_photo)
+            image_label.image = display_photo  # Keep a reference
+    update_stats_label()
 
-    # Clear previous image
-    for widget in frame.winfo_children():
-        widget.destroy()
+def set_status(text):
+    if status_label is not None:
+        status_label.config(text=text)
 
-    label = tk.Label(frame, image=img_tk)
-    label.image = img_tk  # Keep a reference
-    label.pack()
+def update_stats_label():
+    """Show the latest per-stage timings under the buttons while tracing is enabled."""
+    if tracer.enabled and stats_label is not None:
+        stats_label.config(text="\n".join(tracer.summary_lines()))
 
 def apply_daltonization(deficiency):
-    """Apply the selected CVD category and display the image."""
-    global processed_image_array
-    if original_image_array is not None:
-        processed_image_array = daltonize(original_image_array, deficiency)
-        show_image(processed_image_array)
+    """
+    Show the selected CVD category at once on the thumbnail, then compute the full-resolution
+    result in the background. Results are kept per deficiency, so switching back is instant.
+    """
+    global processed_image_array, selected_deficiency
+    if preview_array is None:
+        return
+
+    selected_deficiency = deficiency
+    if deficiency not in preview_results:
+        with tracer.stage("transform[preview]", pixels=preview_array.shape[0] * preview_array.shape[1]):
+            preview_results[deficiency] = daltonize(preview_array, deficiency)
+    show_image(preview_results[deficiency])
+
+    processed_image_array = full_results.get(deficiency)
+    if processed_image_array is not None:
+        cancel_background_job()
+        set_status(f"{deficiency}: full resolution")
+    elif original_image_array is None:
+        cancel_background_job()
+        set_status(f"{deficiency}: preview, decoding full resolution...")  # Started once decoded
+    else:
+        start_background_job(deficiency)
+        set_status(f"{deficiency}: preview, computing full resolution...")
+
+def start_background_job(deficiency):
+    """Compute the full-resolution result on a worker thread, cancelling any other running job."""
+    global _job
+    if _job is not None and _job[0] == deficiency:
+        return  # Already on its way
+    cancel_background_job()
+    cancel = threading.Event()
+    _job = (deficiency, cancel)
+    worker = threading.Thread(target=_background_daltonize, args=(original_image_array, deficiency, cancel),
+                              daemon=True)
+    worker.start()
+
+def cancel_background_job():
+    """Ask the running background job to stop at its next tile."""
+    global _job
+    if _job is not None:
+        _job[1].set()
+        _job = None
+
+def daltonize_full(image_array, deficiency, cancel=None):
+    """
+    Full-resolution result for the GUI, through `gui_cache`. The background job and the save
+    button both use this, so one cache key always holds the same result.
+
+    The image is daltonized tile by tile so `cancel` (a threading.Event) is honored quickly.
+
+    Returns:
+        numpy array: The read-only result, or None when cancelled.
+    """
+    from tiled_daltonize import iter_tiles
+
+    key = daltonize_cache_key(image_array, deficiency)
+    result = gui_cache.get(key)
+    if result is None:
+        height, width = image_array.shape[:2]
+        result = np.empty((height, width, 3), dtype=np.uint8)
+        with tracer.stage("transform", pixels=height * width):
+            for rows, cols in iter_tiles(height, width):
+                if cancel is not None and cancel.is_set():
+                    return None
+                daltonize(image_array[rows, cols], deficiency, out=result[rows, cols])
+        result = gui_cache.put(key, result)
+    return result
+
+def _background_daltonize(image_array, deficiency, cancel):
+    """Worker thread: compute the full-resolution result, then hand it to Tk."""
+    result = daltonize_full(image_array, deficiency, cancel)
+    if result is None or cancel.is_set():
+        return
+
+    # Downscale here as well, the Tk thread only has to paste the preview
+    preview = Image.fromarray(result)
+    preview.thumbnail(PREVIEW_SIZE)
+    _finished.put((image_array, deficiency, result, np.asarray(preview)))
+
+def poll_background_jobs():
+    """Tk thread: pick up decoded images and finished full-resolution results, show the selected one."""
+    global original_image_array, processed_image_array, _job
+    while True:
+        try:
+            image_path, image_array = _decoded.get_nowait()
+        except queue.Empty:
+            break
+        if image_path != loaded_image_path or original_image_array is not None:
+            continue  # Another image has been loaded since
+        original_image_array = image_array
+        if selected_deficiency is not None:
+            start_background_job(selected_deficiency)
+            set_status(f"{selected_deficiency}: preview, computing full resolution...")
+        else:
+            set_status(f"{image_array.shape[1]}x{image_array.shape[0]} image loaded")
+    while True:
+        try:
+            image_array, deficiency, result, preview = _finished.get_nowait()
+        except queue.Empty:
+            break
+        if image_array is not original_image_array:
+            continue  # Finished for an image that has been replaced since
+        full_results[deficiency] = result
+        preview_results[deficiency] = preview
+        if _job is not None and _job[0] == deficiency:
+            _job = None
+        if deficiency == selected_deficiency:
+            processed_image_array = result
+            show_image(preview)
+            set_status(f"{deficiency}: full resolution")
+    root.after(POLL_MS, poll_background_jobs)
 
 def save_image():
     """Save the processed (daltonized) image."""
+    from tkinter import filedialog, messagebox
+    global original_image_array, processed_image_array
+    if processed_image_array is None and selected_deficiency is not None:
+        # Full resolution not finished yet, compute it now instead of saving the preview
+        cancel_background_job()
+        if original_image_array is None:
+            original_image_array = decode_full_image(loaded_image_path)
+        processed_image_array = daltonize_full(original_image_array, selected_deficiency)
+        full_results[selected_deficiency] = processed_image_array
+        set_status(f"{selected_deficiency}: full resolution")
     if processed_image_array is not None:
         save_path = filedialog.asksaveasfilename(defaultextension=".png", 
                                                  filetypes=[("PNG files", "*.png"), 
                                                             ("JPEG files", "*.jpg"), 
                                                             ("All files", "*.*")])
         if save_path:
-            save_image = Image.fromarray(processed_image_array)
-            save_image.save(save_path)
+            pixels = processed_image_array.shape[0] * processed_image_array.shape[1]
+            with tracer.stage("encode", pixels=pixels):
+                save_image = Image.fromarray(processed_image_array)
+                save_image.save(save_path)
+            update_stats_label()
             messagebox.showinfo("Save Image", f"Image saved successfully as {save_path}")
             
             # Ask if the user wants to open the folder
@@ -105,43 +298,83 @@ def save_image():
     else:
         messagebox.showwarning("Save Image", "No daltonized image to save. Apply a filter first!")
 
-# Create the main window
-root = tk.Tk()
-root.title("Color Vision Deficiency Simulator")
+original_image_array = None  # Full-resolution image, None until decoded in the background
+loaded_image_path = None
+processed_image_array = None  # Full-resolution result of the selected deficiency
+preview_array = None  # Thumbnail of the original image
+preview_results = {}  # Deficiency -> daltonized thumbnail
+full_results = {}  # Deficiency -> full-resolution result, for the current image only
+selected_deficiency = None
+_job = None  # (deficiency, cancel event) of the running background job
+_finished = queue.Queue()  # Background results waiting for the Tk thread
+_decoded = queue.Queue()  # (path, full-resolution image) decoded in the background
+image_label = None  # Label showing the image, created once and updated in place
+display_photo = None  # PhotoImage shown by image_label
+status_label = None
+stats_label = None  # Per-stage timings, only created when tracing is enabled
+gui_cache = ResultCache(disk_bytes=0)  # Memory only unless --disk-cache is given
+
+def main():
+    """Start the Tkinter GUI. Tkinter is only imported here, so the module can be used headless."""
+    import tkinter as tk
+    global root, frame, image_label, status_label, stats_label, gui_cache
+
+    parser = argparse.ArgumentParser(description="Daltonize images for color vision deficiencies.")
+    parser.add_argument("--disk-cache", action="store_true",
+                        help="Keep full-resolution results in the shared on-disk result cache as well")
+    add_trace_arguments(parser)
+    args = parser.parse_args()
+    enable_from_args(args)
+    if args.disk_cache:
+        gui_cache = default_cache()
+
+    # Create the main window
+    root = tk.Tk()
+    root.title("Color Vision Deficiency Simulator")
+
+    frame = tk.Frame(root)
+    frame.pack()
+    image_label = tk.Label(frame)
+    image_label.pack()
+    status_label = tk.Label(root, text="Load an image to begin")
+    status_label.pack()
+
+    # Add buttons for CVD categories
+    button_frame = tk.Frame(root)
+    button_frame.pack(pady=10)
 
-frame = tk.Frame(root)
-frame.pack()
+    btn_protan = tk.Button(button_frame, text="Protanopia", command=lambda: apply_daltonization('protan'))
+    btn_protan.pack(side=tk.LEFT)
 
-# Add buttons for CVD categories
-button_frame = tk.Frame(root)
-button_frame.pack(pady=10)
+    btn_deutan = tk.Button(button_frame, text="Deuteranopia", command=lambda: apply_daltonization('deutan'))
+    btn_deutan.pack(side=tk.LEFT)
 
-btn_protan = tk.Button(button_frame, text="Protanopia", command=lambda: apply_daltonization('protan'))
-btn_protan.pack(side=tk.LEFT)
+    btn_tritan = tk.Button(button_frame, text="Tritanopia", command=lambda: apply_daltonization('tritan'))
+    btn_tritan.pack(side=tk.LEFT)
 
-btn_deutan = tk.Button(button_frame, text="Deuteranopia", command=lambda: apply_daltonization('deutan'))
-btn_deutan.pack(side=tk.LEFT)
+    btn_monochromacy = tk.Button(button_frame, text="Monochromacy", command=lambda: apply_daltonization('monochromacy'))
+    btn_monochromacy.pack(side=tk.LEFT)
 
-btn_tritan = tk.Button(button_frame, text="Tritanopia", command=lambda: apply_daltonization('tritan'))
-btn_tritan.pack(side=tk.LEFT)
+    btn_enhance_r = tk.Button(button_frame, text="Enhance Red", command=lambda: apply_daltonization('enhance_r'))
+    btn_enhance_r.pack(side=tk.LEFT)
 
-btn_monochromacy = tk.Button(button_frame, text="Monochromacy", command=lambda: apply_daltonization('monochromacy'))
-btn_monochromacy.pack(side=tk.LEFT)
+    btn_enhance_g = tk.Button(button_frame, text="Enhance Green", command=lambda: apply_daltonization('enhance_g'))
+    btn_enhance_g.pack(side=tk.LEFT)
 
-btn_enhance_r = tk.Button(button_frame, text="Enhance Red", command=lambda: apply_daltonization('enhance_r'))
-btn_enhance_r.pack(side=tk.LEFT)
+    btn_load_image = tk.Button(root, text="Load Image", command=open_image)
+    btn_load_image.pack(pady=20)
 
-btn_enhance_g = tk.Button(button_frame, text="Enhance Green", command=lambda: apply_daltonization('enhance_g'))
-btn_enhance_g.pack(side=tk.LEFT)
+    btn_save_image = tk.Button(root, text="Save Image", command=save_image)
+    btn_save_image.pack(pady=10)
 
-btn_load_image = tk.Button(root, text="Load Image", command=open_image)
-btn_load_image.pack(pady=20)
+    if tracer.enabled:
+        stats_label = tk.Label(root, justify=tk.LEFT, font=("Courier", 9))
+        stats_label.pack(pady=5)
 
-btn_save_image = tk.Button(root, text="Save Image", command=save_image)
-btn_save_image.pack(pady=10)
+    root.after(POLL_MS, poll_background_jobs)
 
-original_image_array = None
-processed_image_array = None  # Store the processed image
+    # Start the Tkinter main loop
+    root.mainloop()
 
-# Start the Tkinter main loop
-root.mainloop()
+if __name__ == "__main__":
+    main()
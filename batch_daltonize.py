@@ -0,0 +1,255 @@
+#########  ***** HEADLESS BATCH DALTONIZATION  ******  ##########
+
+#  Runs daltonize() over directories, glob patterns or lists of files without opening a window.
+#  Every image is decoded once in a worker process, transformed for each requested deficiency
+#  and encoded straight back to disk, so only a handful of images are ever held in memory.
+#  The settings each output was made with are recorded in a manifest in the output directory,
+#  so outputs are only skipped when they are newer than their input and were made with the
+#  same matrix and lookup table size.
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+from PIL import Image
+
+from Daltonization import daltonize, deficiency_matrices, deficiency_matrix
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".bmp", ".tif", ".tiff"}
+MANIFEST_NAME = ".daltonize_manifest.json"
+
+def _is_inside(path, folders):
+    return any(path == folder or path.startswith(folder + os.sep) for folder in folders)
+
+def _glob_root(pattern):
+    """Return the leading directory of a glob pattern that contains no wildcards."""
+    root = pattern
+    while glob.has_magic(root):
+        root = os.path.dirname(root)
+    return root or "."
+
+def collect_images(inputs, exclude=()):
+    """
+    Expand directories, glob patterns and file names into a sorted list of jobs.
+
+    Parameters:
+        inputs (list of str): Directories, glob patterns or image files.
+        exclude (list of str): Directories to skip, e.g. an output directory inside an input tree.
+
+    Returns:
+        list of tuple: (image path, path relative to the input it was found under). Relative
+            paths are unique: images that would share one get the path from their common parent.
+    """
+    excluded = [os.path.abspath(folder) for folder in exclude]
+    jobs = {}
+    for item in inputs:
+        if os.path.isdir(item):
+            for folder, subfolders, files in os.walk(item):
+                subfolders[:] = [name for name in subfolders
+                                 if not _is_inside(os.path.abspath(os.path.join(folder, name)), excluded)]
+                for name in files:
+                    if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS:
+                        path = os.path.join(folder, name)
+                        jobs.setdefault(os.path.abspath(path), os.path.relpath(path, item))
+        else:
+            if glob.has_magic(item):
+                matches, root = glob.glob(item, recursive=True), _glob_root(item)
+            else:
+                matches, root = [item], os.path.dirname(item) or "."
+            for path in matches:
+                if os.path.isfile(path) and not _is_inside(os.path.abspath(path), excluded):
+                    jobs.setdefault(os.path.abspath(path), os.path.relpath(path, root))
+
+    # Images found under different inputs can share a relative path, keep more of their paths
+    by_relative = {}
+    for path, relative in jobs.items():
+        by_relative.setdefault(os.path.normcase(relative), []).append(path)
+    for paths in by_relative.values():
+        if len(paths) > 1:
+            parent = os.path.commonpath([os.path.dirname(path) for path in paths])
+            for path in paths:
+                jobs[path] = os.path.relpath(path, parent)
+    return sorted(jobs.items())
+
+def output_path(relative_path, deficiency, output_dir, extension=None):
+    """Return where the daltonized version of an image is written."""
+    stem, original_extension = os.path.splitext(relative_path)
+    return os.path.join(output_dir, f"{stem}_{deficiency}{extension or original_extension}")
+
+def output_settings(deficiency, lut_size=None, severity=1.0):
+    """Return a string identifying everything that defines an output: the matrix and the table size."""
+    matrix = np.ascontiguousarray(deficiency_matrix(deficiency, severity), dtype=np.float64)
+    return f"{hashlib.sha1(matrix.tobytes()).hexdigest()[:10]}-lut{lut_size or 0}"
+
+def load_manifest(output_dir):
+    """Return the settings recorded per output (by path relative to `output_dir`), empty when there are none."""
+    try:
+        with open(os.path.join(output_dir, MANIFEST_NAME), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_manifest(output_dir, manifest):
+    os.makedirs(output_dir, exist_ok=True)
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+def is_up_to_date(source, target, settings=None, recorded_settings=None):
+    """
+    Check if `target` exists, is not older than `source` and, when `settings` is given, was made
+    with them according to `recorded_settings` from the manifest.
+    """
+    if not os.path.exists(target) or os.path.getmtime(target) < os.path.getmtime(source):
+        return False
+    return settings is None or recorded_settings == settings
+
+def process_image(image_path, targets, lut_size=None, severity=1.0, cache=False):
+    """
+    Decode one image, daltonize it for every target and encode the results.
+
+    Parameters:
+        image_path (str): Image to read.
+        targets (list of tuple): (deficiency, output path) pairs still to be produced.
+        lut_size (int, optional): Forwarded to `daltonize()`.
+        severity (float): Forwarded to `daltonize()`.
+        cache (bool): Look results up in the shared result cache (result_cache.py) first.
+
+    Returns:
+        tuple: (bytes read, bytes written, number of outputs written).
+    """
+    with Image.open(image_path) as image:
+        image_array = np.asarray(image.convert("RGB"))
+
+    bytes_written = 0
+    for deficiency, target in targets:
+        os.makedirs(os.path.dirname(target) or ".", exist_ok=True)
+        Image.fromarray(daltonize(image_array, deficiency, lut_size, severity, cache=cache)).save(target)
+        bytes_written += os.path.getsize(target)
+
+    return os.path.getsize(image_path), bytes_written, len(targets)
+
+def completed_jobs(executor, function, jobs, max_pending):
+    """
+    Run `function(*job)` for every job in `executor`, keeping at most `max_pending` submitted at once
+    instead of queueing the whole archive.
+
+    Yields:
+        tuple: (job, future) as each job finishes; `future.result()` re-raises the job's error.
+    """
+    pending = {}
+    jobs = iter(jobs)
+    while True:
+        for job in jobs:
+            pending[executor.submit(function, *job)] = job
+            if len(pending) >= max_pending:
+                break
+        if not pending:
+            return
+
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            yield pending.pop(future), future
+
+def run_batch(inputs, deficiencies, output_dir, workers=None, lut_size=None, extension=None,
+              force=False, max_pending=None, severity=1.0, cache=False):
+    """
+    Daltonize every image found in `inputs` for each deficiency using a process pool.
+
+    Parameters:
+        inputs (list of str): Directories, glob patterns or image files.
+        deficiencies (list of str): Keys of `deficiency_matrices`.
+        output_dir (str): Root directory for the results, input sub-folders are mirrored.
+        workers (int, optional): Number of worker processes, defaults to the CPU count.
+        lut_size (int, optional): Apply cached lookup tables instead of the matrices.
+        extension (str, optional): Output extension such as '.png', defaults to the input's.
+        force (bool): Rewrite outputs even when they are up to date.
+        max_pending (int, optional): Images queued at once, bounds memory (default 2 per worker).
+        severity (float): Severity for protan, deutan and tritan, from 0 to 1.
+        cache (bool): Share computed results between workers and runs through the result cache.
+
+    Returns:
+        dict: Counts, byte totals, elapsed seconds and throughput.
+    """
+    for deficiency in deficiencies:
+        if deficiency not in deficiency_matrices:
+            raise ValueError("Invalid deficiency type.")
+
+    workers = workers or os.cpu_count() or 1
+    max_pending = max_pending or 2 * workers
+    stats = {"images": 0, "outputs": 0, "skipped": 0, "failed": 0, "bytes_read": 0, "bytes_written": 0}
+
+    # Only queue images that still have at least one missing or stale output
+    settings = {deficiency: output_settings(deficiency, lut_size, severity) for deficiency in deficiencies}
+    manifest = load_manifest(output_dir)
+    jobs = []
+    for image_path, relative_path in collect_images(inputs, exclude=[output_dir]):
+        targets = [(deficiency, output_path(relative_path, deficiency, output_dir, extension))
+                   for deficiency in deficiencies]
+        if not force:
+            targets = [(d, t) for d, t in targets
+                       if not is_up_to_date(image_path, t, settings[d], manifest.get(os.path.relpath(t, output_dir)))]
+        stats["skipped"] += len(deficiencies) - len(targets)
+        if targets:
+            jobs.append((image_path, targets))
+
+    start = time.perf_counter()
+    jobs = [(image_path, targets, lut_size, severity, cache) for image_path, targets in jobs]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        try:
+            for (image_path, targets, *_), future in completed_jobs(executor, process_image, jobs, max_pending):
+                try:
+                    bytes_read, bytes_written, outputs = future.result()
+                except Exception as error:
+                    stats["failed"] += 1
+                    print(f"Error: Unable to process {image_path}: {error}")
+                    continue
+                for deficiency, target in targets:
+                    manifest[os.path.relpath(target, output_dir)] = settings[deficiency]
+                stats["images"] += 1
+                stats["outputs"] += outputs
+                stats["bytes_read"] += bytes_read
+                stats["bytes_written"] += bytes_written
+        finally:
+            if stats["outputs"]:
+                save_manifest(output_dir, manifest)
+
+    elapsed = time.perf_counter() - start
+    stats["seconds"] = elapsed
+    stats["images_per_second"] = stats["images"] / elapsed if elapsed > 0 else 0.0
+    stats["mb_per_second"] = stats["bytes_read"] / 1e6 / elapsed if elapsed > 0 else 0.0
+    return stats
+
+def main():
+    parser = argparse.ArgumentParser(description="Daltonize image directories without the GUI.")
+    parser.add_argument("inputs", nargs="+", help="Image files, directories or glob patterns")
+    parser.add_argument("-d", "--deficiency", action="append", choices=list(deficiency_matrices),
+                        help="Deficiency to apply (repeatable, default: all)")
+    parser.add_argument("-o", "--output-dir", default="daltonized", help="Output directory")
+    parser.add_argument("-j", "--workers", type=int, help="Number of worker processes")
+    parser.add_argument("--lut-size", type=int, help="Use cached lookup tables of this size (e.g. 256)")
+    parser.add_argument("--format", help="Output extension, e.g. png (default: same as input)")
+    parser.add_argument("--force", action="store_true", help="Rewrite outputs that are already up to date")
+    parser.add_argument("--severity", type=float, default=1.0, help="Severity for protan/deutan/tritan (0-1)")
+    parser.add_argument("--cache", action="store_true",
+                        help="Reuse results of identical images through the shared result cache")
+    args = parser.parse_args()
+
+    extension = "." + args.format.lstrip(".") if args.format else None
+    stats = run_batch(args.inputs, args.deficiency or list(deficiency_matrices), args.output_dir,
+                      args.workers, args.lut_size, extension, args.force, severity=args.severity,
+                      cache=args.cache)
+
+    print(f"Processed {stats['images']} images ({stats['outputs']} outputs), "
+          f"skipped {stats['skipped']} up-to-date outputs, {stats['failed']} failed")
+    print(f"{stats['seconds']:.2f}s, {stats['images_per_second']:.1f} images/s, "
+          f"{stats['mb_per_second']:.1f} MB/s read, {stats['bytes_written'] / 1e6:.1f} MB written")
+
+if __name__ == "__main__":
+    main()
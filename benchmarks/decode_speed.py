@@ -0,0 +1,101 @@
+#########  ***** REDUCED DECODE BENCHMARK  ******  ##########
+
+#  Compares a full decode followed by a downscale with the reduced-resolution decode of
+#  image_decode.py, on synthetic JPEGs (and optionally real images) at the target sizes the
+#  tools use: the 400x400 GUI preview, the 300x300 KMeans palette input and an 800px sheet cell.
+#
+#    python benchmarks/decode_speed.py
+#    python benchmarks/decode_speed.py --sizes 24mp --images photo.jpg --output decode.json
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from image_decode import decode_image, imread_reduced
+from run_benchmarks import SIZES, synthetic_image
+
+# (label, target size, fit)
+TARGETS = [
+    ("preview 400x400", (400, 400), True),
+    ("kmeans 300x300", (300, 300), False),
+    ("sheet 800px", (800, 800), True),
+]
+
+def full_pil(path, target_size, fit):
+    image = Image.open(path).convert("RGB")
+    if fit:
+        image.thumbnail(target_size)
+        return image
+    return image.resize(target_size)
+
+def full_cv2(path, target_size, fit):
+    image = cv2.imread(path)
+    height, width = image.shape[:2]
+    scale = min(target_size[0] / width, target_size[1] / height)
+    size = (round(width * scale), round(height * scale)) if fit else target_size
+    return cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+
+METHODS = [
+    ("pil full", full_pil),
+    ("pil reduced", lambda path, size, fit: decode_image(path, size, fit)),
+    ("cv2 full", full_cv2),
+    ("cv2 reduced", lambda path, size, fit: imread_reduced(path, size, fit)),
+]
+
+def best_time(function, repeats):
+    function()
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times), statistics.median(times)
+
+def main():
+    parser = argparse.ArgumentParser(description="Time full vs reduced-resolution decoding.")
+    parser.add_argument("--sizes", default="12mp,24mp", help=f"Comma-separated synthetic sizes: {', '.join(SIZES)}")
+    parser.add_argument("--images", nargs="*", default=[], help="Real images to time as well")
+    parser.add_argument("--quality", type=int, default=90, help="JPEG quality of the synthetic images")
+    parser.add_argument("--repeats", type=int, default=5, help="Timed runs per measurement")
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    args = parser.parse_args()
+
+    rows = []
+    with tempfile.TemporaryDirectory() as folder:
+        inputs = []
+        for label in filter(None, args.sizes.split(",")):
+            path = os.path.join(folder, f"{label}.jpg")
+            Image.fromarray(synthetic_image(*SIZES[label])).save(path, quality=args.quality)
+            inputs.append((label, path))
+        inputs += [(os.path.basename(path), path) for path in args.images]
+
+        for label, path in inputs:
+            for target_label, target_size, fit in TARGETS:
+                baseline = {}
+                for method, function in METHODS:
+                    best, median = best_time(lambda: function(path, target_size, fit), args.repeats)
+                    library = method.split()[0]
+                    baseline.setdefault(library, best)
+                    speedup = baseline[library] / best
+                    rows.append({"image": label, "target": target_label, "method": method,
+                                 "seconds_min": best, "seconds_median": median, "speedup": speedup})
+                    print(f"{label:<14}{target_label:<18}{method:<13}{best * 1000:>9.1f} ms{speedup:>7.1f}x")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(rows, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+#########  ***** IMPORT TIME MEASUREMENT  ******  ##########
+
+#  Measures how long a fresh interpreter needs to import each module of the project, and which
+#  heavy libraries that pulls in. Every statement runs in its own subprocess so nothing is
+#  cached between measurements; the reported time is the median of several runs.
+#
+#    python benchmarks/import_time.py
+#    python benchmarks/import_time.py --max-ms 400 --output import_times.json
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Libraries that must not be imported by the headless code paths
+HEAVY_MODULES = ("sklearn", "matplotlib", "cv2", "ipywidgets", "IPython", "tkinter")
+
+# (label, statement to time, heavy libraries it is allowed to import)
+STATEMENTS = [
+    ("python", "pass", ()),
+    ("numpy", "import numpy", ()),
+    ("cvd_toolkit", "import cvd_toolkit", ()),
+    ("cvd_toolkit.daltonize", "import cvd_toolkit; cvd_toolkit.daltonize", ()),
+    ("cvd_toolkit.octree_palette", "import cvd_toolkit; cvd_toolkit.octree_palette", ()),
+    ("cvd_toolkit.get_color_namer", "import cvd_toolkit; cvd_toolkit.get_color_namer", ()),
+    ("cvd_toolkit.extract_palette_colors", "import cvd_toolkit; cvd_toolkit.extract_palette_colors", ()),
+    ("cvd_toolkit.apply_cvd_lab_simulation", "import cvd_toolkit; cvd_toolkit.apply_cvd_lab_simulation", ("cv2",)),
+    ("batch_daltonize", "import batch_daltonize", ()),
+    ("palette_dataset", "import palette_dataset", ()),
+]
+
+MEASURE = """
+import sys, time, json
+start = time.perf_counter()
+{statement}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "heavy": sorted(m for m in {heavy!r} if m in sys.modules)}}))
+"""
+
+def measure(statement, runs=5):
+    """
+    Import-time of `statement` in fresh interpreters.
+
+    Returns:
+        tuple: (median seconds, list of heavy modules that were imported).
+    """
+    times, heavy = [], []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, "-c", MEASURE.format(statement=statement, heavy=HEAVY_MODULES)],
+                                cwd=REPO_DIR, capture_output=True, text=True, check=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        times.append(result["seconds"])
+        heavy = result["heavy"]
+    return statistics.median(times), heavy
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the import time of the project modules.")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per statement")
+    parser.add_argument("--max-ms", type=float,
+                        help="Fail when a cvd_toolkit import takes longer than this many milliseconds")
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    args = parser.parse_args()
+
+    rows, failures = [], []
+    print(f"{'import':<42}{'time':>10}  heavy libraries")
+    for label, statement, allowed in STATEMENTS:
+        seconds, heavy = measure(statement, args.runs)
+        rows.append({"import": label, "seconds": seconds, "heavy": heavy})
+        print(f"{label:<42}{seconds * 1000:>7.1f} ms  {', '.join(heavy) or '-'}")
+
+        unexpected = [m for m in heavy if m not in allowed]
+        if unexpected:
+            failures.append(f"{label} imports {', '.join(unexpected)}")
+        if args.max_ms and label.startswith("cvd_toolkit") and seconds * 1000 > args.max_ms:
+            failures.append(f"{label} takes {seconds * 1000:.1f} ms (limit {args.max_ms:.0f} ms)")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(rows, f, indent=2)
+
+    for message in failures:
+        print(f"FAIL: {message}")
+    if failures:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+#########  ***** LOAD TEST FOR THE DALTONIZATION SERVICE  ******  ##########
+
+#  Sends concurrent requests to a daltonize_service.py instance on this machine and reports
+#  throughput, latency percentiles and rejected requests, followed by the service's own
+#  queue and worker metrics. With --start-server a fresh instance is started on a free port
+#  and stopped again afterwards.
+#
+#    python benchmarks/load_test.py --start-server --requests 200 --concurrency 16
+#    python benchmarks/load_test.py --url http://127.0.0.1:8765 --image photo.jpg -d protan -d deutan
+
+import argparse
+import http.client
+import io
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode, urlsplit
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from PIL import Image
+
+from run_benchmarks import SIZES, synthetic_image
+
+def encode_image(path=None, size="1mp"):
+    """Return PNG bytes of `path` (re-encoded as-is) or of a synthetic image."""
+    if path:
+        with open(path, "rb") as f:
+            return f.read()
+    buffer = io.BytesIO()
+    Image.fromarray(synthetic_image(*SIZES[size])).save(buffer, "PNG")
+    return buffer.getvalue()
+
+def build_body(image, batch):
+    """Body and content type of one request, a multipart/form-data upload when `batch` > 1."""
+    if batch <= 1:
+        return image, "application/octet-stream"
+    boundary = uuid.uuid4().hex
+    parts = [f'--{boundary}\r\nContent-Disposition: form-data; name="image{i}"; filename="image{i}.png"\r\n'
+             f"Content-Type: image/png\r\n\r\n".encode() + image + b"\r\n" for i in range(batch)]
+    return b"".join(parts) + f"--{boundary}--\r\n".encode(), f"multipart/form-data; boundary={boundary}"
+
+def start_server(workers=None, extra_args=()):
+    """Start daltonize_service.py on a free port. Returns (process, base URL)."""
+    command = [sys.executable, os.path.join(REPO_DIR, "daltonize_service.py"), "--port", "0", *extra_args]
+    if workers:
+        command += ["--workers", str(workers)]
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, text=True, cwd=REPO_DIR)
+    line = process.stdout.readline()  # "Serving daltonize() on http://127.0.0.1:PORT (...)"
+    if "http://" not in line:
+        process.kill()
+        raise RuntimeError(f"Service did not start: {line!r}")
+    return process, line.split("on ", 1)[1].split()[0]
+
+def stop_server(process, timeout=30):
+    """Stop a service started by `start_server()`; SIGTERM lets it shut its worker pool down first."""
+    process.terminate()
+    try:
+        process.wait(timeout)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+def run_load(url, body, content_type, query, requests, concurrency):
+    """
+    Send `requests` POST /daltonize requests from `concurrency` threads with keep-alive connections.
+
+    Returns:
+        tuple: (list of (status, seconds, response bytes), elapsed seconds).
+    """
+    target = urlsplit(url)
+    local = threading.local()
+    path = "/daltonize?" + urlencode(query, doseq=True)
+
+    def send(_):
+        if getattr(local, "connection", None) is None:
+            local.connection = http.client.HTTPConnection(target.hostname, target.port, timeout=120)
+        start = time.perf_counter()
+        try:
+            local.connection.request("POST", path, body=body, headers={"Content-Type": content_type})
+            response = local.connection.getresponse()
+            data = response.read()
+            status = response.status
+            if response.getheader("Connection", "").lower() == "close":
+                local.connection.close()
+                local.connection = None
+        except (ConnectionError, http.client.HTTPException):
+            local.connection.close()
+            local.connection = None
+            status, data = 0, b""
+        return status, time.perf_counter() - start, len(data)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(send, range(requests)))
+    return results, time.perf_counter() - start
+
+def fetch_metrics(url):
+    target = urlsplit(url)
+    connection = http.client.HTTPConnection(target.hostname, target.port, timeout=10)
+    connection.request("GET", "/metrics")
+    text = connection.getresponse().read().decode()
+    connection.close()
+    return text
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test a local daltonization service.")
+    parser.add_argument("--url", default="http://127.0.0.1:8765", help="Base URL of a running service")
+    parser.add_argument("--start-server", action="store_true", help="Start a service on a free port for the test")
+    parser.add_argument("--server-workers", type=int, help="Worker processes of the started service")
+    parser.add_argument("--image", help="Image to upload (default: a synthetic PNG)")
+    parser.add_argument("--size", default="1mp", choices=list(SIZES), help="Size of the synthetic image")
+    parser.add_argument("-d", "--deficiency", action="append", help="Deficiency to request (repeatable)")
+    parser.add_argument("--batch", type=int, default=1, help="Images per request (multipart upload)")
+    parser.add_argument("-n", "--requests", type=int, default=100, help="Total number of requests")
+    parser.add_argument("-c", "--concurrency", type=int, default=8, help="Concurrent client connections")
+    args = parser.parse_args()
+
+    image = encode_image(args.image, args.size)
+    body, content_type = build_body(image, args.batch)
+    query = {"deficiency": args.deficiency or ["deutan"]}
+
+    process = None
+    url = args.url
+    if args.start_server:
+        process, url = start_server(args.server_workers)
+    try:
+        print(f"{args.requests} requests, {args.concurrency} connections, {len(body) / 1e6:.1f} MB per request "
+              f"-> {url}")
+        results, elapsed = run_load(url, body, content_type, query, args.requests, args.concurrency)
+
+        ok = [seconds for status, seconds, _ in results if status == 200]
+        statuses = {}
+        for status, _, _ in results:
+            statuses[status] = statuses.get(status, 0) + 1
+        print(f"Elapsed {elapsed:.2f}s, {len(ok) / elapsed:.1f} successful requests/s, "
+              f"{len(ok) * args.batch / elapsed:.1f} images/s")
+        print("Status counts: " + ", ".join(f"{status or 'error'}: {count}"
+                                            for status, count in sorted(statuses.items())))
+        if ok:
+            print(f"Latency p50 {percentile(ok, 0.5) * 1000:.1f} ms, p95 {percentile(ok, 0.95) * 1000:.1f} ms, "
+                  f"p99 {percentile(ok, 0.99) * 1000:.1f} ms, mean {statistics.mean(ok) * 1000:.1f} ms")
+
+        print("\nService metrics:")
+        for line in fetch_metrics(url).splitlines():
+            if not line.startswith("#") and "_bucket" not in line:
+                print("  " + line)
+    finally:
+        if process is not None:
+            stop_server(process)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+#########  ***** BENCHMARK SUITE  ******  ##########
+
+#  Times every image kernel in the project on synthetic images from thumbnail size up to
+#  24 MP (and optionally on real images), records throughput and peak traced memory, writes
+#  the results as JSON and compares them against a stored baseline. Runs headless: no Tk
+#  window is created and matplotlib uses the Agg backend.
+#
+#    python benchmarks/run_benchmarks.py --sizes thumb,1mp --output results.json
+#    python benchmarks/run_benchmarks.py --save-baseline            # store benchmarks/baseline.json
+#    python benchmarks/run_benchmarks.py --baseline benchmarks/baseline.json --threshold 0.2
+
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+os.environ.setdefault("MPLBACKEND", "Agg")  # Never open a plot window
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+import cv2
+import numpy as np
+from PIL import Image
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+# Synthetic image sizes (width, height)
+SIZES = {
+    "thumb": (256, 256),
+    "1mp": (1000, 1000),
+    "12mp": (4000, 3000),
+    "24mp": (6000, 4000),
+}
+
+def load_script(module_name, filename):
+    """Import one of the repository scripts whose file names contain spaces."""
+    spec = importlib.util.spec_from_file_location(module_name, os.path.join(REPO_DIR, filename))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def synthetic_image(width, height, seed=0):
+    """Deterministic RGB test image: smooth gradients, a few hundred solid objects and sensor noise."""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    image = np.empty((height, width, 3), dtype=np.uint8)
+    image[..., 0] = (x / max(width - 1, 1) * 255).astype(np.uint8)
+    image[..., 1] = (y / max(height - 1, 1) * 255).astype(np.uint8)
+    image[..., 2] = 128
+    del x, y
+
+    scale = max(width, height) / 1000
+    for _ in range(300):
+        center = (int(rng.integers(0, width)), int(rng.integers(0, height)))
+        radius = max(2, int(rng.integers(5, 60) * scale))
+        color = tuple(int(v) for v in rng.integers(0, 256, 3))
+        cv2.circle(image, center, radius, color, -1)
+
+    noise = rng.integers(-6, 7, size=image.shape, dtype=np.int16)
+    return np.clip(image + noise, 0, 255).astype(np.uint8)
+
+def build_cases(modules):
+    """
+    Return the benchmark cases as (name, repeats, function) where function takes a dict with
+    the 'rgb' and 'bgr' arrays and the 'path' of the image on disk.
+    """
+    daltonization, simulator, segmentation, palettes = modules
+    cases = []
+
+    for deficiency in daltonization.deficiency_matrices:
+        cases.append((f"daltonize[{deficiency}]", 5,
+                      lambda image, d=deficiency: daltonization.daltonize(image["rgb"], d)))
+
+    from tiled_daltonize import daltonize_tiled
+    cases.append(("daltonize_tiled[deutan]", 3,
+                  lambda image: daltonize_tiled(image["rgb"], "deutan", tile_pixels=1 << 16)))
+
+    def daltonize_image(image):
+        segmentation.simulate_active = False
+        segmentation.severity = 1.0
+        return segmentation.daltonize_image(image["bgr"], "Deuteranopia")
+    cases.append(("daltonize_image[Deuteranopia]", 5, daltonize_image))
+
+    for cvd_type, matrix in simulator.cvd_matrices.items():
+        cases.append((f"apply_cvd_lab_simulation[{cvd_type}]", 3,
+                      lambda image, m=matrix: simulator.apply_cvd_lab_simulation(image["rgb"], m, 10, 1.2, 5)))
+
+    def detect_and_draw(image):
+        frame = image["bgr"].copy()
+        contours = segmentation.detect_objects(frame)
+        index = segmentation.ContourIndex(contours, frame.shape, min_area=None)
+        segmentation.draw_highlighted_contour(frame, index)
+        return frame
+    cases.append(("detect_objects+draw_highlighted_contour", 3, detect_and_draw))
+
+    for scale in (1.0, 0.5):
+        cases.append((f"object_stats[scale={scale}]", 3,
+                      lambda image, s=scale: segmentation.ObjectStats(image["bgr"], segmentation.detection_lower,
+                                                                      segmentation.detection_upper,
+                                                                      segmentation.min_contour_area, s)))
+
+    from cvd_confusion import DELTA_E_METRICS, confusion_map
+    for metric in DELTA_E_METRICS:
+        cases.append((f"confusion_map[deutan,{metric}]", 1,
+                      lambda image, m=metric: confusion_map(image["rgb"], "deutan", metric=m)))
+
+    for engine in palettes.PALETTE_ENGINES:
+        cases.append((f"extract_color_palettes[{engine}]", 1,
+                      lambda image, e=engine: palettes.extract_color_palettes(image["path"], 98, 7, 14,
+                                                                               engine=e, show=False)))
+    return cases
+
+def check_tiled(daltonization, rgb, tile_pixels=12345):
+    """Fail when the tiled path does not reproduce the whole-image result bit for bit."""
+    from tiled_daltonize import daltonize_tiled
+    for deficiency in daltonization.deficiency_matrices:
+        whole = daltonization.daltonize(rgb, deficiency)
+        tiled = daltonize_tiled(rgb, deficiency, tile_pixels=tile_pixels)
+        if not np.array_equal(whole, tiled):
+            raise AssertionError(f"daltonize_tiled differs from daltonize for {deficiency!r}")
+
+def measure(function, image, repeats):
+    """Run `function` once to warm up, then time it `repeats` times and trace its peak memory once."""
+    function(image)
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function(image)
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    function(image)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return times, peak
+
+def run(sizes, image_files=(), case_filter=None, repeat_scale=1.0):
+    """Run all matching cases on every image and return the result rows."""
+    import Cluster_pallete_genera
+    import Daltonization
+    modules = (
+        Daltonization,
+        load_script("cvd_simulator", "CVD simulator.py"),
+        load_script("color_segmentation", "Color recognition with Object Segmentation for CVD.py"),
+        Cluster_pallete_genera,
+    )
+    cases = build_cases(modules)
+    if case_filter:
+        cases = [case for case in cases if any(f in case[0] for f in case_filter)]
+
+    inputs = [(label, lambda size=SIZES[label]: synthetic_image(*size)) for label in sizes]
+    inputs += [(f"file:{os.path.basename(path)}",
+                lambda path=path: np.asarray(Image.open(path).convert("RGB"))) for path in image_files]
+
+    rows = []
+    with tempfile.TemporaryDirectory() as folder:
+        for label, load in inputs:
+            rgb = load()
+            path = os.path.join(folder, "input.png")
+            Image.fromarray(rgb).save(path)
+            image = {"rgb": rgb, "bgr": np.ascontiguousarray(rgb[..., ::-1]), "path": path}
+            megapixels = rgb.shape[0] * rgb.shape[1] / 1e6
+            check_tiled(Daltonization, rgb)
+
+            for name, repeats, function in cases:
+                times, peak = measure(function, image, max(1, int(round(repeats * repeat_scale))))
+                best = min(times)
+                row = {
+                    "case": name,
+                    "image": label,
+                    "width": rgb.shape[1],
+                    "height": rgb.shape[0],
+                    "megapixels": megapixels,
+                    "repeats": len(times),
+                    "seconds_min": best,
+                    "seconds_median": statistics.median(times),
+                    "megapixels_per_second": megapixels / best if best > 0 else float("inf"),
+                    "peak_mb": peak / 1e6,
+                }
+                rows.append(row)
+                print(f"{name:<44}{label:>10}{best * 1000:>11.1f} ms{row['megapixels_per_second']:>9.1f} MP/s"
+                      f"{row['peak_mb']:>10.1f} MB")
+    return rows
+
+def environment():
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+def compare(rows, baseline_rows, time_threshold=0.25, memory_threshold=0.25, min_delta_ms=2.0):
+    """
+    Compare results with a baseline.
+
+    A case only counts as slower when it exceeds both the relative `time_threshold` and
+    `min_delta_ms`, so timer noise on thumbnail-sized cases does not fail the run.
+
+    Returns:
+        list of str: One message per case that got slower or used more memory than allowed.
+    """
+    baseline = {(row["case"], row["image"]): row for row in baseline_rows}
+    regressions = []
+    for row in rows:
+        reference = baseline.get((row["case"], row["image"]))
+        if reference is None:
+            continue
+        time_ratio = row["seconds_min"] / reference["seconds_min"] if reference["seconds_min"] else 1.0
+        memory_ratio = row["peak_mb"] / reference["peak_mb"] if reference["peak_mb"] else 1.0
+        delta_ms = (row["seconds_min"] - reference["seconds_min"]) * 1000
+        if time_ratio > 1 + time_threshold and delta_ms > min_delta_ms:
+            regressions.append(f"{row['case']} [{row['image']}]: {time_ratio:.2f}x slower "
+                               f"({reference['seconds_min'] * 1000:.1f} -> {row['seconds_min'] * 1000:.1f} ms)")
+        if memory_ratio > 1 + memory_threshold:
+            regressions.append(f"{row['case']} [{row['image']}]: {memory_ratio:.2f}x peak memory "
+                               f"({reference['peak_mb']:.1f} -> {row['peak_mb']:.1f} MB)")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the image kernels of the project.")
+    parser.add_argument("--sizes", default="thumb,1mp,12mp,24mp",
+                        help=f"Comma-separated synthetic sizes from {', '.join(SIZES)} (empty for none)")
+    parser.add_argument("--images", nargs="*", default=[], help="Real images to benchmark as well")
+    parser.add_argument("--cases", help="Comma-separated substrings, only matching cases are run")
+    parser.add_argument("--repeat-scale", type=float, default=1.0, help="Multiply the number of timed runs")
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--baseline", help="Compare against this results file")
+    parser.add_argument("--save-baseline", action="store_true", help=f"Write the results to {DEFAULT_BASELINE}")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Allowed slowdown before failing (0.25 = 25%%)")
+    parser.add_argument("--memory-threshold", type=float, default=0.25, help="Allowed peak memory growth")
+    parser.add_argument("--min-delta-ms", type=float, default=2.0,
+                        help="Ignore slowdowns smaller than this many milliseconds")
+    args = parser.parse_args()
+
+    sizes = [s for s in args.sizes.split(",") if s]
+    for size in sizes:
+        if size not in SIZES:
+            parser.error(f"Unknown size {size!r}")
+
+    print(f"{'case':<44}{'image':>10}{'time':>14}{'throughput':>14}{'peak':>10}")
+    rows = run(sizes, args.images, args.cases.split(",") if args.cases else None, args.repeat_scale)
+    report = {"environment": environment(), "results": rows}
+
+    for path in filter(None, [args.output, DEFAULT_BASELINE if args.save_baseline else None]):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Saved {path}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(rows, baseline["results"], args.threshold, args.memory_threshold, args.min_delta_ms)
+        for message in regressions:
+            print(f"REGRESSION: {message}")
+        if regressions:
+            sys.exit(1)
+        print("No regressions against the baseline.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,345 @@
+#########  ***** NEAREST COLOR NAME LOOKUP IN CIELAB  ******  ##########
+
+#  Names a color by its nearest neighbor in CIELAB (CIE76 delta E) among a dictionary of
+#  named colors. All matching happens once, up front: every cell of a quantized RGB cube is
+#  assigned its nearest name, so naming a pixel, a list of colors or a whole frame is a
+#  table lookup that costs the same whether the dictionary has ten names or thousands.
+
+import csv
+import json
+import os
+from functools import lru_cache
+
+import numpy as np
+
+# Basic hues in RGB order (the segmentation tool converts its BGR pixels before lookup)
+BASIC_COLORS = {
+    'Red': (255, 0, 0),
+    'Green': (0, 255, 0),
+    'Blue': (0, 0, 255),
+    'Yellow': (255, 255, 0),
+    'Orange': (255, 165, 0),
+    'Purple': (128, 0, 128),
+    'Cyan': (0, 255, 255),
+    'Magenta': (255, 0, 255),
+    'Black': (0, 0, 0),
+    'White': (255, 255, 255),
+}
+
+# The 148 CSS Color Module Level 4 named colors
+CSS_COLORS = {
+    'aliceblue': '#f0f8ff',
+    'antiquewhite': '#faebd7',
+    'aqua': '#00ffff',
+    'aquamarine': '#7fffd4',
+    'azure': '#f0ffff',
+    'beige': '#f5f5dc',
+    'bisque': '#ffe4c4',
+    'black': '#000000',
+    'blanchedalmond': '#ffebcd',
+    'blue': '#0000ff',
+    'blueviolet': '#8a2be2',
+    'brown': '#a52a2a',
+    'burlywood': '#deb887',
+    'cadetblue': '#5f9ea0',
+    'chartreuse': '#7fff00',
+    'chocolate': '#d2691e',
+    'coral': '#ff7f50',
+    'cornflowerblue': '#6495ed',
+    'cornsilk': '#fff8dc',
+    'crimson': '#dc143c',
+    'cyan': '#00ffff',
+    'darkblue': '#00008b',
+    'darkcyan': '#008b8b',
+    'darkgoldenrod': '#b8860b',
+    'darkgray': '#a9a9a9',
+    'darkgreen': '#006400',
+    'darkgrey': '#a9a9a9',
+    'darkkhaki': '#bdb76b',
+    'darkmagenta': '#8b008b',
+    'darkolivegreen': '#556b2f',
+    'darkorange': '#ff8c00',
+    'darkorchid': '#9932cc',
+    'darkred': '#8b0000',
+    'darksalmon': '#e9967a',
+    'darkseagreen': '#8fbc8f',
+    'darkslateblue': '#483d8b',
+    'darkslategray': '#2f4f4f',
+    'darkslategrey': '#2f4f4f',
+    'darkturquoise': '#00ced1',
+    'darkviolet': '#9400d3',
+    'deeppink': '#ff1493',
+    'deepskyblue': '#00bfff',
+    'dimgray': '#696969',
+    'dimgrey': '#696969',
+    'dodgerblue': '#1e90ff',
+    'firebrick': '#b22222',
+    'floralwhite': '#fffaf0',
+    'forestgreen': '#228b22',
+    'fuchsia': '#ff00ff',
+    'gainsboro': '#dcdcdc',
+    'ghostwhite': '#f8f8ff',
+    'gold': '#ffd700',
+    'goldenrod': '#daa520',
+    'gray': '#808080',
+    'green': '#008000',
+    'greenyellow': '#adff2f',
+    'grey': '#808080',
+    'honeydew': '#f0fff0',
+    'hotpink': '#ff69b4',
+    'indianred': '#cd5c5c',
+    'indigo': '#4b0082',
+    'ivory': '#fffff0',
+    'khaki': '#f0e68c',
+    'lavender': '#e6e6fa',
+    'lavenderblush': '#fff0f5',
+    'lawngreen': '#7cfc00',
+    'lemonchiffon': '#fffacd',
+    'lightblue': '#add8e6',
+    'lightcoral': '#f08080',
+    'lightcyan': '#e0ffff',
+    'lightgoldenrodyellow': '#fafad2',
+    'lightgray': '#d3d3d3',
+    'lightgreen': '#90ee90',
+    'lightgrey': '#d3d3d3',
+    'lightpink': '#ffb6c1',
+    'lightsalmon': '#ffa07a',
+    'lightseagreen': '#20b2aa',
+    'lightskyblue': '#87cefa',
+    'lightslategray': '#778899',
+    'lightslategrey': '#778899',
+    'lightsteelblue': '#b0c4de',
+    'lightyellow': '#ffffe0',
+    'lime': '#00ff00',
+    'limegreen': '#32cd32',
+    'linen': '#faf0e6',
+    'magenta': '#ff00ff',
+    'maroon': '#800000',
+    'mediumaquamarine': '#66cdaa',
+    'mediumblue': '#0000cd',
+    'mediumorchid': '#ba55d3',
+    'mediumpurple': '#9370db',
+    'mediumseagreen': '#3cb371',
+    'mediumslateblue': '#7b68ee',
+    'mediumspringgreen': '#00fa9a',
+    'mediumturquoise': '#48d1cc',
+    'mediumvioletred': '#c71585',
+    'midnightblue': '#191970',
+    'mintcream': '#f5fffa',
+    'mistyrose': '#ffe4e1',
+    'moccasin': '#ffe4b5',
+    'navajowhite': '#ffdead',
+    'navy': '#000080',
+    'oldlace': '#fdf5e6',
+    'olive': '#808000',
+    'olivedrab': '#6b8e23',
+    'orange': '#ffa500',
+    'orangered': '#ff4500',
+    'orchid': '#da70d6',
+    'palegoldenrod': '#eee8aa',
+    'palegreen': '#98fb98',
+    'paleturquoise': '#afeeee',
+    'palevioletred': '#db7093',
+    'papayawhip': '#ffefd5',
+    'peachpuff': '#ffdab9',
+    'peru': '#cd853f',
+    'pink': '#ffc0cb',
+    'plum': '#dda0dd',
+    'powderblue': '#b0e0e6',
+    'purple': '#800080',
+    'rebeccapurple': '#663399',
+    'red': '#ff0000',
+    'rosybrown': '#bc8f8f',
+    'royalblue': '#4169e1',
+    'saddlebrown': '#8b4513',
+    'salmon': '#fa8072',
+    'sandybrown': '#f4a460',
+    'seagreen': '#2e8b57',
+    'seashell': '#fff5ee',
+    'sienna': '#a0522d',
+    'silver': '#c0c0c0',
+    'skyblue': '#87ceeb',
+    'slateblue': '#6a5acd',
+    'slategray': '#708090',
+    'slategrey': '#708090',
+    'snow': '#fffafa',
+    'springgreen': '#00ff7f',
+    'steelblue': '#4682b4',
+    'tan': '#d2b48c',
+    'teal': '#008080',
+    'thistle': '#d8bfd8',
+    'tomato': '#ff6347',
+    'turquoise': '#40e0d0',
+    'violet': '#ee82ee',
+    'wheat': '#f5deb3',
+    'white': '#ffffff',
+    'whitesmoke': '#f5f5f5',
+    'yellow': '#ffff00',
+    'yellowgreen': '#9acd32',
+}
+
+def parse_color(value):
+    """Turn '#rrggbb', 'rrggbb' or an (r, g, b) sequence into an (r, g, b) tuple of ints."""
+    if isinstance(value, str):
+        value = value.strip().lstrip('#')
+        if len(value) != 6:
+            raise ValueError(f"Invalid hex color {value!r}")
+        return tuple(int(value[i:i + 2], 16) for i in (0, 2, 4))
+    r, g, b = (int(v) for v in value)
+    return r, g, b
+
+def _linearize(rgb):
+    linear = np.asarray(rgb, dtype=np.float32) / 255.0
+    return np.where(linear <= 0.04045, linear / 12.92, ((linear + 0.055) / 1.055) ** 2.4)
+
+@lru_cache(maxsize=1)
+def _srgb_to_linear():
+    """Linear value of each of the 256 uint8 sRGB levels (float32)."""
+    return _linearize(np.arange(256, dtype=np.uint8))
+
+def rgb_to_lab(rgb):
+    """
+    Convert sRGB colors to CIELAB (D65 white point).
+
+    Parameters:
+        rgb (numpy array): uint8 or 0-255 values with RGB in the last axis.
+
+    Returns:
+        numpy array: float32 array of the same shape holding L*, a*, b*.
+    """
+    rgb = np.asarray(rgb)
+    if rgb.dtype == np.uint8:
+        linear = _srgb_to_linear()[rgb]  # Same values as below, without a power per pixel
+    else:
+        linear = _linearize(rgb)
+    xyz = linear @ np.array([[0.4124564, 0.3575761, 0.1804375],
+                             [0.2126729, 0.7151522, 0.0721750],
+                             [0.0193339, 0.1191920, 0.9503041]], dtype=np.float32).T
+    xyz /= np.array([0.95047, 1.0, 1.08883], dtype=np.float32)
+    f = np.where(xyz > (6 / 29) ** 3, np.cbrt(xyz), xyz / (3 * (6 / 29) ** 2) + 4 / 29)
+    lab = np.empty_like(f)
+    lab[..., 0] = 116 * f[..., 1] - 16
+    lab[..., 1] = 500 * (f[..., 0] - f[..., 1])
+    lab[..., 2] = 200 * (f[..., 1] - f[..., 2])
+    return lab
+
+def load_color_names(source):
+    """
+    Load a name -> (r, g, b) dictionary.
+
+    Parameters:
+        source (str or dict): 'basic', 'css', 'xkcd' (needs matplotlib), a .json file mapping
+            names to hex strings or [r, g, b] lists, a .csv file with rows of name,hex or
+            name,r,g,b, or a dictionary that is used as is.
+
+    Returns:
+        dict: Color names mapped to (r, g, b) tuples.
+    """
+    if isinstance(source, dict):
+        colors = source
+    elif source == 'basic':
+        colors = BASIC_COLORS
+    elif source == 'css':
+        colors = CSS_COLORS
+    elif source == 'xkcd':
+        from matplotlib.colors import XKCD_COLORS
+        colors = {name[len('xkcd:'):]: value for name, value in XKCD_COLORS.items()}
+    elif os.path.splitext(source)[1].lower() == '.json':
+        with open(source, encoding='utf-8') as f:
+            colors = json.load(f)
+    elif os.path.splitext(source)[1].lower() == '.csv':
+        colors = {}
+        with open(source, newline='', encoding='utf-8') as f:
+            for row in csv.reader(f):
+                if len(row) == 2:
+                    colors[row[0]] = row[1]
+                elif len(row) == 4 and row[1].strip().isdigit():
+                    colors[row[0]] = row[1:]
+    else:
+        raise ValueError(f"Unknown color dictionary {source!r}")
+
+    return {name: parse_color(value) for name, value in colors.items()}
+
+class ColorNamer:
+    """
+    Nearest color name lookup through a precomputed quantized RGB table.
+
+    Parameters:
+        colors (dict): Color names mapped to (r, g, b) values.
+        bits (int): Bits kept per channel for the table. 5 gives a 32^3 table (64 KB),
+            6 gives 64^3 (512 KB) and follows the exact nearest name more closely.
+    """
+
+    def __init__(self, colors, bits=5):
+        if not 1 <= bits <= 8:
+            raise ValueError("bits must be between 1 and 8.")
+        if not 0 < len(colors) <= np.iinfo(np.uint16).max:
+            raise ValueError("Color dictionary must contain between 1 and 65535 names.")
+
+        self.names = np.array(list(colors), dtype=object)
+        self.rgb = np.array([parse_color(c) for c in colors.values()], dtype=np.uint8)
+        self.lab = rgb_to_lab(self.rgb)
+        self.bits = bits
+        self.table = self._build_table()
+
+    def _build_table(self, chunk=8192):
+        # Match the center of every quantization cell against the dictionary in CIELAB
+        levels = 1 << self.bits
+        step = 256 // levels
+        centers = np.arange(levels) * step + step // 2
+        grid = np.stack(np.meshgrid(centers, centers, centers, indexing='ij'), axis=-1).reshape(-1, 3)
+
+        names_lab = self.lab
+        names_sq = (names_lab ** 2).sum(axis=1)
+        table = np.empty(len(grid), dtype=np.uint16)
+        for start in range(0, len(grid), chunk):
+            lab = rgb_to_lab(grid[start:start + chunk])
+            # Squared delta E via |a|^2 - 2ab + |b|^2, one matmul per chunk
+            distances = names_sq[None, :] - 2 * lab @ names_lab.T
+            table[start:start + chunk] = distances.argmin(axis=1)
+        return table
+
+    def _table_index(self, rgb):
+        rgb = np.asarray(rgb, dtype=np.uint8)
+        shift = 8 - self.bits
+        r, g, b = (rgb[..., i].astype(np.int32) >> shift for i in range(3))
+        return (r << (2 * self.bits)) | (g << self.bits) | b
+
+    def indices(self, image, bgr=False):
+        """
+        Return the dictionary index of the nearest name for every pixel.
+
+        Parameters:
+            image (numpy array): uint8 colors with the channels in the last axis,
+                e.g. an (H, W, 3) frame or an (N, 3) list of region colors.
+            bgr (bool): Channels are in OpenCV's BGR order.
+
+        Returns:
+            numpy array: uint16 indices into `names`, same shape without the last axis.
+        """
+        image = np.asarray(image)[..., :3]
+        if bgr:
+            image = image[..., ::-1]
+        return self.table[self._table_index(image)]
+
+    def name_colors(self, colors, bgr=False):
+        """Return the nearest name for each color as an object array."""
+        return self.names[self.indices(colors, bgr)]
+
+    def name(self, color, bgr=False):
+        """Return the nearest name of a single color."""
+        return str(self.names[self.indices(np.asarray(color).reshape(1, 3), bgr)[0]])
+
+@lru_cache(maxsize=8)
+def _shared_namer(source, bits):
+    return ColorNamer(load_color_names(source), bits)
+
+def get_color_namer(source='css', bits=5):
+    """
+    Return a `ColorNamer` for one of the sources accepted by `load_color_names()`.
+
+    Namers for built-in names and files are shared; a dictionary gets a new namer each call.
+    """
+    if isinstance(source, dict):
+        return ColorNamer(load_color_names(source), bits)
+    return _shared_namer(source, bits)
@@ -0,0 +1,216 @@
+#########  ***** MULTI-DEFICIENCY FAN-OUT AND COMPARISON SHEETS  ******  ##########
+
+#  Produces every deficiency variant of an image in a single pass: the N 3x3 matrices are
+#  stacked into one (3N, 3) matrix, so each band of pixels is read once and multiplied once,
+#  and the LAB brightness/contrast work of the simulator is done once for all variants.
+#  Results are written straight into the cells of a preallocated contact sheet, which is saved
+#  with PIL (no matplotlib), so comparison sheets for whole folders are cheap.
+#
+#    python contact_sheet.py photos/ -o sheets --mode simulate --severity 0.5 --severity 1
+#    python contact_sheet.py photo.jpg -o sheets --mode lab --brightness 10 --hue-shift 5
+
+import argparse
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from batch_daltonize import collect_images, completed_jobs
+from cvd_transforms import daltonization_matrix, simulation_matrix
+from image_decode import load_rgb
+
+SHEET_MODES = ("simulate", "correct", "lab")
+BAND_PIXELS = 1 << 18  # Pixels per band, bounds the (pixels, 3N) float64 temporary
+LABEL_HEIGHT = 22
+PADDING = 8
+BACKGROUND = (255, 255, 255)
+
+def variant_matrices(mode, deficiencies=("protan", "deutan", "tritan"), severities=(1.0,)):
+    """
+    Return the (label, 3x3 matrix) pairs of every deficiency/severity combination.
+
+    Parameters:
+        mode (str): 'simulate' or 'lab' use the simulation matrices, 'correct' the daltonization ones.
+        deficiencies (list of str): Names accepted by cvd_transforms.
+        severities (list of float): Severities from 0 to 1.
+    """
+    if mode not in SHEET_MODES:
+        raise ValueError("Invalid sheet mode.")
+    build = daltonization_matrix if mode == "correct" else simulation_matrix
+    variants = []
+    for deficiency in deficiencies:
+        for severity in severities:
+            label = deficiency if len(severities) == 1 else f"{deficiency} {severity:g}"
+            variants.append((label, build(deficiency, severity)))
+    return variants
+
+def _bands(height, width, band_pixels=BAND_PIXELS):
+    rows = max(1, band_pixels // max(width, 1))
+    for top in range(0, height, rows):
+        yield slice(top, min(top + rows, height))
+
+def apply_matrices(image_array, matrices, outs):
+    """
+    Apply N color matrices to an RGB image with one stacked matmul per band of rows.
+
+    Gives the same result as `apply_matrix()` for each matrix.
+
+    Parameters:
+        image_array (numpy array): uint8 RGB(A) image.
+        matrices (list of numpy array): 3x3 matrices.
+        outs (list of numpy array): One uint8 (H, W, 3) array or view per matrix to write into.
+    """
+    stacked = np.concatenate([np.asarray(matrix, dtype=np.float64) for matrix in matrices]).T  # (3, 3N)
+    height, width = image_array.shape[:2]
+    for rows in _bands(height, width):
+        transformed = image_array[rows, :, :3].astype(np.float64) @ stacked  # (band, W, 3N)
+        np.clip(transformed, 0, 255, out=transformed)
+        for i, out in enumerate(outs):
+            np.copyto(out[rows], transformed[..., 3 * i:3 * i + 3], casting="unsafe")
+
+def apply_lab_simulations(image_array, matrices, outs, brightness=0, contrast=1, hue_shift=0):
+    """
+    Run the simulator's `apply_cvd_lab_simulation()` for N matrices at once.
+
+    The LAB conversion, the brightness/contrast adjustment of L* and the conversion back to
+    RGB do not depend on the matrix and are done once per band; the matrices are applied with
+    one stacked matmul. Each output is identical to `apply_cvd_lab_simulation()`.
+
+    Parameters:
+        image_array (numpy array): uint8 RGB image.
+        matrices (list of numpy array): 3x3 simulation matrices.
+        outs (list of numpy array): One uint8 (H, W, 3) array or view per matrix to write into.
+        brightness, contrast, hue_shift: The simulator's adjustments.
+    """
+    import cv2
+
+    stacked = np.concatenate([np.asarray(matrix, dtype=np.float64) for matrix in matrices]).T
+    height, width = image_array.shape[:2]
+    for rows in _bands(height, width):
+        # Shared part: adjust L* once for every variant
+        img_lab = cv2.cvtColor(np.ascontiguousarray(image_array[rows, :, :3]), cv2.COLOR_RGB2LAB).astype(np.float32)
+        l_channel, a_channel, b_channel = cv2.split(img_lab)
+        l_channel = cv2.add(l_channel, brightness)
+        l_channel = cv2.multiply(l_channel, contrast)
+        l_channel = np.clip(l_channel, 0, 255)
+        img_rgb = cv2.cvtColor(cv2.merge([l_channel, a_channel, b_channel]).astype(np.uint8), cv2.COLOR_LAB2RGB)
+
+        # One matmul for all matrices, then the per-variant hue adjustment
+        transformed = (img_rgb / 255.0) @ stacked
+        transformed = np.clip(transformed * 255, 0, 255).astype(np.uint8)
+        for i, out in enumerate(outs):
+            variant = np.ascontiguousarray(transformed[..., 3 * i:3 * i + 3])
+            _, a_channel, b_channel = cv2.split(cv2.cvtColor(variant, cv2.COLOR_RGB2LAB).astype(np.float32))
+            a_channel += hue_shift
+            b_channel -= hue_shift
+            img_lab_final = np.clip(cv2.merge([l_channel, a_channel, b_channel]), 0, 255).astype(np.uint8)
+            out[rows] = cv2.cvtColor(img_lab_final, cv2.COLOR_LAB2RGB)
+
+def sheet_layout(cell_height, cell_width, cells, columns=None, padding=PADDING, label_height=LABEL_HEIGHT):
+    """
+    Return the sheet shape and the top-left corner of every cell's image area.
+
+    Returns:
+        tuple: ((sheet height, sheet width), list of (top, left)).
+    """
+    columns = columns or (cells if cells <= 4 else math.ceil(math.sqrt(cells)))
+    rows = math.ceil(cells / columns)
+    step_y = label_height + cell_height + padding
+    step_x = cell_width + padding
+    origins = [(padding + (i // columns) * step_y + label_height, padding + (i % columns) * step_x)
+               for i in range(cells)]
+    return (padding + rows * step_y, padding + columns * step_x), origins
+
+def make_contact_sheet(image_array, variants, mode="simulate", include_original=True, columns=None,
+                       brightness=0, contrast=1, hue_shift=0, out=None):
+    """
+    Render every variant of an image into one comparison sheet.
+
+    Parameters:
+        image_array (numpy array): uint8 RGB image.
+        variants (list of tuple): (label, 3x3 matrix) pairs, e.g. from `variant_matrices()`.
+        mode (str): 'simulate'/'correct' apply the matrices directly, 'lab' runs the simulator's
+            LAB pipeline with `brightness`, `contrast` and `hue_shift`.
+        include_original (bool): Put the unmodified image in the first cell.
+        columns (int, optional): Cells per row, by default up to 4 in one row, else a square grid.
+        out (numpy array, optional): Preallocated uint8 sheet of the shape `sheet_layout()` returns.
+
+    Returns:
+        numpy array: The uint8 RGB sheet.
+    """
+    if mode not in SHEET_MODES:
+        raise ValueError("Invalid sheet mode.")
+    height, width = image_array.shape[:2]
+    labels = (["original"] if include_original else []) + [label for label, _ in variants]
+    shape, origins = sheet_layout(height, width, len(labels), columns)
+    if out is None:
+        out = np.empty(shape + (3,), dtype=np.uint8)
+    out[...] = BACKGROUND
+
+    cells = [out[top:top + height, left:left + width] for top, left in origins]
+    if include_original:
+        cells[0][...] = image_array[..., :3]
+        cells = cells[1:]
+    matrices = [matrix for _, matrix in variants]
+    if mode == "lab":
+        apply_lab_simulations(image_array, matrices, cells, brightness, contrast, hue_shift)
+    else:
+        apply_matrices(image_array, matrices, cells)
+
+    # Labels are drawn on the small strips above the cells only
+    for label, (top, left) in zip(labels, origins):
+        strip = Image.fromarray(out[top - LABEL_HEIGHT:top, left:left + width])
+        ImageDraw.Draw(strip).text((2, 4), label, fill=(0, 0, 0))
+        out[top - LABEL_HEIGHT:top, left:left + width] = np.asarray(strip)
+    return out
+
+def sheet_for_file(image_path, target, variants, mode="simulate", max_side=None, columns=None,
+                   brightness=0, contrast=1, hue_shift=0):
+    """Write the comparison sheet of one image file to `target`."""
+    image_array = load_rgb(image_path, (max_side, max_side) if max_side else None)
+    sheet = make_contact_sheet(image_array, variants, mode, columns=columns,
+                               brightness=brightness, contrast=contrast, hue_shift=hue_shift)
+    os.makedirs(os.path.dirname(target) or ".", exist_ok=True)
+    Image.fromarray(sheet).save(target)
+    return target
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a comparison sheet of every CVD variant per image.")
+    parser.add_argument("inputs", nargs="+", help="Image files, directories or glob patterns")
+    parser.add_argument("-o", "--output-dir", default="sheets", help="Output directory")
+    parser.add_argument("--mode", choices=SHEET_MODES, default="simulate",
+                        help="simulate, correct (daltonize) or lab (simulator with adjustments)")
+    parser.add_argument("-d", "--deficiency", action="append", help="Deficiency to include (repeatable)")
+    parser.add_argument("--severity", type=float, action="append", help="Severity to include (repeatable)")
+    parser.add_argument("--brightness", type=float, default=0, help="L* offset in lab mode")
+    parser.add_argument("--contrast", type=float, default=1, help="L* gain in lab mode")
+    parser.add_argument("--hue-shift", type=float, default=0, help="a*/b* shift in lab mode")
+    parser.add_argument("--max-side", type=int, default=800, help="Downscale each image to this size first (0 keeps it)")
+    parser.add_argument("--columns", type=int, help="Cells per row")
+    parser.add_argument("--format", default="png", help="Output format, e.g. png or jpg")
+    parser.add_argument("-j", "--workers", type=int, help="Number of worker processes")
+    parser.add_argument("--max-pending", type=int, help="Images queued at once (default: 2 per worker)")
+    args = parser.parse_args()
+
+    default_deficiencies = ["protan", "deutan", "tritan"] + (["achromat"] if args.mode != "correct" else [])
+    variants = variant_matrices(args.mode, args.deficiency or default_deficiencies, args.severity or [1.0])
+    jobs = [(image_path, os.path.join(args.output_dir, os.path.splitext(relative)[0] + "_sheet." + args.format),
+             variants, args.mode, args.max_side or None, args.columns, args.brightness, args.contrast, args.hue_shift)
+            for image_path, relative in collect_images(args.inputs, exclude=[args.output_dir])]
+
+    workers = args.workers or os.cpu_count() or 1
+    failed = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for job, future in completed_jobs(executor, sheet_for_file, jobs, args.max_pending or 2 * workers):
+            try:
+                print(f"Saved {future.result()}")
+            except Exception as error:
+                failed += 1
+                print(f"Error: Unable to process {job[0]}: {error}")
+    if failed:
+        print(f"{failed} image(s) failed")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+#########  ***** CONTOUR CACHE AND HOVER HIT-TEST INDEX  ******  ##########
+
+#  Object detection only has to run again when the frame or the detection settings change.
+#  ContourIndex keeps the contours that pass the area filter together with a label image,
+#  so finding the object under the mouse is a single array lookup instead of a
+#  pointPolygonTest per contour.
+
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+class ContourIndex:
+    """
+    Contours above `min_area` plus a label image mapping each pixel to its contour.
+    With `min_area=None` the contours are taken as they are, e.g. already filtered by
+    object_stats.label_objects().
+    """
+
+    def __init__(self, contours, shape, min_area=500):
+        # Area filter runs once here instead of on every redraw
+        if min_area is None:
+            self.contours = list(contours)
+        else:
+            self.contours = [cnt for cnt in contours if cv2.contourArea(cnt) > min_area]
+        self.labels = np.zeros(shape[:2], dtype=np.int32)
+        # Largest first, so an object lying in the hole of another one is filled after it
+        # and keeps its own label
+        areas = [cv2.contourArea(cnt) for cnt in self.contours]
+        for i in sorted(range(len(self.contours)), key=lambda i: -areas[i]):
+            cnt = self.contours[i]
+            # Filled interior plus outline, matching pointPolygonTest(...) >= 0
+            cv2.drawContours(self.labels, [cnt], -1, i + 1, thickness=cv2.FILLED)
+            cv2.drawContours(self.labels, [cnt], -1, i + 1, thickness=1)
+
+    def __len__(self):
+        return len(self.contours)
+
+    def hit(self, x, y):
+        """Return the index of the contour containing (x, y), or -1."""
+        if 0 <= y < self.labels.shape[0] and 0 <= x < self.labels.shape[1]:
+            return int(self.labels[y, x]) - 1
+        return -1
+
+    def draw(self, frame, color=(255, 0, 0), thickness=2, highlight=-1, highlight_color=(0, 255, 0)):
+        """Draw every contour, with the one at index `highlight` in `highlight_color`."""
+        if self.contours:
+            cv2.drawContours(frame, self.contours, -1, color, thickness)
+        if 0 <= highlight < len(self.contours):
+            cv2.drawContours(frame, [self.contours[highlight]], -1, highlight_color, thickness)
+        return frame
+
+class FrameResultCache:
+    """
+    Small LRU cache of per-frame results keyed by (frame object, settings).
+
+    Frames are matched by identity and a reference is kept with each entry, so a new frame
+    never picks up a result computed for an old one.
+    """
+
+    def __init__(self, maxsize=8):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, frame, settings):
+        key = (id(frame), settings)
+        entry = self._entries.get(key)
+        if entry is None or entry[0] is not frame:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, frame, settings, value):
+        self._entries[(id(frame), settings)] = (frame, value)
+        self._entries.move_to_end((id(frame), settings))
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        self._entries.clear()
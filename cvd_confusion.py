@@ -0,0 +1,369 @@
+#########  ***** CVD CONFUSION HEATMAPS AND PALETTE CONFUSABILITY  ******  ##########
+
+#  Answers "which colors of this image or palette will a deuteranope confuse?":
+#
+#    confusion_map()          per-pixel delta E between the original and the simulated image,
+#                             computed in float32 bands of rows so memory stays bounded
+#    confusability_matrix()   pairwise delta E between palette colors as seen with a deficiency;
+#                             pairs that are distinct for normal vision but close here are the
+#                             ones that will be confused
+#
+#  Both use the simulation matrices of cvd_transforms.py and rgb_to_lab() of color_names.py,
+#  with CIE76 (Euclidean in CIELAB, fastest) or CIEDE2000 (perceptually uniform) delta E.
+#  The delta E of a pixel depends only on its RGB value, so for whole asset libraries it is
+#  baked once into a table with one float32 per 8-bit RGB color (64 MB), cached next to the
+#  daltonization lookup tables and memory-mapped; a heatmap is then a single gather.
+#
+#    python cvd_confusion.py photos/ -d deutan -o heatmaps -j 8
+#    python cvd_confusion.py photo.jpg --palette --metric cie76
+
+import argparse
+import hashlib
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+from batch_daltonize import collect_images, completed_jobs
+from color_names import rgb_to_lab
+from cvd_transforms import apply_matrix, canonical_deficiency, simulation_matrix
+from result_cache import file_key, make_key, resolve_cache
+
+DELTA_E_METRICS = ("ciede2000", "cie76")
+BAND_PIXELS = 1 << 18  # Pixels per band, bounds the float32 temporaries
+CONFUSION_THRESHOLD = 10.0  # Delta E below which two colors are treated as confusable
+NOTICEABLE_DELTA_E = 20.0  # Delta E above which two colors are clearly distinct for normal vision
+TABLE_VERSION = 1  # Part of the table file names, bump after changing the delta E code
+
+_loaded_tables = {}  # (deficiency, severity, metric, cache_dir) -> table
+
+def delta_e_76(lab1, lab2):
+    """CIE76 color difference: Euclidean distance in CIELAB (float32)."""
+    diff = np.asarray(lab1, dtype=np.float32) - np.asarray(lab2, dtype=np.float32)
+    return np.sqrt((diff * diff).sum(axis=-1))
+
+def delta_e_2000(lab1, lab2):
+    """
+    CIEDE2000 color difference (kL = kC = kH = 1) of two arrays of CIELAB colors.
+
+    Parameters:
+        lab1, lab2 (numpy array): L*, a*, b* in the last axis, broadcastable against each other.
+
+    Returns:
+        numpy array: float32 delta E with the broadcast shape without the last axis.
+    """
+    lab1 = np.asarray(lab1, dtype=np.float32)
+    lab2 = np.asarray(lab2, dtype=np.float32)
+    l1, a1, b1 = lab1[..., 0], lab1[..., 1], lab1[..., 2]
+    l2, a2, b2 = lab2[..., 0], lab2[..., 1], lab2[..., 2]
+
+    c_mean = (np.hypot(a1, b1) + np.hypot(a2, b2)) / 2
+    c_mean7 = c_mean ** 7
+    g = 0.5 * (1 - np.sqrt(c_mean7 / (c_mean7 + np.float32(25.0 ** 7))))
+    a1p, a2p = a1 * (1 + g), a2 * (1 + g)
+    c1p, c2p = np.hypot(a1p, b1), np.hypot(a2p, b2)
+    h1p = np.degrees(np.arctan2(b1, a1p)) % 360
+    h2p = np.degrees(np.arctan2(b2, a2p)) % 360
+
+    delta_l = l2 - l1
+    delta_c = c2p - c1p
+    chroma_product = c1p * c2p
+    delta_h = h2p - h1p
+    delta_h = np.where(delta_h > 180, delta_h - 360, np.where(delta_h < -180, delta_h + 360, delta_h))
+    delta_h = np.where(chroma_product == 0, 0, delta_h)
+    delta_hh = 2 * np.sqrt(chroma_product) * np.sin(np.radians(delta_h) / 2)
+
+    l_mean = (l1 + l2) / 2
+    cp_mean = (c1p + c2p) / 2
+    h_sum = h1p + h2p
+    h_mean = np.where(np.abs(h1p - h2p) > 180, np.where(h_sum < 360, h_sum + 360, h_sum - 360), h_sum) / 2
+    h_mean = np.where(chroma_product == 0, h_sum, h_mean)
+
+    t = (1 - 0.17 * np.cos(np.radians(h_mean - 30)) + 0.24 * np.cos(np.radians(2 * h_mean))
+         + 0.32 * np.cos(np.radians(3 * h_mean + 6)) - 0.20 * np.cos(np.radians(4 * h_mean - 63)))
+    l_offset = (l_mean - 50) ** 2
+    s_l = 1 + 0.015 * l_offset / np.sqrt(20 + l_offset)
+    s_c = 1 + 0.045 * cp_mean
+    s_h = 1 + 0.015 * cp_mean * t
+    cp_mean7 = cp_mean ** 7
+    r_c = 2 * np.sqrt(cp_mean7 / (cp_mean7 + np.float32(25.0 ** 7)))
+    r_t = -r_c * np.sin(np.radians(60 * np.exp(-(((h_mean - 275) / 25) ** 2))))
+
+    term_l, term_c, term_h = delta_l / s_l, delta_c / s_c, delta_hh / s_h
+    return np.sqrt(term_l ** 2 + term_c ** 2 + term_h ** 2 + r_t * term_c * term_h).astype(np.float32)
+
+def delta_e(lab1, lab2, metric="ciede2000"):
+    """Color difference of two CIELAB arrays with the selected metric ('ciede2000' or 'cie76')."""
+    if metric == "ciede2000":
+        return delta_e_2000(lab1, lab2)
+    if metric == "cie76":
+        return delta_e_76(lab1, lab2)
+    raise ValueError("Invalid delta E metric.")
+
+def confusion_map(image_array, deficiency="deutan", severity=1.0, metric="ciede2000", out=None,
+                  band_pixels=BAND_PIXELS, table=None):
+    """
+    Per-pixel delta E between an image and its simulation for a color vision deficiency.
+
+    High values mark the pixels whose color changes most for the viewer, i.e. where
+    information carried by color is lost. The simulation is the uint8 image the other tools
+    show (`apply_matrix()`), and the work is done in bands of rows in float32.
+
+    Parameters:
+        image_array (numpy array): uint8 RGB(A) image.
+        deficiency (str): Deficiency name accepted by cvd_transforms.
+        severity (float): Severity from 0 to 1.
+        metric (str): 'ciede2000' or 'cie76'.
+        out (numpy array, optional): float32 (H, W) array to write into.
+        table (numpy array or bool, optional): Per-color table from `load_delta_e_table()`, or
+            True to load (and on first use build) the cached one. Much faster for many images.
+
+    Returns:
+        numpy array: float32 (H, W) delta E (`out` when given).
+    """
+    if metric not in DELTA_E_METRICS:
+        raise ValueError("Invalid delta E metric.")
+    if table is True:
+        table = load_delta_e_table(deficiency, severity, metric)
+    matrix = simulation_matrix(deficiency, severity)
+    height, width = image_array.shape[:2]
+    if out is None:
+        out = np.empty((height, width), dtype=np.float32)
+    rows = max(1, band_pixels // max(width, 1))
+    for top in range(0, height, rows):
+        band = image_array[top:top + rows, :, :3]
+        if table is not None:
+            index = (band[..., 0].astype(np.int32) << 16) | (band[..., 1].astype(np.int32) << 8) | band[..., 2]
+            np.take(table, index, out=out[top:top + rows])
+        else:
+            out[top:top + rows] = delta_e(rgb_to_lab(band), rgb_to_lab(apply_matrix(band, matrix)), metric)
+    return out
+
+def build_delta_e_table(deficiency="deutan", severity=1.0, metric="ciede2000"):
+    """
+    Compute `confusion_map()` for every 8-bit RGB color, one red plane at a time.
+
+    Returns:
+        numpy array: float32 table of 2^24 entries indexed by (r << 16) | (g << 8) | b.
+    """
+    table = np.empty((256, 256, 256), dtype=np.float32)
+    plane = np.empty((256, 256, 3), dtype=np.uint8)
+    plane[..., 1:] = np.stack(np.meshgrid(np.arange(256), np.arange(256), indexing="ij"), axis=-1)
+    for r in range(256):
+        plane[..., 0] = r
+        confusion_map(plane, deficiency, severity, metric, out=table[r])
+    return table.reshape(-1)
+
+def table_path(deficiency, severity, metric, cache_dir=None):
+    """Cache file of a delta E table; the name carries a digest of the simulation matrix."""
+    from daltonize_lut import default_cache_dir
+
+    matrix = np.ascontiguousarray(simulation_matrix(deficiency, severity), dtype=np.float64)
+    digest = hashlib.sha1(matrix.tobytes()).hexdigest()[:10]
+    name = f"delta_e_v{TABLE_VERSION}_{canonical_deficiency(deficiency)}_{severity:g}_{metric}_{digest}.npy"
+    return os.path.join(cache_dir or default_cache_dir(), name)
+
+def load_delta_e_table(deficiency="deutan", severity=1.0, metric="ciede2000", cache_dir=None):
+    """Return the per-color delta E table, building and caching it on first use (memory-mapped)."""
+    key = (canonical_deficiency(deficiency), severity, metric, cache_dir)
+    if key in _loaded_tables:
+        return _loaded_tables[key]
+
+    path = table_path(deficiency, severity, metric, cache_dir)
+    if not os.path.exists(path):
+        table = build_delta_e_table(deficiency, severity, metric)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temporary file first so concurrent processes never see a partial table
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".npy.tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.save(f, table)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    table = np.load(path, mmap_mode="r")
+    _loaded_tables[key] = table
+    return table
+
+def confusion_summary(delta_map, threshold=CONFUSION_THRESHOLD):
+    """Mean, 95th percentile and the fraction of pixels whose color shifts by more than `threshold`."""
+    return {
+        "mean": float(delta_map.mean()),
+        "p95": float(np.percentile(delta_map, 95)),
+        "above_threshold": float((delta_map > threshold).mean()),
+    }
+
+def heatmap_image(delta_map, max_delta=None):
+    """
+    Render a delta E map as an RGB heatmap (dark: unchanged, bright yellow: strongly changed).
+
+    Parameters:
+        delta_map (numpy array): float32 (H, W) delta E, e.g. from `confusion_map()`.
+        max_delta (float, optional): Delta E mapped to the top of the scale, by default the maximum.
+    """
+    import cv2
+
+    max_delta = max_delta or float(delta_map.max()) or 1.0
+    scaled = np.clip(delta_map * (255.0 / max_delta), 0, 255).astype(np.uint8)
+    return cv2.cvtColor(cv2.applyColorMap(scaled, cv2.COLORMAP_INFERNO), cv2.COLOR_BGR2RGB)
+
+def pairwise_delta_e(colors, metric="ciede2000", block=256):
+    """
+    Pairwise delta E of N RGB colors as an (N, N) float32 matrix.
+
+    Rows are computed in blocks, so the temporaries stay at block x N for large palettes.
+    """
+    lab = rgb_to_lab(np.asarray(colors, dtype=np.uint8).reshape(-1, 3))
+    matrix = np.empty((len(lab), len(lab)), dtype=np.float32)
+    for start in range(0, len(lab), block):
+        matrix[start:start + block] = delta_e(lab[start:start + block, None, :], lab[None, :, :], metric)
+    return matrix
+
+def confusability_matrix(colors, deficiency="deutan", severity=1.0, metric="ciede2000"):
+    """
+    Pairwise delta E between palette colors as seen with a deficiency.
+
+    Parameters:
+        colors (numpy array): (N, 3) RGB colors, e.g. from `image_palette()`.
+
+    Returns:
+        numpy array: float32 (N, N) matrix; small values mark colors the viewer cannot tell apart.
+    """
+    colors = np.asarray(colors, dtype=np.uint8).reshape(-1, 1, 3)
+    simulated = apply_matrix(colors, simulation_matrix(deficiency, severity))
+    return pairwise_delta_e(simulated, metric)
+
+def palette_confusability(colors, deficiencies=("protan", "deutan", "tritan"), severity=1.0, metric="ciede2000"):
+    """Return {'normal': (N, N), deficiency: (N, N), ...} pairwise delta E matrices for a palette."""
+    colors = np.asarray(colors, dtype=np.uint8).reshape(-1, 3)
+    matrices = {"normal": pairwise_delta_e(colors, metric)}
+    for deficiency in deficiencies:
+        matrices[canonical_deficiency(deficiency)] = confusability_matrix(colors, deficiency, severity, metric)
+    return matrices
+
+def confusable_pairs(normal, simulated, threshold=CONFUSION_THRESHOLD, min_normal=NOTICEABLE_DELTA_E):
+    """
+    Pairs of colors that are distinct for normal vision but confusable with the deficiency.
+
+    Parameters:
+        normal, simulated (numpy array): (N, N) matrices from `palette_confusability()`.
+
+    Returns:
+        list of tuple: (i, j, normal delta E, simulated delta E), most confusable first.
+    """
+    i, j = np.nonzero(np.triu((simulated < threshold) & (normal >= min_normal), k=1))
+    order = np.argsort(simulated[i, j], kind="stable")
+    return [(int(a), int(b), float(normal[a, b]), float(simulated[a, b])) for a, b in zip(i[order], j[order])]
+
+def _hex(color):
+    return "#" + "".join(f"{int(v):02x}" for v in color)
+
+def analyze_file(image_path, target, deficiencies, severity=1.0, metric="ciede2000", max_side=None,
+                 threshold=CONFUSION_THRESHOLD, use_table=True):
+    """Write one heatmap per deficiency for an image file and return the summaries."""
+    from image_decode import load_rgb
+
+    image_array = load_rgb(image_path, (max_side, max_side) if max_side else None)
+    summaries = {}
+    delta_map = np.empty(image_array.shape[:2], dtype=np.float32)
+    for deficiency in deficiencies:
+        confusion_map(image_array, deficiency, severity, metric, out=delta_map, table=use_table or None)
+        summaries[deficiency] = confusion_summary(delta_map, threshold)
+        if target:
+            path = f"{target}_{deficiency}.png"
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            Image.fromarray(heatmap_image(delta_map, max_delta=50.0)).save(path)
+    return image_path, summaries
+
+def image_palette(image_path, n_colors=98, engine="octree", cache=None):
+    """
+    Extract the palette of an image file as an (N, 3) uint8 array, without the padding and
+    near-white removal of the palette grid, so every color really occurs in the image. With
+    `cache` (a result_cache.ResultCache, or True for the shared one) it is looked up by file
+    content and settings first.
+    """
+    from Cluster_pallete_genera import KMEANS_SIZE, extract_palette_colors
+    from image_decode import decode_image
+
+    decode_size = KMEANS_SIZE if engine == "kmeans" else None
+    if cache:
+        key = make_key("image_palette", file_key(image_path), n_colors, engine, decode_size)
+        return resolve_cache(cache).get_or_compute(key, lambda: image_palette(image_path, n_colors, engine))
+    image = decode_image(image_path, decode_size, fit=False)
+    return np.array(extract_palette_colors(image, n_colors, engine=engine), dtype=np.uint8).reshape(-1, 3)
+
+def print_palette_report(image_path, deficiencies, severity, metric, threshold, engine, n_colors=98, cache=None):
+    colors = np.unique(image_palette(image_path, n_colors, engine, cache), axis=0)
+    matrices = palette_confusability(colors, deficiencies, severity, metric)
+    print(f"{image_path}: {len(colors)} palette colors")
+    for deficiency in deficiencies:
+        pairs = confusable_pairs(matrices["normal"], matrices[canonical_deficiency(deficiency)], threshold)
+        print(f"  {deficiency}: {len(pairs)} confusable pairs")
+        for i, j, normal, simulated in pairs[:10]:
+            print(f"    {_hex(colors[i])} / {_hex(colors[j])}  normal {normal:5.1f}  {deficiency} {simulated:5.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="CVD confusion heatmaps and palette confusability.")
+    parser.add_argument("inputs", nargs="+", help="Image files, directories or glob patterns")
+    parser.add_argument("-o", "--output-dir", help="Write a heatmap PNG per image and deficiency here")
+    parser.add_argument("-d", "--deficiency", action="append", help="Deficiency to analyze (repeatable, default: all three)")
+    parser.add_argument("--severity", type=float, default=1.0, help="Severity from 0 to 1")
+    parser.add_argument("--metric", choices=DELTA_E_METRICS, default="ciede2000", help="Delta E formula")
+    parser.add_argument("--threshold", type=float, default=CONFUSION_THRESHOLD,
+                        help="Delta E counted as a visible shift (heatmaps) or as confusable (palettes)")
+    parser.add_argument("--max-side", type=int, help="Analyze images downscaled to fit this size")
+    parser.add_argument("--palette", action="store_true",
+                        help="Report confusable pairs of the extracted palette instead of heatmaps")
+    parser.add_argument("--engine", choices=("kmeans", "octree"), default="octree", help="Palette engine for --palette")
+    parser.add_argument("--colors", type=int, default=98, help="Palette size for --palette")
+    parser.add_argument("--cache", action="store_true",
+                        help="Reuse palettes of identical images through the shared result cache")
+    parser.add_argument("--no-table", action="store_true",
+                        help="Compute every pixel directly instead of through the cached per-color table")
+    parser.add_argument("-j", "--workers", type=int, help="Number of worker processes")
+    args = parser.parse_args()
+
+    deficiencies = args.deficiency or ["protan", "deutan", "tritan"]
+    images = list(collect_images(args.inputs, exclude=[args.output_dir] if args.output_dir else []))
+    failed = 0
+    if args.palette:
+        for image_path, _ in images:
+            try:
+                print_palette_report(image_path, deficiencies, args.severity, args.metric, args.threshold,
+                                     args.engine, args.colors, args.cache)
+            except Exception as error:
+                failed += 1
+                print(f"Error: Unable to process {image_path}: {error}")
+        if failed:
+            print(f"{failed} image(s) failed")
+        return
+
+    if not args.no_table:
+        for deficiency in deficiencies:
+            load_delta_e_table(deficiency, args.severity, args.metric)  # Build once, before the workers map it
+    jobs = [(image_path, os.path.join(args.output_dir, os.path.splitext(relative)[0]) if args.output_dir else None,
+             deficiencies, args.severity, args.metric, args.max_side, args.threshold, not args.no_table)
+            for image_path, relative in images]
+    workers = args.workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for job, future in completed_jobs(executor, analyze_file, jobs, 2 * workers):
+            try:
+                image_path, summaries = future.result()
+            except Exception as error:
+                failed += 1
+                print(f"Error: Unable to process {job[0]}: {error}")
+                continue
+            print(image_path)
+            for deficiency, summary in summaries.items():
+                print(f"  {deficiency:<8} mean {summary['mean']:6.2f}  p95 {summary['p95']:6.2f}  "
+                      f"shifted > {args.threshold:g}: {summary['above_threshold'] * 100:5.1f}%")
+    if failed:
+        print(f"{failed} image(s) failed")
+
+if __name__ == "__main__":
+    main()
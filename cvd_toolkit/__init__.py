@@ -0,0 +1,132 @@
+#########  ***** IMPORTABLE CVD TOOLKIT  ******  ##########
+
+#  One import for the transforms, palette extraction and color naming of this repository:
+#
+#      import cvd_toolkit
+#      corrected = cvd_toolkit.daltonize(image_array, 'deutan')
+#      palette, counts = cvd_toolkit.octree_palette(image_array, 16)
+#
+#  Names are resolved on first access, so `import cvd_toolkit` only costs the package itself
+#  and each attribute loads just the module that defines it. sklearn, matplotlib, tkinter and
+#  ipywidgets are never imported for the headless functions; cv2 only for the functions that
+#  need OpenCV (the LAB simulation and contour indexing).
+#  The GUIs are started explicitly with `python -m cvd_toolkit <tool>`, see __main__.py.
+
+import importlib
+import importlib.util
+import os
+import sys
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Scripts whose file names are not valid module names, imported under these names
+SCRIPT_MODULES = {
+    "cvd_simulator": "CVD simulator.py",
+    "color_segmentation": "Color recognition with Object Segmentation for CVD.py",
+}
+
+# Public name -> module that defines it
+_EXPORTS = {
+    # Shared matrices and kernels (numpy only)
+    "canonical_deficiency": "cvd_transforms",
+    "simulation_matrix": "cvd_transforms",
+    "daltonization_matrix": "cvd_transforms",
+    "apply_matrix": "cvd_transforms",
+    "simulate": "cvd_transforms",
+    "correct": "cvd_transforms",
+    "MatrixKernel": "cvd_transforms",
+    "matrix_kernel": "cvd_transforms",
+    # Daltonization
+    "daltonize": "Daltonization",
+    "deficiency_matrix": "Daltonization",
+    "deficiency_matrices": "Daltonization",
+    "build_lut": "daltonize_lut",
+    "load_lut": "daltonize_lut",
+    "apply_lut": "daltonize_lut",
+    "daltonize_tiled": "tiled_daltonize",
+    "daltonize_file": "tiled_daltonize",
+    "run_batch": "batch_daltonize",
+    # Simulation with brightness/contrast/hue adjustments (OpenCV)
+    "apply_cvd_lab_simulation": "cvd_simulator",
+    "render_cvd_simulation": "cvd_simulator",
+    "render_cvd_simulations": "cvd_simulator",
+    # Every deficiency variant in one pass, comparison sheets
+    "variant_matrices": "contact_sheet",
+    "apply_matrices": "contact_sheet",
+    "apply_lab_simulations": "contact_sheet",
+    "make_contact_sheet": "contact_sheet",
+    # Palettes
+    "color_histogram": "octree_quantizer",
+    "octree_quantize": "octree_quantizer",
+    "octree_palette": "octree_quantizer",
+    "extract_palette_colors": "Cluster_pallete_genera",
+    "extract_color_palettes": "Cluster_pallete_genera",
+    "DatasetPalette": "palette_dataset",
+    "build_dataset_palette": "palette_dataset",
+    # Decoding at reduced resolution
+    "decode_image": "image_decode",
+    "load_rgb": "image_decode",
+    "imread_reduced": "image_decode",
+    # Confusion heatmaps and palette confusability
+    "delta_e": "cvd_confusion",
+    "confusion_map": "cvd_confusion",
+    "heatmap_image": "cvd_confusion",
+    "load_delta_e_table": "cvd_confusion",
+    "confusability_matrix": "cvd_confusion",
+    "palette_confusability": "cvd_confusion",
+    "confusable_pairs": "cvd_confusion",
+    "image_palette": "cvd_confusion",
+    # Color naming
+    "ColorNamer": "color_names",
+    "get_color_namer": "color_names",
+    "load_color_names": "color_names",
+    "rgb_to_lab": "color_names",
+    # Object detection helpers (OpenCV)
+    "ContourIndex": "contour_index",
+    "FrameResultCache": "contour_index",
+    "ObjectStats": "object_stats",
+    "hsv_mask": "object_stats",
+    "label_objects": "object_stats",
+    "object_contours": "object_stats",
+    # Result cache
+    "ResultCache": "result_cache",
+    "default_cache": "result_cache",
+    # Instrumentation
+    "tracer": "instrumentation",
+}
+
+__all__ = sorted(_EXPORTS)
+
+def load_module(name):
+    """
+    Import one of the repository modules by name, including the scripts in `SCRIPT_MODULES`.
+
+    Returns:
+        module: The module, imported once and then shared through sys.modules.
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    if REPO_DIR not in sys.path:
+        sys.path.insert(0, REPO_DIR)
+    if name not in SCRIPT_MODULES:
+        return importlib.import_module(name)
+
+    spec = importlib.util.spec_from_file_location(name, os.path.join(REPO_DIR, SCRIPT_MODULES[name]))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    try:
+        spec.loader.exec_module(module)
+    except BaseException:
+        del sys.modules[name]
+        raise
+    return module
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(load_module(_EXPORTS[name]), name)
+    globals()[name] = value  # Later lookups skip __getattr__
+    return value
+
+def __dir__():
+    return sorted(set(globals()) | set(_EXPORTS))
@@ -0,0 +1,52 @@
+#  Entry points for the interactive and command line tools:
+#
+#      python -m cvd_toolkit daltonize            Tk daltonization GUI
+#      python -m cvd_toolkit segment --source 0   OpenCV object segmentation and color naming
+#      python -m cvd_toolkit palette image.jpg    Extracted cluster palette
+#      python -m cvd_toolkit batch photos/ -o out Headless batch daltonization
+#      python -m cvd_toolkit serve --port 8765    Local HTTP daltonization service
+#
+#  Every tool keeps its own command line options; run `python -m cvd_toolkit <tool> --help`.
+
+import os
+import runpy
+import sys
+
+from cvd_toolkit import REPO_DIR
+
+TOOLS = {
+    "daltonize": ("Daltonization.py", "Tk GUI to daltonize single images"),
+    "segment": ("Color recognition with Object Segmentation for CVD.py",
+                "Object segmentation and color naming on images, video or a webcam"),
+    "simulator": ("CVD simulator.py", "ipywidgets CVD simulator (run inside Jupyter)"),
+    "palette": ("Cluster_pallete_genera.py", "Extracted cluster color palette of one image"),
+    "dataset-palette": ("palette_dataset.py", "Palette of a whole image collection"),
+    "batch": ("batch_daltonize.py", "Daltonize directories of images without a window"),
+    "tiled": ("tiled_daltonize.py", "Daltonize images larger than memory tile by tile"),
+    "lut": ("daltonize_lut.py", "Build and check the cached lookup tables"),
+    "serve": ("daltonize_service.py", "Local HTTP daltonization service"),
+    "sheet": ("contact_sheet.py", "Comparison sheet of every deficiency per image"),
+    "confusion": ("cvd_confusion.py", "Confusion heatmaps and confusable palette colors"),
+}
+
+def usage():
+    lines = ["usage: python -m cvd_toolkit <tool> [options]", "", "tools:"]
+    lines += [f"  {name:<16}{description}" for name, (_, description) in TOOLS.items()]
+    return "\n".join(lines)
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] in ("-h", "--help"):
+        print(usage())
+        return
+    if argv[0] not in TOOLS:
+        sys.exit(f"Unknown tool {argv[0]!r}\n\n{usage()}")
+
+    script = os.path.join(REPO_DIR, TOOLS[argv[0]][0])
+    if REPO_DIR not in sys.path:
+        sys.path.insert(0, REPO_DIR)
+    sys.argv = [script] + argv[1:]
+    runpy.run_path(script, run_name="__main__")
+
+if __name__ == "__main__":
+    main()
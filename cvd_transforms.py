@@ -0,0 +1,239 @@
+#########  ***** SHARED CVD SIMULATION AND DALTONIZATION TRANSFORMS  ******  ##########
+
+#  One place for the color vision deficiency models used by every tool in this repository.
+#
+#  Simulation uses the Machado, Oliveira & Fernandes (2009) dichromacy matrices. Daltonization
+#  follows the classic error-redistribution scheme (Fidaner, Lin & Ozguven):
+#
+#      simulated = S @ rgb
+#      error     = rgb - simulated              (the information the viewer loses)
+#      corrected = rgb + E @ error              (shifted into channels they can see)
+#
+#  Every step is linear, so the whole chain is the single matrix  I + E @ (I - S)  and a
+#  corrected image costs one matrix pass over the pixels, exactly like a plain simulation.
+#  Like the rest of the project the matrices are applied to sRGB values directly.
+
+import threading
+from functools import lru_cache
+
+import numpy as np
+
+BAND_PIXELS = 1 << 16  # Pixels per band when apply_matrix() writes into `out`
+
+# Machado et al. (2009) simulation matrices for complete dichromacy (severity 1.0)
+DICHROMACY_MATRICES = {
+    'protan': np.array([[0.152286, 1.052583, -0.204868],
+                        [0.114503, 0.786281, 0.099216],
+                        [-0.003882, -0.048116, 1.051998]]),
+    'deutan': np.array([[0.367322, 0.860646, -0.227968],
+                        [0.280085, 0.672501, 0.047413],
+                        [-0.011820, 0.042940, 0.968881]]),
+    'tritan': np.array([[1.255528, -0.076749, -0.178779],
+                        [-0.078411, 0.930809, 0.147602],
+                        [0.004733, 0.691367, 0.303900]]),
+    # Rec. 709 luminance in every channel
+    'achromat': np.array([[0.2126, 0.7152, 0.0722],
+                          [0.2126, 0.7152, 0.0722],
+                          [0.2126, 0.7152, 0.0722]]),
+}
+
+# Where the lost information is moved: red-green errors into green and blue (the
+# Fidaner et al. matrix), blue-yellow errors into red and green
+_RED_GREEN_SHIFT = np.array([[0.0, 0.0, 0.0],
+                             [0.7, 1.0, 0.0],
+                             [0.7, 0.0, 1.0]])
+ERROR_SHIFT_MATRICES = {
+    'protan': _RED_GREEN_SHIFT,
+    'deutan': _RED_GREEN_SHIFT,
+    'tritan': np.array([[1.0, 0.0, 0.7],
+                        [0.0, 1.0, 0.7],
+                        [0.0, 0.0, 0.0]]),
+}
+
+# Names used by the individual tools
+DEFICIENCY_ALIASES = {
+    'protanopia': 'protan',
+    'deuteranopia': 'deutan',
+    'tritanopia': 'tritan',
+    'achromatopsia': 'achromat',
+    'monochromacy': 'achromat',
+}
+
+def canonical_deficiency(deficiency):
+    """Map tool-specific names such as 'Protanopia' to 'protan', 'deutan', 'tritan' or 'achromat'."""
+    key = deficiency.lower()
+    key = DEFICIENCY_ALIASES.get(key, key)
+    if key not in DICHROMACY_MATRICES:
+        raise ValueError("Invalid deficiency type.")
+    return key
+
+def _check_severity(severity):
+    if not 0.0 <= severity <= 1.0:
+        raise ValueError("Severity must be between 0 and 1.")
+
+@lru_cache(maxsize=128)
+def _simulation_matrix(deficiency, severity):
+    # Anomalous trichromacy is approximated by blending towards normal vision
+    return (1 - severity) * np.eye(3) + severity * DICHROMACY_MATRICES[deficiency]
+
+@lru_cache(maxsize=128)
+def _daltonization_matrix(deficiency, severity):
+    if deficiency not in ERROR_SHIFT_MATRICES:
+        raise ValueError(f"Daltonization is not defined for {deficiency!r}.")
+    simulation = _simulation_matrix(deficiency, severity)
+    return np.eye(3) + ERROR_SHIFT_MATRICES[deficiency] @ (np.eye(3) - simulation)
+
+def simulation_matrix(deficiency, severity=1.0):
+    """
+    Return the 3x3 RGB matrix that simulates a color vision deficiency.
+
+    Parameters:
+        deficiency (str): 'protan', 'deutan', 'tritan', 'achromat' or an alias like 'Protanopia'.
+        severity (float): 0 is normal vision, 1 is complete dichromacy.
+
+    Returns:
+        numpy array: Read-only 3x3 float64 matrix applied as rgb @ matrix.T.
+    """
+    _check_severity(severity)
+    matrix = _simulation_matrix(canonical_deficiency(deficiency), float(severity))
+    matrix.setflags(write=False)
+    return matrix
+
+def daltonization_matrix(deficiency, severity=1.0):
+    """
+    Return the single 3x3 matrix for simulate -> error -> redistribute.
+
+    Parameters:
+        deficiency (str): 'protan', 'deutan', 'tritan' or an alias like 'Deuteranopia'.
+        severity (float): Severity of the deficiency being corrected for, 0 to 1.
+
+    Returns:
+        numpy array: Read-only 3x3 float64 matrix applied as rgb @ matrix.T.
+    """
+    _check_severity(severity)
+    matrix = _daltonization_matrix(canonical_deficiency(deficiency), float(severity))
+    matrix.setflags(write=False)
+    return matrix
+
+def apply_matrix(image_array, matrix, bgr=False, out=None):
+    """
+    Apply a 3x3 color matrix to a uint8 image in one pass.
+
+    Parameters:
+        image_array (numpy array): uint8 image with the color channels last, extra channels are dropped.
+        matrix (numpy array): 3x3 matrix written for RGB order.
+        bgr (bool): The image is in OpenCV's BGR order.
+        out (numpy array, optional): uint8 array of shape image.shape[:-1] + (3,) to write into,
+            may be a view such as a tile of a larger image. The image is then transformed in bands
+            of rows, so the float64 temporary stays small; the result is the same.
+
+    Returns:
+        numpy array: The transformed uint8 image (`out` when given).
+    """
+    if bgr:
+        matrix = matrix[::-1, ::-1]  # Same transform with rows and columns in BGR order
+    if out is None:
+        transformed = np.dot(image_array[..., :3], matrix.T)
+        return np.clip(transformed, 0, 255).astype(np.uint8)
+
+    # Every pixel is transformed independently, so banding does not change a single value
+    row_pixels = max(1, int(np.prod(image_array.shape[1:-1])))
+    step = max(1, BAND_PIXELS // row_pixels)
+    for top in range(0, image_array.shape[0], step):
+        transformed = np.dot(image_array[top:top + step, ..., :3], matrix.T)
+        np.clip(transformed, 0, 255, out=transformed)
+        np.copyto(out[top:top + step], transformed, casting='unsafe')
+    return out
+
+def simulate(image_array, deficiency, severity=1.0, bgr=False):
+    """Show how an image looks with the given deficiency."""
+    return apply_matrix(image_array, simulation_matrix(deficiency, severity), bgr)
+
+def correct(image_array, deficiency, severity=1.0, bgr=False):
+    """Daltonize an image for viewers with the given deficiency."""
+    return apply_matrix(image_array, daltonization_matrix(deficiency, severity), bgr)
+
+class MatrixKernel:
+    """
+    Reusable 3x3 color transform that writes straight into a caller-owned uint8 buffer.
+
+    Scratch memory is allocated on the first call for a given frame size and reused after
+    that (separately per thread), so a steady-state frame loop that passes `out=` allocates
+    nothing. Each output channel is accumulated with in-place ufuncs instead of a matmul,
+    which avoids the float64 result, clip copy and astype copy of `apply_matrix()`. The
+    summation order differs from the matmul, so a few colors can land one level away from
+    `apply_matrix()`; use `apply_matrix(..., out=)` where the result must be identical.
+
+    Parameters:
+        matrix (numpy array): 3x3 matrix written for RGB order.
+        bgr (bool): Frames are in OpenCV's BGR order.
+        fixed_point (bool): Use integer arithmetic with the matrix scaled by 2**shift.
+            Results may differ from the float path by one level.
+        shift (int): Fractional bits of the fixed-point matrix.
+        dtype: Float accumulator type.
+    """
+
+    def __init__(self, matrix, bgr=False, fixed_point=False, shift=16, dtype=np.float32):
+        matrix = np.asarray(matrix, dtype=np.float64)
+        if bgr:
+            matrix = matrix[::-1, ::-1]
+        self.fixed_point = fixed_point
+        self.shift = shift
+        if fixed_point:
+            # int32 accumulator: 3 * 255 * |m| * 2**16 stays far below 2**31 for any |m| < 8
+            self.coefficients = np.rint(matrix * (1 << shift)).astype(np.int32)
+            self.dtype = np.dtype(np.int32)
+        else:
+            self.dtype = np.dtype(dtype)
+            self.coefficients = matrix.astype(self.dtype)
+        self._local = threading.local()
+
+    def _scratch(self, shape):
+        local = self._local
+        if getattr(local, 'shape', None) != shape:
+            local.shape = shape
+            local.acc = np.empty(shape, dtype=self.dtype)
+            local.term = np.empty(shape, dtype=self.dtype)
+        return local.acc, local.term
+
+    def __call__(self, image_array, out=None):
+        """
+        Transform a uint8 image.
+
+        Parameters:
+            image_array (numpy array): uint8 image with the color channels last.
+            out (numpy array, optional): uint8 array of shape image.shape[:-1] + (3,) to write to,
+                may be a view such as a tile of a larger image. Must not overlap the input.
+
+        Returns:
+            numpy array: `out`, or a new array when it was omitted.
+        """
+        shape = image_array.shape[:-1]
+        if out is None:
+            out = np.empty(shape + (3,), dtype=np.uint8)
+        acc, term = self._scratch(shape)
+        channels = [image_array[..., k] for k in range(3)]
+
+        for c in range(3):
+            row = self.coefficients[c]
+            np.multiply(channels[0], row[0], out=acc, casting='unsafe')
+            for k in (1, 2):
+                if row[k]:
+                    np.multiply(channels[k], row[k], out=term, casting='unsafe')
+                    np.add(acc, term, out=acc)
+            if self.fixed_point:
+                np.right_shift(acc, self.shift, out=acc)  # Floor, like the float path's truncation
+            np.clip(acc, 0, 255, out=acc)
+            np.copyto(out[..., c], acc, casting='unsafe')
+
+        return out
+
+@lru_cache(maxsize=64)
+def _cached_kernel(matrix_bytes, bgr, fixed_point, dtype):
+    matrix = np.frombuffer(matrix_bytes, dtype=np.float64).reshape(3, 3)
+    return MatrixKernel(matrix, bgr, fixed_point, dtype=dtype)
+
+def matrix_kernel(matrix, bgr=False, fixed_point=False, dtype=np.float32):
+    """Return a shared `MatrixKernel` for a matrix, so its scratch buffers survive between calls."""
+    matrix_bytes = np.ascontiguousarray(matrix, dtype=np.float64).tobytes()
+    return _cached_kernel(matrix_bytes, bgr, fixed_point, np.dtype(dtype).str)
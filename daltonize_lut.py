@@ -0,0 +1,221 @@
+#########  ***** PRECOMPUTED 3D LOOKUP TABLES FOR DALTONIZATION  ******  ##########
+
+#  Every daltonization transform maps an RGB color to another RGB color, so it can be
+#  baked once into a 3D lookup table and applied afterwards as a gather instead of a matmul.
+#  Tables are cached on disk as .npy files and memory-mapped when they are loaded again.
+
+import argparse
+import hashlib
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from Daltonization import daltonize, deficiency_matrices
+
+FULL_LUT_SIZE = 256  # One entry per 8-bit RGB color, exact
+CHUNK_PIXELS = 1 << 20  # Pixels processed per step, keeps temporaries bounded
+
+_loaded_luts = {}  # (deficiency, size, cache_dir) -> table, so repeated calls skip the disk
+
+def default_cache_dir():
+    """Return the directory used to cache lookup tables."""
+    return os.environ.get("DALTONIZE_LUT_CACHE",
+                          os.path.join(os.path.expanduser("~"), ".cache", "daltonization", "luts"))
+
+def lut_path(deficiency, size, cache_dir=None):
+    """
+    Return the cache file for a lookup table.
+
+    The file name carries a digest of the transformation matrix, so editing a matrix
+    never picks up a stale table.
+    """
+    matrix = np.ascontiguousarray(deficiency_matrices[deficiency], dtype=np.float64)
+    digest = hashlib.sha1(matrix.tobytes()).hexdigest()[:10]
+    return os.path.join(cache_dir or default_cache_dir(), f"{deficiency}_{size}_{digest}.npy")
+
+def build_lut(deficiency, size=FULL_LUT_SIZE):
+    """
+    Bake the transform for a deficiency into a 3D lookup table.
+
+    Parameters:
+        deficiency (str): Key of `deficiency_matrices`.
+        size (int): Points per axis. 256 gives the full uint8 table, which reproduces
+            `daltonize()` exactly. Smaller sizes (typically 33 or 65) give a float32
+            lattice that is applied with trilinear interpolation.
+
+    Returns:
+        numpy array: Table of shape (size, size, size, 3), indexed as [r, g, b].
+    """
+    if deficiency not in deficiency_matrices:
+        raise ValueError("Invalid deficiency type.")
+    if not 2 <= size <= FULL_LUT_SIZE:
+        raise ValueError("LUT size must be between 2 and 256.")
+
+    if size == FULL_LUT_SIZE:
+        # Run every color through the matrix path itself, one red plane at a time
+        lut = np.empty((size, size, size, 3), dtype=np.uint8)
+        gb = np.stack(np.meshgrid(np.arange(size), np.arange(size), indexing="ij"), axis=-1)
+        plane = np.empty((size, size, 3), dtype=np.uint8)
+        plane[..., 1:] = gb
+        for r in range(size):
+            plane[..., 0] = r
+            lut[r] = daltonize(plane, deficiency)
+        return lut
+
+    # Lattice nodes keep the unclipped transform, clipping happens after interpolation.
+    # The transforms are linear, so interpolating between nodes loses nothing but rounding.
+    matrix = deficiency_matrices[deficiency]
+    axis = np.linspace(0.0, 255.0, size)
+    nodes = np.stack(np.meshgrid(axis, axis, axis, indexing="ij"), axis=-1)
+    return np.dot(nodes, matrix.T).astype(np.float32)
+
+def load_lut(deficiency, size=FULL_LUT_SIZE, cache_dir=None):
+    """
+    Return the lookup table for a deficiency, building and caching it on first use.
+
+    Cached tables are opened with `mmap_mode='r'`, so only the pages an image actually
+    touches are read from disk.
+    """
+    key = (deficiency, size, cache_dir)
+    if key in _loaded_luts:
+        return _loaded_luts[key]
+
+    path = lut_path(deficiency, size, cache_dir)
+    if not os.path.exists(path):
+        lut = build_lut(deficiency, size)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temporary file first so concurrent processes never see a partial table
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".npy.tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.save(f, lut)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    lut = np.load(path, mmap_mode="r")
+    _loaded_luts[key] = lut
+    return lut
+
+def apply_lut(image_array, lut):
+    """
+    Apply a lookup table from `build_lut()`/`load_lut()` to an RGB image.
+
+    Parameters:
+        image_array (numpy array): uint8 RGB image, extra channels are ignored.
+        lut (numpy array): Table of shape (size, size, size, 3).
+
+    Returns:
+        numpy array: The transformed uint8 image.
+    """
+    rgb = image_array[..., :3]
+    pixels = rgb.reshape(-1, 3)
+    out = np.empty(pixels.shape, dtype=np.uint8)
+    size = lut.shape[0]
+    flat_lut = lut.reshape(-1, 3)
+
+    for start in range(0, len(pixels), CHUNK_PIXELS):
+        chunk = pixels[start:start + CHUNK_PIXELS]
+        if size == FULL_LUT_SIZE:
+            # Exact table: the packed 24-bit color is the row index
+            index = chunk[:, 0].astype(np.int32) << 16
+            index |= chunk[:, 1].astype(np.int32) << 8
+            index |= chunk[:, 2]
+            np.take(flat_lut, index, axis=0, out=out[start:start + len(chunk)])
+        else:
+            out[start:start + len(chunk)] = _interpolate(chunk, flat_lut, size)
+
+    return out.reshape(rgb.shape)
+
+def _interpolate(chunk, flat_lut, size):
+    """Trilinear interpolation of a lattice table for an (N, 3) uint8 chunk."""
+    position = chunk.astype(np.float32) * np.float32((size - 1) / 255.0)
+    lower = np.minimum(position.astype(np.int32), size - 2)
+    fraction = position - lower
+    base = (lower[:, 0] * size + lower[:, 1]) * size + lower[:, 2]
+
+    result = np.zeros(chunk.shape, dtype=np.float32)
+    for dr in (0, 1):
+        wr = fraction[:, 0] if dr else 1 - fraction[:, 0]
+        for dg in (0, 1):
+            wg = fraction[:, 1] if dg else 1 - fraction[:, 1]
+            for db in (0, 1):
+                wb = fraction[:, 2] if db else 1 - fraction[:, 2]
+                corner = np.take(flat_lut, base + (dr * size + dg) * size + db, axis=0)
+                result += (wr * wg * wb)[:, None] * corner
+
+    # Same clip-and-truncate rounding as the matrix path
+    return np.clip(result, 0, 255).astype(np.uint8)
+
+def lut_accuracy_report(deficiencies=None, sizes=(33, 65, FULL_LUT_SIZE), n_samples=1 << 20,
+                        cache_dir=None, seed=0):
+    """
+    Compare lookup tables of different sizes against the matrix path of `daltonize()`.
+
+    Parameters:
+        deficiencies (list of str, optional): Deficiencies to report, all by default.
+        sizes (tuple of int): LUT sizes to compare.
+        n_samples (int): Number of random colors used for the comparison.
+        cache_dir (str, optional): Where tables are cached.
+        seed (int): Seed for the random colors.
+
+    Returns:
+        list of dict: One row per (deficiency, size) with table size in bytes, max and mean
+        absolute error, the share of exactly matching channels and the time per megapixel
+        for both paths.
+    """
+    rng = np.random.default_rng(seed)
+    sample = rng.integers(0, 256, size=(n_samples, 1, 3), dtype=np.uint8)
+    megapixels = n_samples / 1e6
+    rows = []
+
+    for deficiency in deficiencies or list(deficiency_matrices):
+        start = time.perf_counter()
+        expected = daltonize(sample, deficiency)
+        matrix_time = time.perf_counter() - start
+
+        for size in sizes:
+            lut = load_lut(deficiency, size, cache_dir)
+            start = time.perf_counter()
+            result = apply_lut(sample, lut)
+            lut_time = time.perf_counter() - start
+
+            error = np.abs(result.astype(np.int16) - expected)
+            rows.append({
+                "deficiency": deficiency,
+                "size": size,
+                "table_bytes": int(lut.nbytes),
+                "max_abs_error": int(error.max()),
+                "mean_abs_error": float(error.mean()),
+                "exact_pct": float((error == 0).mean() * 100),
+                "matrix_ms_per_mp": matrix_time * 1000 / megapixels,
+                "lut_ms_per_mp": lut_time * 1000 / megapixels,
+            })
+
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description="Build daltonization lookup tables and report their accuracy.")
+    parser.add_argument("--deficiency", action="append", choices=list(deficiency_matrices),
+                        help="Deficiency to report (repeatable, default: all)")
+    parser.add_argument("--size", type=int, action="append",
+                        help="LUT size to report (repeatable, default: 33, 65 and 256)")
+    parser.add_argument("--samples", type=int, default=1 << 20, help="Number of random colors to compare")
+    parser.add_argument("--cache-dir", help="LUT cache directory")
+    args = parser.parse_args()
+
+    rows = lut_accuracy_report(args.deficiency, tuple(args.size or (33, 65, FULL_LUT_SIZE)),
+                               args.samples, args.cache_dir)
+    print(f"{'deficiency':<14}{'size':>6}{'table':>11}{'max err':>9}{'mean err':>10}"
+          f"{'exact %':>9}{'matrix ms/MP':>14}{'lut ms/MP':>11}")
+    for row in rows:
+        print(f"{row['deficiency']:<14}{row['size']:>6}{row['table_bytes'] / 1e6:>9.2f}MB"
+              f"{row['max_abs_error']:>9}{row['mean_abs_error']:>10.4f}{row['exact_pct']:>9.2f}"
+              f"{row['matrix_ms_per_mp']:>14.1f}{row['lut_ms_per_mp']:>11.1f}")
+
+if __name__ == "__main__":
+    main()
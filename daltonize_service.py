@@ -0,0 +1,507 @@
+#########  ***** LOCAL HTTP DALTONIZATION SERVICE  ******  ##########
+
+#  Serves daltonize() over HTTP to other applications on the same machine. The asyncio front
+#  end only parses requests and writes responses; decoding, the transform and encoding run in
+#  a pool of worker processes. At most `max_concurrency` images are handed to the pool at once,
+#  further images wait in a bounded queue, and requests arriving while that queue is full are
+#  answered with 503 before their body is read. Every image of a multipart upload takes its own
+#  place in that queue, so a batch that does not fit is rejected as a whole. SIGTERM and Ctrl+C
+#  stop the server and shut the worker pool down.
+#
+#    python daltonize_service.py --port 8765
+#    curl --data-binary @photo.jpg "http://127.0.0.1:8765/daltonize?deficiency=deutan" -o out.png
+#    curl -F a=@one.jpg -F b=@two.jpg "http://127.0.0.1:8765/daltonize?deficiency=protan,deutan"
+#
+#  Endpoints:
+#    POST /daltonize   Image in the body, or several as multipart/form-data. Query parameters:
+#                      deficiency (repeatable or comma-separated, 'all'), severity, format.
+#                      One image and one deficiency return the image; anything else streams a
+#                      multipart/mixed response part by part as the images finish.
+#    GET  /metrics     Prometheus text format: latency histograms, queue depth, in-flight jobs.
+#    GET  /health      Returns "ok".
+
+import argparse
+import asyncio
+import io
+import multiprocessing
+import os
+import re
+import signal
+import sys
+import time
+import traceback
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from http import HTTPStatus
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+from PIL import Image, UnidentifiedImageError
+
+from Daltonization import daltonize, deficiency_matrices
+
+OUTPUT_FORMATS = {"png": ("PNG", "image/png"), "jpeg": ("JPEG", "image/jpeg"), "jpg": ("JPEG", "image/jpeg"),
+                  "webp": ("WEBP", "image/webp")}
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+HEADER_TIMEOUT = 30  # Seconds to wait for a request line and headers, also the keep-alive idle limit
+BODY_TIMEOUT = 120  # Seconds to wait for a complete request body
+
+class HttpError(Exception):
+    def __init__(self, status, message=None):
+        super().__init__(message or HTTPStatus(status).phrase)
+        self.status = status
+
+class ImageTooLarge(ValueError):
+    """An upload whose pixel count exceeds PIL's decompression bomb limit."""
+
+def process_image_bytes(data, deficiencies, severity=1.0, output_format="png", lut_size=None):
+    """
+    Decode an uploaded image, daltonize it for every deficiency and encode the results.
+    Runs inside a worker process.
+
+    Returns:
+        tuple: (list of encoded images in the order of `deficiencies`, seconds spent, pixel count).
+
+    Raises:
+        ImageTooLarge: The image has too many pixels to decode safely.
+        ValueError: The data is not an image PIL can decode.
+    """
+    start = time.perf_counter()
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            image_array = np.asarray(image.convert("RGB"))
+    except Image.DecompressionBombError:
+        raise ImageTooLarge("Image has too many pixels.") from None
+    except (UnidentifiedImageError, OSError):
+        raise ValueError("Unable to decode image.") from None
+
+    encoder = OUTPUT_FORMATS[output_format][0]
+    # PNG level 1 encodes about twice as fast as the default for slightly larger files, the
+    # better trade-off for a service on the same machine
+    options = {"compress_level": 1} if encoder == "PNG" else {}
+    results = []
+    for deficiency in deficiencies:
+        buffer = io.BytesIO()
+        Image.fromarray(daltonize(image_array, deficiency, lut_size, severity)).save(buffer, encoder, **options)
+        results.append(buffer.getvalue())
+    return results, time.perf_counter() - start, image_array.shape[0] * image_array.shape[1]
+
+class Histogram:
+    """Cumulative histogram in the Prometheus layout."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.total += 1
+        self.sum += value
+
+    def lines(self, name, labels=""):
+        separator = "," if labels else ""
+        lines = [f'{name}_bucket{{{labels}{separator}le="{bound}"}} {count}'
+                 for bound, count in zip(self.buckets, self.counts)]
+        lines.append(f'{name}_bucket{{{labels}{separator}le="+Inf"}} {self.total}')
+        suffix = f"{{{labels}}}" if labels else ""
+        lines.append(f"{name}_sum{suffix} {self.sum:.6f}")
+        lines.append(f"{name}_count{suffix} {self.total}")
+        return lines
+
+class DaltonizeService:
+    """
+    Request handling, worker pool and metrics of the HTTP service.
+
+    Parameters:
+        workers (int, optional): Worker processes (or threads), defaults to the CPU count.
+        max_concurrency (int, optional): Images in the pool at once, defaults to `workers`.
+        max_queue (int): Images allowed to wait for the pool before requests are rejected.
+        max_body (int): Largest accepted request body in bytes.
+        lut_size (int, optional): Forwarded to `daltonize()`.
+        use_threads (bool): Use a thread pool instead of processes (less overhead for small images).
+    """
+
+    def __init__(self, workers=None, max_concurrency=None, max_queue=64, max_body=64 << 20, lut_size=None,
+                 use_threads=False):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_concurrency = max_concurrency or self.workers
+        self.max_queue = max_queue
+        self.max_body = max_body
+        self.lut_size = lut_size
+        self.use_threads = use_threads
+        self.executor = None
+        self.slots = None
+
+        self.waiting = 0  # Admitted images without a pool slot yet
+        self.in_flight = 0  # Images in the pool
+        self.connections = 0
+        self.handlers = {}  # Connection task -> its writer
+        self.requests = {}  # (path, status) -> count
+        self.latency = {}  # path -> Histogram of the full request time
+        self.queue_wait = Histogram()
+        self.worker_time = Histogram()
+        self.pixels = 0
+
+    def start(self):
+        if self.use_threads:
+            self.executor = ThreadPoolExecutor(max_workers=self.workers)
+        else:
+            # Workers are created on demand, after the socket is bound. Forked workers would inherit
+            # the listening socket and keep the port open if the server died, so start them from a
+            # clean process instead.
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+            self.executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+        self.slots = asyncio.Semaphore(self.max_concurrency)
+
+    def admit(self, count):
+        """Reserve queue places for `count` images, or reject the request with 503 when they do not fit."""
+        free_slots = max(0, self.max_concurrency - self.in_flight)
+        if self.waiting + count - free_slots > self.max_queue:
+            raise HttpError(503, "Too many queued images, retry later.")
+        self.waiting += count
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+            self.executor = None
+
+    async def run_job(self, data, deficiencies, severity, output_format):
+        """Wait for a pool slot, then daltonize one image in the pool. The image must have been admitted."""
+        loop = asyncio.get_running_loop()
+        queued = time.perf_counter()
+        try:
+            await self.slots.acquire()
+        finally:
+            self.waiting -= 1
+        self.queue_wait.observe(time.perf_counter() - queued)
+
+        self.in_flight += 1
+        try:
+            future = self.executor.submit(process_image_bytes, data, deficiencies, severity, output_format,
+                                          self.lut_size)
+        except BaseException:
+            self.in_flight -= 1
+            self.slots.release()
+            raise
+        # The slot is returned when the worker is really done, even if the client went away
+        future.add_done_callback(lambda _: loop.call_soon_threadsafe(self._release_slot))
+        results, seconds, pixels = await asyncio.wrap_future(future)
+        self.worker_time.observe(seconds)
+        self.pixels += pixels
+        return results
+
+    def _release_slot(self):
+        self.in_flight -= 1
+        self.slots.release()
+
+    async def close_connections(self, timeout=10):
+        """Close every client connection and wait up to `timeout` seconds for their handlers to return."""
+        for writer in self.handlers.values():
+            writer.close()
+        if self.handlers:
+            await asyncio.wait(list(self.handlers), timeout=timeout)
+
+    async def handle_connection(self, reader, writer):
+        self.connections += 1
+        self.handlers[asyncio.current_task()] = writer
+        try:
+            keep_alive = True
+            while keep_alive:
+                try:
+                    request = await asyncio.wait_for(read_request_head(reader), HEADER_TIMEOUT)
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+                    break
+                except HttpError as error:
+                    await send_response(writer, error.status, str(error).encode(), keep_alive=False)
+                    break
+                if request is None:
+                    break
+
+                method, path, query, headers = request
+                keep_alive = headers.get("connection", "").lower() != "close"
+                started = time.perf_counter()
+                status = HTTPStatus.INTERNAL_SERVER_ERROR
+                try:
+                    status, keep_alive = await self.dispatch(method, path, query, headers, reader, writer,
+                                                             keep_alive)
+                except HttpError as error:
+                    status = error.status
+                    # The body may not have been read, so the connection cannot be reused
+                    keep_alive = False
+                    await send_response(writer, status, str(error).encode(), keep_alive=False,
+                                        headers={"Retry-After": "1"} if status == 503 else None)
+                except ConnectionError:
+                    break
+                except Exception:
+                    # Worker crashes (BrokenProcessPool), MemoryError and bugs: answer and drop the connection
+                    print(f"Error: {method} {path} failed:", file=sys.stderr)
+                    traceback.print_exc()
+                    keep_alive = False
+                    try:
+                        await send_response(writer, 500, HTTPStatus(500).phrase.encode(), keep_alive=False)
+                    except ConnectionError:
+                        pass
+                finally:
+                    key = (path, int(status))
+                    self.requests[key] = self.requests.get(key, 0) + 1
+                    self.latency.setdefault(path, Histogram()).observe(time.perf_counter() - started)
+        finally:
+            self.connections -= 1
+            self.handlers.pop(asyncio.current_task(), None)
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def dispatch(self, method, path, query, headers, reader, writer, keep_alive):
+        """Route one request. Returns (status, keep connection open)."""
+        if path == "/health" and method == "GET":
+            await send_response(writer, 200, b"ok", keep_alive=keep_alive)
+            return 200, keep_alive
+        if path == "/metrics" and method == "GET":
+            await send_response(writer, 200, self.metrics_text().encode(),
+                                content_type="text/plain; version=0.0.4", keep_alive=keep_alive)
+            return 200, keep_alive
+        if path != "/daltonize":
+            raise HttpError(404)
+        if method != "POST":
+            raise HttpError(405)
+
+        deficiencies, severity, output_format = parse_options(query)
+        # Backpressure: reject before reading the upload when the queue is already full
+        if self.waiting >= self.max_queue:
+            raise HttpError(503, "Too many queued images, retry later.")
+        body = await read_body(reader, headers, self.max_body)
+        free_slots = max(0, self.max_concurrency - self.in_flight)
+        images = split_uploads(body, headers.get("content-type", ""),
+                               limit=self.max_queue - self.waiting + free_slots)
+        if not images:
+            raise HttpError(400, "No image in the request body.")
+        self.admit(len(images))
+
+        if len(images) == 1 and len(deficiencies) == 1:
+            try:
+                results = await self.run_job(images[0][1], deficiencies, severity, output_format)
+            except ImageTooLarge as error:
+                raise HttpError(413, str(error)) from None
+            except ValueError as error:
+                raise HttpError(400, str(error)) from None
+            await send_response(writer, 200, results[0], content_type=OUTPUT_FORMATS[output_format][1],
+                                keep_alive=keep_alive)
+            return 200, keep_alive
+
+        await self.stream_results(writer, images, deficiencies, severity, output_format, keep_alive)
+        return 200, keep_alive
+
+    async def stream_results(self, writer, images, deficiencies, severity, output_format, keep_alive):
+        """Send every result as one part of a chunked multipart/mixed response as soon as it is ready."""
+        boundary = uuid.uuid4().hex
+        writer.write(response_head(200, f"multipart/mixed; boundary={boundary}", keep_alive,
+                                   {"Transfer-Encoding": "chunked"}))
+
+        unstarted = [len(images)]
+
+        async def job(name, data):
+            unstarted[0] -= 1
+            try:
+                return name, await self.run_job(data, deficiencies, severity, output_format), None
+            except ValueError as error:
+                return name, None, str(error)
+            except Exception:
+                # The response is already streaming, so a failed image becomes an error part
+                print(f"Error: Unable to process {name}:", file=sys.stderr)
+                traceback.print_exc()
+                return name, None, HTTPStatus(500).phrase
+
+        tasks = [asyncio.ensure_future(job(name, data)) for name, data in images]
+        try:
+            for next_result in asyncio.as_completed(tasks):
+                name, results, error = await next_result
+                stem = os.path.splitext(name)[0]
+                if error is not None:
+                    parts = [({"Content-Type": "text/plain; charset=utf-8", "X-Image": name}, error.encode())]
+                else:
+                    parts = [({"Content-Type": OUTPUT_FORMATS[output_format][1], "X-Image": name,
+                               "X-Deficiency": deficiency,
+                               "Content-Disposition": f'attachment; filename="{stem}_{deficiency}.{output_format}"'},
+                              result) for deficiency, result in zip(deficiencies, results)]
+                for part_headers, payload in parts:
+                    head = "".join(f"{k}: {v}\r\n" for k, v in part_headers.items())
+                    write_chunk(writer, f"--{boundary}\r\n{head}\r\n".encode() + payload + b"\r\n")
+                    await writer.drain()  # Slow clients hold back the stream instead of buffering it
+            write_chunk(writer, f"--{boundary}--\r\n".encode())
+            writer.write(b"0\r\n\r\n")
+            await writer.drain()
+        finally:
+            for task in tasks:
+                task.cancel()
+            # Jobs cancelled before they ran never reached run_job(), give their places back
+            self.waiting -= unstarted[0]
+
+    def metrics_text(self):
+        lines = [
+            "# TYPE daltonize_queue_depth gauge", f"daltonize_queue_depth {self.waiting}",
+            "# TYPE daltonize_in_flight gauge", f"daltonize_in_flight {self.in_flight}",
+            "# TYPE daltonize_max_concurrency gauge", f"daltonize_max_concurrency {self.max_concurrency}",
+            "# TYPE daltonize_open_connections gauge", f"daltonize_open_connections {self.connections}",
+            "# TYPE daltonize_pixels_total counter", f"daltonize_pixels_total {self.pixels}",
+            "# TYPE daltonize_requests_total counter",
+        ]
+        lines += [f'daltonize_requests_total{{path="{path}",status="{status}"}} {count}'
+                  for (path, status), count in sorted(self.requests.items())]
+        lines.append("# TYPE daltonize_request_seconds histogram")
+        for path, histogram in sorted(self.latency.items()):
+            lines += histogram.lines("daltonize_request_seconds", f'path="{path}"')
+        lines.append("# TYPE daltonize_queue_wait_seconds histogram")
+        lines += self.queue_wait.lines("daltonize_queue_wait_seconds")
+        lines.append("# TYPE daltonize_worker_seconds histogram")
+        lines += self.worker_time.lines("daltonize_worker_seconds")
+        return "\n".join(lines) + "\n"
+
+async def read_request_head(reader):
+    """Read the request line and headers. Returns None on a closed connection."""
+    line = await reader.readline()
+    if not line:
+        return None
+    try:
+        method, target, _ = line.decode("latin-1").split()
+    except ValueError:
+        raise HttpError(400, "Malformed request line.") from None
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+        if len(headers) > 100:
+            raise HttpError(431)
+
+    url = urlsplit(target)
+    return method.upper(), url.path, parse_qs(url.query), headers
+
+async def read_body(reader, headers, max_body):
+    if "transfer-encoding" in headers:
+        raise HttpError(411, "Send the upload with a Content-Length header.")
+    try:
+        length = int(headers.get("content-length", "0"))
+    except ValueError:
+        raise HttpError(400, "Invalid Content-Length.") from None
+    if length > max_body:
+        raise HttpError(413, f"Uploads are limited to {max_body} bytes.")
+    try:
+        return await asyncio.wait_for(reader.readexactly(length), BODY_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise HttpError(408) from None
+
+def parse_options(query):
+    """Return (deficiencies, severity, output format) from the query parameters."""
+    names = [name for value in query.get("deficiency", ["protan"]) for name in value.split(",") if name]
+    if "all" in names:
+        names = list(deficiency_matrices)
+    for name in names:
+        if name not in deficiency_matrices:
+            raise HttpError(400, "Invalid deficiency type.")
+    try:
+        severity = float(query.get("severity", ["1.0"])[0])
+    except ValueError:
+        raise HttpError(400, "Invalid severity.") from None
+    if not 0.0 <= severity <= 1.0:
+        raise HttpError(400, "Severity must be between 0 and 1.")
+    output_format = query.get("format", ["png"])[0].lower()
+    if output_format not in OUTPUT_FORMATS:
+        raise HttpError(400, f"Unsupported format, use one of {', '.join(OUTPUT_FORMATS)}.")
+    return list(dict.fromkeys(names)), severity, output_format
+
+def split_uploads(body, content_type, limit=None):
+    """
+    Return the uploaded images as (name, bytes) pairs: every file of a multipart/form-data body,
+    or the whole body for any other content type.
+
+    Raises HttpError 503 as soon as more than `limit` images are found.
+    """
+    match = re.search(r'boundary="?([^";]+)"?', content_type)
+    if not content_type.startswith("multipart/form-data") or match is None:
+        return [("image", body)] if body else []
+
+    images = []
+    for part in body.split(b"--" + match.group(1).encode())[1:]:
+        if part.startswith(b"--"):  # Closing delimiter
+            break
+        head, _, data = part.partition(b"\r\n\r\n")
+        filename = re.search(rb'filename="([^"]*)"', head)
+        if filename is None:
+            continue  # Ordinary form field
+        if data.endswith(b"\r\n"):
+            data = data[:-2]
+        if limit is not None and len(images) >= limit:
+            raise HttpError(503, "Too many queued images, retry later.")
+        images.append((filename.group(1).decode("utf-8", "replace") or f"image{len(images)}", data))
+    return images
+
+def response_head(status, content_type, keep_alive, headers=None):
+    lines = [f"HTTP/1.1 {int(status)} {HTTPStatus(status).phrase}", f"Content-Type: {content_type}",
+             f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+    lines += [f"{name}: {value}" for name, value in (headers or {}).items()]
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+async def send_response(writer, status, body=b"", content_type="text/plain; charset=utf-8", keep_alive=True,
+                        headers=None):
+    headers = dict(headers or {}, **{"Content-Length": str(len(body))})
+    writer.write(response_head(status, content_type, keep_alive, headers) + body)
+    await writer.drain()
+
+def write_chunk(writer, data):
+    writer.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+
+async def serve(service, host="127.0.0.1", port=8765, ready=None):
+    """Run the service until cancelled or SIGTERM. `ready`, if given, is called with the bound port."""
+    service.start()
+    stop = asyncio.Event()
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stop.set)
+    except (NotImplementedError, AttributeError):
+        pass  # No signal handlers on Windows event loops
+    try:
+        server = await asyncio.start_server(service.handle_connection, host, port, backlog=256)
+        bound_port = server.sockets[0].getsockname()[1]
+        print(f"Serving daltonize() on http://{host}:{bound_port} "
+              f"({service.workers} {'threads' if service.use_threads else 'processes'}, "
+              f"concurrency {service.max_concurrency}, queue {service.max_queue})", flush=True)
+        if ready is not None:
+            ready(bound_port)
+        async with server:
+            await stop.wait()
+            server.close()
+            await service.close_connections()
+    finally:
+        service.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve daltonize() over HTTP on the local machine.")
+    parser.add_argument("--host", default="127.0.0.1", help="Interface to bind (default: localhost only)")
+    parser.add_argument("--port", type=int, default=8765, help="Port to listen on (0 picks a free port)")
+    parser.add_argument("-j", "--workers", type=int, help="Number of worker processes")
+    parser.add_argument("--threads", action="store_true", help="Use worker threads instead of processes")
+    parser.add_argument("--max-concurrency", type=int, help="Images processed at once (default: workers)")
+    parser.add_argument("--max-queue", type=int, default=64, help="Images allowed to wait before rejecting with 503")
+    parser.add_argument("--max-body-mb", type=float, default=64, help="Largest accepted upload in MB")
+    parser.add_argument("--lut-size", type=int, help="Use cached lookup tables of this size (e.g. 256)")
+    args = parser.parse_args()
+
+    service = DaltonizeService(args.workers, args.max_concurrency, args.max_queue, int(args.max_body_mb * 1e6),
+                               args.lut_size, args.threads)
+    try:
+        asyncio.run(serve(service, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
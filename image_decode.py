@@ -0,0 +1,116 @@
+#########  ***** REDUCED-RESOLUTION IMAGE DECODING  ******  ##########
+
+#  Previews and palette extraction only need a few hundred pixels per side, but a full decode of
+#  a 24 MP JPEG costs far more than the downscale that follows. When the caller passes the size
+#  it needs, JPEGs are decoded at 1/2, 1/4 or 1/8 scale directly from the DCT coefficients
+#  (PIL draft mode, cv2 IMREAD_REDUCED_*), then resized to the exact target. Other formats are
+#  decoded at full size and resized, so every caller can pass a target size unconditionally.
+#
+#  The image is decoded at no less than `reducing_gap` times the target size (as in
+#  PIL's Image.thumbnail), so the final resample still has enough pixels to antialias from.
+#
+#    python benchmarks/decode_speed.py      # full vs reduced decode on large JPEGs
+
+from PIL import Image
+import numpy as np
+
+REDUCTION_FACTORS = (8, 4, 2)  # Scales JPEG decoders can produce from the DCT coefficients
+REDUCING_GAP = 2.0  # Decode at least this many times larger than the target
+
+def required_size(image_size, target_size, fit=True, reducing_gap=REDUCING_GAP):
+    """
+    Return the smallest (width, height) the image may be decoded at for a target size.
+
+    Parameters:
+        image_size (tuple): Full (width, height) of the image.
+        target_size (tuple): (width, height) wanted by the caller.
+        fit (bool): True when the result is fitted inside `target_size` keeping the aspect
+            ratio (thumbnail), False when it is resized to exactly `target_size`.
+        reducing_gap (float): Safety factor for the final resample.
+    """
+    width, height = image_size
+    scale_x, scale_y = target_size[0] / width, target_size[1] / height
+    scale = min(scale_x, scale_y) if fit else max(scale_x, scale_y)
+    scale = min(1.0, scale * reducing_gap)
+    return max(1, int(width * scale)), max(1, int(height * scale))
+
+def reduction_factor(image_size, target_size, fit=True, reducing_gap=REDUCING_GAP):
+    """Return the largest JPEG scale denominator (1, 2, 4 or 8) that keeps `required_size()`."""
+    min_width, min_height = required_size(image_size, target_size, fit, reducing_gap)
+    for factor in REDUCTION_FACTORS:
+        if image_size[0] // factor >= min_width and image_size[1] // factor >= min_height:
+            return factor
+    return 1
+
+def _fit(image, target_size, fit):
+    if fit:
+        if image.width > target_size[0] or image.height > target_size[1]:
+            image.thumbnail(target_size)
+        return image
+    if image.size != tuple(target_size):
+        image = image.resize(tuple(target_size))
+    return image
+
+def decode_image(source, target_size=None, fit=True, reducing_gap=REDUCING_GAP):
+    """
+    Decode an image file as an RGB PIL image, at reduced resolution when a target size is given.
+
+    Parameters:
+        source (str or file object): Image path or open binary file.
+        target_size (tuple, optional): (width, height) needed. None decodes at full resolution.
+        fit (bool): Fit inside `target_size` keeping the aspect ratio (True, images are never
+            enlarged) or resize to exactly `target_size` (False).
+        reducing_gap (float): See `required_size()`; None skips the reduced decode.
+
+    Returns:
+        PIL Image: RGB image of at most `target_size`.
+    """
+    with Image.open(source) as image:
+        if target_size is None:
+            return image.convert("RGB")
+        if reducing_gap is not None:
+            # Only JPEG implements draft(); other formats ignore it and decode at full size
+            image.draft("RGB", required_size(image.size, target_size, fit, reducing_gap))
+        return _fit(image.convert("RGB"), target_size, fit)
+
+def load_rgb(source, target_size=None, fit=True, reducing_gap=REDUCING_GAP):
+    """Same as `decode_image()`, returning a uint8 (H, W, 3) numpy array."""
+    return np.asarray(decode_image(source, target_size, fit, reducing_gap))
+
+def imread_reduced(path, target_size=None, fit=True, reducing_gap=REDUCING_GAP):
+    """
+    Drop-in replacement for `cv2.imread(path)` that decodes JPEGs at reduced scale.
+
+    The image size is read from the file header with PIL (no pixels are decoded), the
+    reduction is done by OpenCV's IMREAD_REDUCED_COLOR_* flags and the result is resized
+    with INTER_AREA to fit `target_size`.
+
+    Returns:
+        numpy array: BGR image, or None when the file cannot be read (like cv2.imread).
+    """
+    import cv2
+
+    if target_size is None:
+        return cv2.imread(path)
+    try:
+        with Image.open(path) as header:
+            image_size = header.size
+    except (OSError, ValueError):
+        return cv2.imread(path)  # Unknown to PIL, let OpenCV decide
+
+    factor = reduction_factor(image_size, target_size, fit, reducing_gap) if reducing_gap else 1
+    flags = {1: cv2.IMREAD_COLOR, 2: cv2.IMREAD_REDUCED_COLOR_2,
+             4: cv2.IMREAD_REDUCED_COLOR_4, 8: cv2.IMREAD_REDUCED_COLOR_8}[factor]
+    image = cv2.imread(path, flags)
+    if image is None:
+        return None
+
+    height, width = image.shape[:2]
+    if fit:
+        scale = min(target_size[0] / width, target_size[1] / height)
+        if scale >= 1:
+            return image
+        size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    else:
+        size = tuple(target_size)
+    return cv2.resize(image, size, interpolation=cv2.INTER_AREA)
@@ -0,0 +1,165 @@
+#########  ***** PER-STAGE TIMING AND MEMORY INSTRUMENTATION  ******  ##########
+
+#  Records how long each pipeline stage (decode, transform, detect, render, encode, ...) takes,
+#  how many pixels it handled and, optionally, its peak traced allocation. Tracing is off by
+#  default and then costs one attribute check per stage. It can be switched on in code with
+#  `enable()` or from the environment:
+#
+#      CVD_TRACE=trace.jsonl         write one JSON line per stage to this file
+#      CVD_TRACE=1                   keep statistics in memory only (for the live readouts)
+#      CVD_TRACE_MEMORY=1            also record peak allocations (uses tracemalloc, slower; memory
+#                                    allocated inside PIL and OpenCV is not seen by tracemalloc)
+
+import json
+import os
+import threading
+import time
+import tracemalloc
+
+class _NullStage:
+    """Stage returned while tracing is disabled; does nothing."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def add_pixels(self, pixels):
+        pass
+
+_NULL_STAGE = _NullStage()
+
+class _Stage:
+    def __init__(self, tracer, name, pixels):
+        self.tracer = tracer
+        self.name = name
+        self.pixels = pixels
+
+    def add_pixels(self, pixels):
+        """Set the pixel count once it is known inside the stage (e.g. after decoding)."""
+        self.pixels = (self.pixels or 0) + int(pixels)
+
+    def __enter__(self):
+        if self.tracer.memory:
+            tracemalloc.reset_peak()
+            self._memory_start = tracemalloc.get_traced_memory()[0]
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        seconds = time.perf_counter() - self._start
+        peak = None
+        if self.tracer.memory:
+            peak = max(0, tracemalloc.get_traced_memory()[1] - self._memory_start)
+        self.tracer._record(self.name, seconds, self.pixels, peak)
+        return False
+
+class Tracer:
+    """Collects stage measurements, aggregates them and optionally writes JSON lines."""
+
+    def __init__(self):
+        self.enabled = False
+        self.memory = False
+        self.stats = {}  # stage -> {'count', 'seconds', 'last_ms', 'pixels', 'peak_bytes'}
+        self._file = None
+        self._lock = threading.Lock()
+
+    def enable(self, trace_path=None, memory=False):
+        """
+        Turn tracing on.
+
+        Parameters:
+            trace_path (str, optional): Append one JSON object per finished stage to this file.
+            memory (bool): Record the peak traced allocation of each stage. Nested stages
+                reset the peak of the enclosing one, so enable this for flat stages only.
+        """
+        self.disable()
+        if trace_path:
+            self._file = open(trace_path, "a", encoding="utf-8")
+        self.memory = memory
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self.enabled = True
+
+    def disable(self):
+        """Turn tracing off and close the trace file."""
+        self.enabled = False
+        if self.memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        self.memory = False
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def stage(self, name, pixels=None):
+        """
+        Context manager measuring one stage.
+
+        Usage:
+            with tracer.stage("transform", pixels=image.shape[0] * image.shape[1]):
+                ...
+        """
+        if not self.enabled:
+            return _NULL_STAGE
+        return _Stage(self, name, pixels)
+
+    def _record(self, name, seconds, pixels, peak):
+        with self._lock:
+            entry = self.stats.setdefault(name, {"count": 0, "seconds": 0.0, "last_ms": 0.0,
+                                                 "pixels": 0, "peak_bytes": 0})
+            entry["count"] += 1
+            entry["seconds"] += seconds
+            entry["last_ms"] = seconds * 1000
+            entry["pixels"] += pixels or 0
+            if peak is not None:
+                entry["peak_bytes"] = max(entry["peak_bytes"], peak)
+
+            if self._file is not None:
+                event = {"time": time.time(), "stage": name, "ms": seconds * 1000,
+                         "pixels": pixels, "thread": threading.current_thread().name}
+                if peak is not None:
+                    event["peak_bytes"] = peak
+                self._file.write(json.dumps(event) + "\n")
+                self._file.flush()
+
+    def summary_lines(self):
+        """Return one readable line per stage, e.g. for a Tk label or an OpenCV overlay."""
+        with self._lock:
+            lines = []
+            for name, entry in self.stats.items():
+                line = f"{name}: {entry['last_ms']:.1f} ms (avg {entry['seconds'] * 1000 / entry['count']:.1f})"
+                if entry["pixels"] and entry["seconds"]:
+                    line += f", {entry['pixels'] / 1e6 / entry['seconds']:.1f} MP/s"
+                if entry["peak_bytes"]:
+                    line += f", peak {entry['peak_bytes'] / 1e6:.1f} MB"
+                lines.append(line)
+            return lines
+
+    def reset(self):
+        with self._lock:
+            self.stats.clear()
+
+# Process-wide tracer shared by all tools
+tracer = Tracer()
+
+def stage(name, pixels=None):
+    """Shortcut for `tracer.stage()`."""
+    return tracer.stage(name, pixels)
+
+def add_trace_arguments(parser):
+    """Add the --trace and --trace-memory options to an argparse parser."""
+    parser.add_argument("--trace", metavar="PATH", nargs="?", const="",
+                        help="Record per-stage timings, optionally appending JSON lines to PATH")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="Also record peak allocations per stage (implies --trace)")
+
+def enable_from_args(args):
+    """Enable tracing if --trace or --trace-memory was given; returns whether tracing is on."""
+    if args.trace is not None or args.trace_memory:
+        tracer.enable(args.trace or None, memory=args.trace_memory)
+    return tracer.enabled
+
+if os.environ.get("CVD_TRACE"):
+    _target = os.environ["CVD_TRACE"]
+    tracer.enable(None if _target == "1" else _target, memory=os.environ.get("CVD_TRACE_MEMORY") == "1")
@@ -0,0 +1,188 @@
+#########  ***** ONE-PASS CONNECTED-COMPONENT OBJECT STATISTICS  ******  ##########
+
+#  Labels the detection mask once with connected components and computes every per-object
+#  statistic from that label image with bincount reductions, so there is no loop over
+#  objects and no per-object mask: area, bounding box, centroid, mean color, dominant
+#  color, the colors as seen with each color vision deficiency and their names.
+#  With `scale` below 1 the mask is computed and labeled on a downscaled frame (INTER_AREA,
+#  so colors are averaged, not dropped) and the geometry is mapped back to frame
+#  coordinates; statistics for hundreds of objects then cost less than one full-size pass.
+#  The segmentation tool instead labels its full-size detection mask once with
+#  `label_objects()` and passes the components in, so its contours (`object_contours()`) and
+#  its statistics describe the same objects; only the colors are then sampled at `scale`.
+
+import cv2
+import numpy as np
+
+from cvd_transforms import apply_matrix, simulation_matrix
+
+DOMINANT_BITS = 4  # Bits per channel of the color histogram used to find the dominant color
+
+def hsv_mask(frame, lower, upper):
+    """Return the uint8 mask of the pixels of a BGR frame whose HSV values lie in [lower, upper]."""
+    hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
+    return cv2.inRange(hsv, np.array(lower), np.array(upper))
+
+def label_objects(mask, min_area=500):
+    """
+    Label the 8-connected components of a mask and apply the object area rule: a component is
+    an object when it has more than `min_area` pixels.
+
+    Returns:
+        tuple: (int32 labels, component stats, centroids, kept component labels), the
+            `components` argument of `ObjectStats` and `object_contours()`.
+    """
+    count, labels, stats, centroids = cv2.connectedComponentsWithStats(mask, connectivity=8, ltype=cv2.CV_32S)
+    keep = np.flatnonzero(stats[1:, cv2.CC_STAT_AREA] > min_area) + 1
+    return labels, stats, centroids, keep
+
+def object_contours(components):
+    """Return the outer contour of every object kept by `label_objects()`, also of objects inside holes."""
+    labels, stats, _, keep = components
+    lookup = np.zeros(len(stats), dtype=np.uint8)
+    lookup[keep] = 255
+    contours, hierarchy = cv2.findContours(lookup[labels], cv2.RETR_CCOMP, cv2.CHAIN_APPROX_SIMPLE)
+    if not contours:
+        return []
+    # Two-level hierarchy: outer boundaries have no parent, hole boundaries do
+    return [contour for contour, links in zip(contours, hierarchy[0]) if links[3] < 0]
+
+def downscale(frame, scale):
+    """Resize a frame by `scale` (< 1) with area averaging; returns the frame itself for scale 1."""
+    if scale >= 1:
+        return frame
+    height, width = frame.shape[:2]
+    size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    return cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+
+class ObjectStats:
+    """
+    Per-object statistics of the connected components of a detection mask.
+
+    Parameters:
+        frame (numpy array): uint8 BGR frame (RGB with `bgr=False`).
+        lower, upper (tuple): HSV bounds of the detection mask, see `hsv_mask()`.
+        min_area (int): Objects with fewer pixels (in frame coordinates) are dropped.
+        scale (float): Compute the mask and the statistics on the frame resized by this factor.
+        deficiencies (tuple): Deficiencies for which `simulated_colors` are computed.
+        severity (float): Severity of the simulated deficiencies, from 0 to 1.
+        bgr (bool): Channel order of `frame`. All colors below are RGB regardless.
+        mask (numpy array, optional): Precomputed mask at `scale` resolution instead of the HSV one.
+        components (tuple, optional): `label_objects()` of a full-size mask. The objects and their
+            geometry are then taken from it as they are (`min_area` is not applied again) and
+            only the colors are computed at `scale`.
+
+    Attributes (N objects, ordered by component label):
+        areas (N,) float: pixel counts in frame coordinates.
+        bboxes (N, 4) int: x, y, width, height in frame coordinates.
+        centroids (N, 2) float: x, y in frame coordinates.
+        mean_colors (N, 3) uint8: mean RGB color.
+        dominant_colors (N, 3) uint8: mean RGB color of the most frequent histogram bin.
+        simulated_colors (dict): deficiency -> (N, 3) uint8 dominant colors as simulated.
+        labels (numpy array): int32 connected-component labels at `scale` resolution (full
+            resolution with `components`).
+        object_numbers (numpy array): component label -> object index + 1, 0 for the
+            background and for components below `min_area`.
+    """
+
+    def __init__(self, frame, lower=(0, 40, 40), upper=(180, 255, 255), min_area=500, scale=1.0,
+                 deficiencies=("protan", "deutan", "tritan"), severity=1.0, bgr=True, mask=None, components=None):
+        small = downscale(frame[..., :3], scale)
+        if components is None:
+            if mask is None:
+                mask = hsv_mask(small if bgr else small[..., ::-1], lower, upper)
+            # Exact per-axis factors, the downscaled size is rounded
+            scale_y = small.shape[0] / frame.shape[0]
+            scale_x = small.shape[1] / frame.shape[1]
+            labels, stats, centroids, keep = label_objects(mask, min_area * scale_x * scale_y)
+            color_labels = labels
+        else:
+            labels, stats, centroids, keep = components
+            scale_x = scale_y = 1.0
+            color_labels = self._sample(labels, small.shape[:2])
+        self.scale_y, self.scale_x = scale_y, scale_x
+
+        # Renumber the kept components 1..N
+        self.labels = labels
+        self.object_numbers = np.zeros(len(stats), dtype=np.int32)
+        self.object_numbers[keep] = np.arange(1, len(keep) + 1, dtype=np.int32)
+
+        self.areas = stats[keep, cv2.CC_STAT_AREA] / (scale_x * scale_y)
+        boxes = stats[keep, :4].astype(np.float64)
+        boxes[:, [0, 2]] /= scale_x
+        boxes[:, [1, 3]] /= scale_y
+        self.bboxes = np.round(boxes).astype(np.int32)
+        # Pixel centers: (c + 0.5) / scale - 0.5 maps a downscaled coordinate back to the frame
+        self.centroids = np.column_stack(((centroids[keep, 0] + 0.5) / scale_x - 0.5,
+                                          (centroids[keep, 1] + 0.5) / scale_y - 0.5))
+
+        self.mean_colors, self.dominant_colors = self._colors(small, color_labels, len(keep))
+        if bgr:
+            self.mean_colors = np.ascontiguousarray(self.mean_colors[:, ::-1])
+            self.dominant_colors = np.ascontiguousarray(self.dominant_colors[:, ::-1])
+        self.simulated_colors = {deficiency: self.simulate(simulation_matrix(deficiency, severity))
+                                 for deficiency in deficiencies}
+
+    @staticmethod
+    def _sample(labels, shape):
+        """Nearest-neighbor resize of a label image (pixel centers), so labels are never blended."""
+        if labels.shape == tuple(shape):
+            return labels
+        rows = ((np.arange(shape[0]) + 0.5) * labels.shape[0] / shape[0]).astype(np.intp)
+        cols = ((np.arange(shape[1]) + 0.5) * labels.shape[1] / shape[1]).astype(np.intp)
+        return labels[rows[:, None], cols]
+
+    def _colors(self, image, labels, n):
+        """Mean and dominant colors (in the channel order of `image`) of all objects, from the kept pixels only."""
+        flat_labels = labels.ravel()
+        foreground = np.flatnonzero(flat_labels)
+        object_ids = self.object_numbers[flat_labels[foreground]]
+        kept = np.flatnonzero(object_ids)
+        foreground, object_ids = foreground[kept], object_ids[kept]
+        pixels = np.take(np.ascontiguousarray(image).reshape(-1, 3), foreground, axis=0)
+        counts = np.bincount(object_ids, minlength=n + 1)[1:].astype(np.float64)
+        counts[counts == 0] = 1  # Objects can vanish only through rounding at tiny scales
+
+        channels = pixels.T.astype(np.float64)  # Contiguous planes for the weighted bincounts
+        means = np.empty((n, 3), dtype=np.float64)
+        for channel in range(3):
+            means[:, channel] = np.bincount(object_ids, weights=channels[channel], minlength=n + 1)[1:] / counts
+
+        # Joint (object, color bin) histogram; its row maxima are the dominant bins
+        shift = 8 - DOMINANT_BITS
+        bins = 1 << (3 * DOMINANT_BITS)
+        q = pixels >> shift
+        color_bins = (q[:, 0].astype(np.int32) << (2 * DOMINANT_BITS)) | (q[:, 1].astype(np.int32) << DOMINANT_BITS) | q[:, 2]
+        histogram = np.bincount((object_ids - 1) * bins + color_bins, minlength=n * bins).reshape(n, bins)
+        dominant_bins = histogram.argmax(axis=1) if n else np.zeros(0, dtype=np.int64)
+
+        # Average the pixels of each object's dominant bin for a color finer than the bin grid
+        in_dominant = color_bins == dominant_bins[object_ids - 1]
+        dominant_ids = object_ids[in_dominant]
+        dominant_counts = np.bincount(dominant_ids, minlength=n + 1)[1:].astype(np.float64)
+        dominant_counts[dominant_counts == 0] = 1
+        dominant = np.empty((n, 3), dtype=np.float64)
+        for channel in range(3):
+            dominant[:, channel] = np.bincount(dominant_ids, weights=channels[channel, in_dominant],
+                                               minlength=n + 1)[1:] / dominant_counts
+
+        return np.round(means).astype(np.uint8), np.round(dominant).astype(np.uint8)
+
+    def __len__(self):
+        return len(self.areas)
+
+    def simulate(self, matrix, colors=None):
+        """Apply a 3x3 matrix to the dominant colors (or `colors`), exactly as on an image."""
+        colors = self.dominant_colors if colors is None else colors
+        return apply_matrix(colors.reshape(-1, 1, 3), matrix).reshape(-1, 3)
+
+    def names(self, namer, colors=None):
+        """Nearest color names of the dominant colors (or `colors`) through a color_names.ColorNamer."""
+        return namer.name_colors(self.dominant_colors if colors is None else colors)
+
+    def hit(self, x, y):
+        """Return the index of the object at frame coordinates (x, y), or -1."""
+        row, col = int(y * self.scale_y), int(x * self.scale_x)
+        if 0 <= row < self.labels.shape[0] and 0 <= col < self.labels.shape[1]:
+            return int(self.object_numbers[self.labels[row, col]]) - 1
+        return -1
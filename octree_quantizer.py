@@ -0,0 +1,113 @@
+#########  ***** OCTREE COLOR QUANTIZATION  ******  ##########
+
+#  Classic octree quantization (Gervautz & Purgathofer) run on a color histogram instead of
+#  on raw pixels. Each level of the tree is the set of colors that share their top `level`
+#  bits per channel, so a whole level is built with one np.unique. Reduction merges the
+#  least populated nodes of the deepest level first, exactly like the pointer-based version,
+#  but vectorized and deterministic (ties are broken by node code). Where merging a whole
+#  node would leave fewer than `n_colors` leaves, only its smallest children are merged, so
+#  the palette always has exactly `n_colors` entries unless the image has fewer colors.
+
+import numpy as np
+
+def color_histogram(image_array):
+    """
+    Count the distinct colors of an image.
+
+    Parameters:
+        image_array (numpy array): uint8 image or pixel list with RGB in the last axis.
+
+    Returns:
+        tuple: (unique colors as an (N, 3) uint8 array, pixel counts as an (N,) int64 array).
+    """
+    pixels = np.asarray(image_array, dtype=np.uint8)[..., :3].reshape(-1, 3)
+    packed = (pixels[:, 0].astype(np.int32) << 16) | (pixels[:, 1].astype(np.int32) << 8) | pixels[:, 2]
+    codes, counts = np.unique(packed, return_counts=True)
+    colors = np.stack([(codes >> 16) & 255, (codes >> 8) & 255, codes & 255], axis=1).astype(np.uint8)
+    return colors, counts.astype(np.int64)
+
+def _level_codes(colors, level):
+    """Pack the top `level` bits of each channel into one node code per color."""
+    shift = 8 - level
+    c = colors.astype(np.int32) >> shift
+    return (c[:, 0] << (2 * level)) | (c[:, 1] << level) | c[:, 2]
+
+def octree_quantize(colors, counts, n_colors):
+    """
+    Reduce a color histogram to `n_colors` representative colors (all of them if there are fewer).
+
+    Parameters:
+        colors (numpy array): (N, 3) distinct colors, e.g. from `color_histogram()`.
+        counts (numpy array): (N,) number of pixels with each color.
+        n_colors (int): Maximum palette size.
+
+    Returns:
+        tuple: (palette as a (k, 3) uint8 array sorted by pixel count, descending,
+                pixel count of each palette entry, palette index of every input color).
+    """
+    if n_colors < 1:
+        raise ValueError("n_colors must be at least 1.")
+    colors = np.asarray(colors, dtype=np.uint8)
+    counts = np.asarray(counts, dtype=np.int64)
+
+    # Current leaves: start with the distinct colors themselves (depth 8). Each leaf keeps
+    # its pixel count, its weighted color sum and one member color to derive parent codes.
+    leaf_counts = counts
+    leaf_sums = colors * counts[:, None]
+    leaf_members = colors
+    leaf_of = np.arange(len(colors))
+
+    for level in range(7, -1, -1):
+        if len(leaf_counts) <= n_colors:
+            break
+        # Parents of the current leaves, with their number of children and pixels
+        parent_codes, parent_of = np.unique(_level_codes(leaf_members, level), return_inverse=True)
+        parent_of = parent_of.ravel()
+        n_parents = len(parent_codes)
+        n_children = np.bincount(parent_of, minlength=n_parents)
+        parent_counts = np.bincount(parent_of, weights=leaf_counts, minlength=n_parents)
+
+        # Merge the least populated parents first until the palette fits
+        order = np.lexsort((parent_codes, parent_counts))
+        remaining = len(leaf_counts) - np.cumsum(n_children[order] - 1)
+        fits = np.nonzero(remaining <= n_colors)[0]
+        n_merged = fits[0] + 1 if len(fits) else n_parents
+
+        merged = np.zeros(n_parents, dtype=bool)
+        merged[order[:n_merged]] = True
+        # Leaves under a merged parent collapse into it, the others stay as they are
+        collapse = merged[parent_of]
+        if len(fits) and remaining[n_merged - 1] < n_colors:
+            # The last parent would overshoot: merge only its smallest children, just enough of them
+            last = order[n_merged - 1]
+            before = remaining[n_merged - 2] if n_merged > 1 else len(leaf_counts)
+            children = np.flatnonzero(parent_of == last)
+            smallest = children[np.lexsort((_level_codes(leaf_members[children], 8), leaf_counts[children]))]
+            collapse[children] = False
+            collapse[smallest[:before - n_colors + 1]] = True
+        new_leaf = np.where(collapse, parent_of, n_parents + np.arange(len(leaf_counts)))
+        _, new_leaf = np.unique(new_leaf, return_inverse=True)
+        new_leaf = new_leaf.ravel()
+        n_leaves = new_leaf.max() + 1
+
+        leaf_counts = np.bincount(new_leaf, weights=leaf_counts, minlength=n_leaves).astype(np.int64)
+        leaf_sums = np.stack([np.bincount(new_leaf, weights=leaf_sums[:, i], minlength=n_leaves)
+                              for i in range(3)], axis=1)
+        members = np.empty((n_leaves, 3), dtype=np.uint8)
+        members[new_leaf] = leaf_members
+        leaf_members = members
+        leaf_of = new_leaf[leaf_of]
+
+    palette = np.rint(leaf_sums / leaf_counts[:, None]).astype(np.uint8)
+
+    # Most common colors first, ties broken by color value so the order is stable
+    order = np.lexsort((palette[:, 2], palette[:, 1], palette[:, 0], -leaf_counts))
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    return palette[order], leaf_counts[order], rank[leaf_of]
+
+def octree_palette(image_array, n_colors):
+    """Return the octree palette (sorted by pixel count) and its pixel counts for an image."""
+    colors, counts = color_histogram(image_array)
+    palette, palette_counts, _ = octree_quantize(colors, counts, n_colors)
+    return palette, palette_counts
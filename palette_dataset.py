@@ -0,0 +1,219 @@
+#########  ***** DATASET-SCALE PALETTE EXTRACTION  ******  ##########
+
+#  Builds one color palette for a whole image collection. Worker processes decode the images
+#  and reduce each one to a sparse color histogram; the main process folds those histograms
+#  into a fixed-size running histogram and, optionally, a MiniBatchKMeans model via
+#  partial_fit. Memory stays constant however many images are fed in, the state can be
+#  checkpointed and resumed, and the palette is written as JSON or NPY data.
+
+import argparse
+import json
+import os
+import pickle
+import tempfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+
+from batch_daltonize import collect_images
+from image_decode import load_rgb
+from octree_quantizer import octree_quantize
+
+PALETTE_DATASET_ENGINES = ("histogram", "minibatch")
+
+def image_histogram(image_path, bits=6, sample_size=512):
+    """
+    Decode an image at reduced size and count its colors on a `bits`-per-channel grid.
+
+    Returns:
+        tuple: (bin indices, pixel counts) of the non-empty bins.
+    """
+    pixels = load_rgb(image_path, (sample_size, sample_size)).reshape(-1, 3)
+
+    shift = 8 - bits
+    q = pixels.astype(np.int32) >> shift
+    bins = (q[:, 0] << (2 * bits)) | (q[:, 1] << bits) | q[:, 2]
+    counts = np.bincount(bins, minlength=1 << (3 * bits))
+    nonzero = np.nonzero(counts)[0]
+    return nonzero.astype(np.int32), counts[nonzero]
+
+def bin_colors(bits):
+    """Return the RGB center of every histogram bin as a (2^(3*bits), 3) uint8 array."""
+    levels = 1 << bits
+    step = 256 // levels
+    centers = np.arange(levels) * step + step // 2
+    return np.stack(np.meshgrid(centers, centers, centers, indexing="ij"), axis=-1).reshape(-1, 3).astype(np.uint8)
+
+class DatasetPalette:
+    """
+    Running palette state for an image collection.
+
+    Parameters:
+        n_colors (int): Palette size.
+        engine (str): 'histogram' quantizes the accumulated histogram with the octree at the
+            end, 'minibatch' additionally trains MiniBatchKMeans incrementally on every image.
+        bits (int): Bits per channel of the running histogram (6 gives 262144 bins, 2 MB).
+    """
+
+    def __init__(self, n_colors=98, engine="histogram", bits=6):
+        if engine not in PALETTE_DATASET_ENGINES:
+            raise ValueError("Invalid palette engine.")
+        self.n_colors = n_colors
+        self.engine = engine
+        self.bits = bits
+        self.histogram = np.zeros(1 << (3 * bits), dtype=np.int64)
+        self.done = set()
+        self.clusterer = None
+        self._pending = []  # MiniBatchKMeans needs at least n_colors samples in its first batch
+
+    def add(self, image_path, bins, counts):
+        """Fold the histogram of one image into the running state."""
+        self.histogram[bins] += counts
+        self.done.add(image_path)
+
+        if self.engine == "minibatch":
+            self._pending.append((bins, counts))
+            if self.clusterer is not None or sum(len(b) for b, _ in self._pending) >= self.n_colors:
+                bins = np.concatenate([b for b, _ in self._pending])
+                counts = np.concatenate([c for _, c in self._pending])
+                self._pending = []
+                if self.clusterer is None:
+                    from sklearn.cluster import MiniBatchKMeans
+                    self.clusterer = MiniBatchKMeans(n_clusters=self.n_colors, random_state=42, n_init=3)
+                colors = bin_colors(self.bits)[bins].astype(np.float64)
+                self.clusterer.partial_fit(colors, sample_weight=counts.astype(np.float64))
+
+    def palette(self):
+        """
+        Return the current palette.
+
+        Returns:
+            tuple: ((k, 3) uint8 colors sorted by pixel count, descending, and their pixel counts).
+        """
+        nonzero = np.nonzero(self.histogram)[0]
+        if len(nonzero) == 0:
+            return np.zeros((0, 3), dtype=np.uint8), np.zeros(0, dtype=np.int64)
+        colors = bin_colors(self.bits)[nonzero]
+        counts = self.histogram[nonzero]
+
+        if self.engine == "minibatch" and self.clusterer is not None:
+            centers = self.clusterer.cluster_centers_
+            # Weight each center by the pixels of the running histogram closest to it
+            nearest = ((colors[:, None, :].astype(np.float64) - centers[None]) ** 2).sum(axis=2).argmin(axis=1)
+            weights = np.bincount(nearest, weights=counts, minlength=len(centers)).astype(np.int64)
+            order = np.argsort(-weights, kind="stable")
+            return np.rint(centers[order]).clip(0, 255).astype(np.uint8), weights[order]
+
+        palette, weights, _ = octree_quantize(colors, counts, self.n_colors)
+        return palette, weights
+
+    def save_checkpoint(self, path):
+        """Write the state to `path` atomically."""
+        folder = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(dir=folder, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            # Plain dict, so checkpoints load no matter which module name the class had
+            pickle.dump(dict(self.__dict__), f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load_checkpoint(cls, path):
+        """Restore a state written by `save_checkpoint()`."""
+        with open(path, "rb") as f:
+            fields = pickle.load(f)
+        state = cls(fields["n_colors"], fields["engine"], fields["bits"])
+        state.__dict__.update(fields)
+        return state
+
+def save_palette(path, palette, weights, n_images):
+    """Write the palette as .json (colors, weights, image count) or .npy ((k, 3) uint8 colors)."""
+    if os.path.splitext(path)[1].lower() == ".npy":
+        np.save(path, palette)
+        return
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"colors": palette.astype(int).tolist(),
+                   "weights": weights.astype(int).tolist(),
+                   "images": n_images}, f)
+
+def build_dataset_palette(inputs, n_colors=98, engine="histogram", bits=6, sample_size=512, workers=None,
+                          checkpoint=None, checkpoint_every=100):
+    """
+    Build a palette over every image found in `inputs`.
+
+    Parameters:
+        inputs (list of str): Directories, glob patterns or image files.
+        n_colors (int): Palette size.
+        engine (str): 'histogram' or 'minibatch', see `DatasetPalette`.
+        bits (int): Bits per channel of the running histogram.
+        sample_size (int): Images are decoded to fit within sample_size x sample_size.
+        workers (int, optional): Number of decoder processes, defaults to the CPU count.
+        checkpoint (str, optional): State file. When it exists the run resumes from it and
+            skips images already counted.
+        checkpoint_every (int): Save the state after this many new images.
+
+    Returns:
+        DatasetPalette: The final state; call `palette()` for the colors.
+    """
+    if checkpoint and os.path.exists(checkpoint):
+        state = DatasetPalette.load_checkpoint(checkpoint)
+        if (state.n_colors, state.engine, state.bits) != (n_colors, engine, bits):
+            raise ValueError("Checkpoint was created with different palette settings.")
+    else:
+        state = DatasetPalette(n_colors, engine, bits)
+
+    paths = [path for path, _ in collect_images(inputs) if path not in state.done]
+    workers = workers or os.cpu_count() or 1
+    since_checkpoint = 0
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = {}
+        paths = iter(paths)
+        while True:
+            # Bounded window of decodes in flight
+            for path in paths:
+                pending[executor.submit(image_histogram, path, bits, sample_size)] = path
+                if len(pending) >= 2 * workers:
+                    break
+            if not pending:
+                break
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                path = pending.pop(future)
+                try:
+                    bins, counts = future.result()
+                except Exception as error:
+                    print(f"Error: Unable to process {path}: {error}")
+                    continue
+                state.add(path, bins, counts)
+                since_checkpoint += 1
+
+            if checkpoint and since_checkpoint >= checkpoint_every:
+                state.save_checkpoint(checkpoint)
+                since_checkpoint = 0
+
+    if checkpoint:
+        state.save_checkpoint(checkpoint)
+    return state
+
+def main():
+    parser = argparse.ArgumentParser(description="Extract one color palette from a whole image collection.")
+    parser.add_argument("inputs", nargs="+", help="Image files, directories or glob patterns")
+    parser.add_argument("-n", "--colors", type=int, default=98, help="Palette size")
+    parser.add_argument("-o", "--output", default="palette.json", help="Output .json or .npy file")
+    parser.add_argument("--engine", choices=PALETTE_DATASET_ENGINES, default="histogram")
+    parser.add_argument("--bits", type=int, default=6, help="Bits per channel of the running histogram")
+    parser.add_argument("--sample-size", type=int, default=512, help="Decode images to fit this size")
+    parser.add_argument("-j", "--workers", type=int, help="Number of decoder processes")
+    parser.add_argument("--checkpoint", help="State file to resume from and save to")
+    parser.add_argument("--checkpoint-every", type=int, default=100, help="Images between checkpoints")
+    args = parser.parse_args()
+
+    state = build_dataset_palette(args.inputs, args.colors, args.engine, args.bits, args.sample_size,
+                                  args.workers, args.checkpoint, args.checkpoint_every)
+    palette, weights = state.palette()
+    save_palette(args.output, palette, weights, len(state.done))
+    print(f"Saved {len(palette)} colors from {len(state.done)} images to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,305 @@
+#########  ***** CONTENT-ADDRESSED RESULT CACHE  ******  ##########
+
+#  Caches the results of daltonize(), apply_cvd_lab_simulation() and extract_color_palettes()
+#  under a key made of the image content hash and everything that defines the transform
+#  (matrix, adjustments, palette settings). Two tiers, both size-bounded with LRU eviction:
+#
+#    memory  per process, an OrderedDict of read-only results
+#    disk    shared, one .npy (or .pkl) file per result in DALTONIZE_RESULT_CACHE
+#            (default ~/.cache/daltonization/results)
+#
+#  Several worker processes can share the disk tier: files are written to a temporary name and
+#  renamed into place, so readers never see partial results, and readers and evictors treat a
+#  file vanishing under them as a miss. Recency on disk is the file's modification time, which
+#  every hit refreshes. Each process tracks the size of the disk tier from a directory scan that
+#  is refreshed every RESCAN_SECONDS, so concurrent writers can overshoot the budget briefly.
+#
+#    python result_cache.py              # entries and size of the disk tier
+#    python result_cache.py --clear
+
+import argparse
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+CACHE_VERSION = 1  # Bump to invalidate every stored result after a change in the transforms
+DEFAULT_MEMORY_BYTES = 256 << 20
+DEFAULT_DISK_BYTES = 2 << 30
+RESCAN_SECONDS = 2.0  # Age after which the disk size estimate is refreshed, other processes write too
+
+def default_cache_dir():
+    """Return the directory of the shared disk tier."""
+    return os.environ.get("DALTONIZE_RESULT_CACHE",
+                          os.path.join(os.path.expanduser("~"), ".cache", "daltonization", "results"))
+
+def image_key(image_array):
+    """Content hash of an image array (shape, dtype and pixels)."""
+    image_array = np.ascontiguousarray(image_array)
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{image_array.shape}{image_array.dtype.str}".encode())
+    digest.update(memoryview(image_array).cast("B"))
+    return digest.hexdigest()
+
+def file_key(path, block_size=1 << 20):
+    """Content hash of a file, e.g. an image that is decoded inside the cached function."""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def make_key(operation, *parts):
+    """
+    Combine an operation name with the parts that identify a result into a cache key.
+
+    Arrays (e.g. matrices) contribute their exact bytes, other parts their repr.
+    """
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(f"v{CACHE_VERSION}:{operation}".encode())
+    for part in parts:
+        if isinstance(part, np.ndarray):
+            part = np.ascontiguousarray(part)
+            digest.update(f"|{part.shape}{part.dtype.str}:".encode())
+            digest.update(memoryview(part).cast("B"))
+        else:
+            digest.update(f"|{part!r}".encode())
+    return digest.hexdigest()
+
+def _size_of(value):
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    return len(pickle.dumps(value))
+
+class ResultCache:
+    """
+    Two-tier LRU cache of computed results.
+
+    Parameters:
+        memory_bytes (int): Budget of the in-process tier, 0 disables it.
+        disk_bytes (int): Budget of the disk tier, 0 disables it.
+        cache_dir (str, optional): Directory of the disk tier, see `default_cache_dir()`.
+
+    Array results are stored and returned read-only, so a caller can never modify a cached
+    copy; use `.copy()` for a writable array.
+    """
+
+    def __init__(self, memory_bytes=DEFAULT_MEMORY_BYTES, disk_bytes=DEFAULT_DISK_BYTES, cache_dir=None):
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self.cache_dir = cache_dir or default_cache_dir()
+        self._entries = OrderedDict()  # key -> (value, size)
+        self._memory_used = 0
+        self._disk_used = None  # Estimate, rescanned before evicting
+        self._disk_scanned = 0.0
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.memory_evictions = 0
+        self.disk_evictions = 0
+
+    def get(self, key):
+        """Return the cached value for `key`, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.memory_hits += 1
+                return entry[0]
+
+        value = self._read_disk(key) if self.disk_bytes else None
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+        self._remember(key, value)
+        return value
+
+    def put(self, key, value):
+        """Store `value` in both tiers and return it (read-only if it is an array)."""
+        if isinstance(value, np.ndarray):
+            value.setflags(write=False)
+        self._remember(key, value)
+        if self.disk_bytes:
+            self._write_disk(key, value)
+        return value
+
+    def get_or_compute(self, key, compute):
+        """Return the cached value for `key`, calling `compute()` and storing its result on a miss."""
+        value = self.get(key)
+        if value is None:
+            value = self.put(key, compute())
+        return value
+
+    def stats(self):
+        """Hit/miss counters and tier sizes, for sizing the cache."""
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+                "memory_entries": len(self._entries),
+                "memory_bytes": self._memory_used,
+                "memory_evictions": self.memory_evictions,
+                "disk_bytes": self._disk_used,
+                "disk_evictions": self.disk_evictions,
+            }
+
+    def clear(self, disk=True):
+        """Empty the memory tier and, with `disk`, delete every file of the disk tier."""
+        with self._lock:
+            self._entries.clear()
+            self._memory_used = 0
+        if disk:
+            for path, _, _ in self._disk_files():
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            self._disk_used = 0
+
+    def _remember(self, key, value):
+        size = _size_of(value)
+        if size > self.memory_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._memory_used -= previous[1]
+            self._entries[key] = (value, size)
+            self._memory_used += size
+            while self._memory_used > self.memory_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._memory_used -= evicted_size
+                self.memory_evictions += 1
+
+    def _path(self, key, extension):
+        return os.path.join(self.cache_dir, key[:2], key + extension)
+
+    def _read_disk(self, key):
+        for extension in (".npy", ".pkl"):
+            path = self._path(key, extension)
+            try:
+                if extension == ".npy":
+                    value = np.load(path, allow_pickle=False)
+                    value.setflags(write=False)
+                else:
+                    with open(path, "rb") as f:
+                        value = pickle.load(f)
+                os.utime(path)  # Mark as recently used for the LRU eviction
+                return value
+            except FileNotFoundError:
+                continue
+            except (OSError, ValueError, EOFError, pickle.UnpicklingError):
+                # Unreadable entry, drop it and recompute
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+        return None
+
+    def _write_disk(self, key, value):
+        extension = ".npy" if isinstance(value, np.ndarray) and value.dtype != object else ".pkl"
+        path = self._path(key, extension)
+        folder = os.path.dirname(path)
+        os.makedirs(folder, exist_ok=True)
+        # Write to a temporary file first so concurrent processes never see a partial result
+        fd, tmp_path = tempfile.mkstemp(dir=folder, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                if extension == ".npy":
+                    np.save(f, value, allow_pickle=False)
+                else:
+                    pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+                size = f.tell()
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        if self._disk_used is None or time.monotonic() - self._disk_scanned > RESCAN_SECONDS:
+            self._disk_used = sum(file_size for _, file_size, _ in self._disk_files())
+            self._disk_scanned = time.monotonic()
+        else:
+            self._disk_used += size
+        if self._disk_used > self.disk_bytes:
+            self._evict_disk()
+
+    def _disk_files(self):
+        """Yield (path, size, mtime) of every stored result."""
+        try:
+            folders = list(os.scandir(self.cache_dir))
+        except FileNotFoundError:
+            return
+        for folder in folders:
+            if not folder.is_dir():
+                continue
+            try:
+                for entry in os.scandir(folder.path):
+                    if entry.name.endswith((".npy", ".pkl")):
+                        try:
+                            stat = entry.stat()
+                        except FileNotFoundError:
+                            continue  # Evicted by another process meanwhile
+                        yield entry.path, stat.st_size, stat.st_mtime
+            except FileNotFoundError:
+                continue
+
+    def _evict_disk(self):
+        """Delete the least recently used files until the disk tier is at 90% of its budget."""
+        files = sorted(self._disk_files(), key=lambda item: item[2])
+        used = sum(size for _, size, _ in files)
+        target = self.disk_bytes * 0.9
+        for path, size, _ in files:
+            if used <= target:
+                break
+            try:
+                os.remove(path)
+                self.disk_evictions += 1
+            except FileNotFoundError:
+                pass  # Another process evicted it first
+            used -= size
+        self._disk_used = used
+        self._disk_scanned = time.monotonic()
+
+_default_cache = None
+
+def default_cache():
+    """Process-wide cache with the default budgets and directory."""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = ResultCache()
+    return _default_cache
+
+def resolve_cache(cache):
+    """Map the `cache` argument of the cached functions to a ResultCache (True means the default one)."""
+    return default_cache() if cache is True else cache
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or clear the shared result cache.")
+    parser.add_argument("--cache-dir", help=f"Cache directory (default: {default_cache_dir()})")
+    parser.add_argument("--clear", action="store_true", help="Delete every cached result")
+    args = parser.parse_args()
+
+    cache = ResultCache(cache_dir=args.cache_dir)
+    if args.clear:
+        cache.clear()
+        print(f"Cleared {cache.cache_dir}")
+        return
+    files = list(cache._disk_files())
+    total = sum(size for _, size, _ in files)
+    print(f"{cache.cache_dir}: {len(files)} results, {total / 1e6:.1f} MB "
+          f"of {cache.disk_bytes / 1e6:.0f} MB")
+
+if __name__ == "__main__":
+    main()
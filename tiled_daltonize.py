@@ -0,0 +1,156 @@
+#########  ***** TILED DALTONIZATION FOR IMAGES LARGER THAN RAM  ******  ##########
+
+#  daltonize() works on the whole image at once and its float64 intermediate is 8x the size
+#  of the input. This module runs the same transform tile by tile, so the temporaries stay
+#  proportional to the tile size. NPY, raw and (with the optional tifffile package installed,
+#  `pip install tifffile`) uncompressed TIFF files are read and written through memory maps.
+#  Other formats are decoded whole with PIL, which is only allowed up to MAX_DECODE_PIXELS;
+#  larger images have to be converted to .npy or .raw first.
+#  Every pixel is transformed independently, so the output is identical to the whole-image path.
+
+import argparse
+import os
+
+import numpy as np
+from PIL import Image
+
+from Daltonization import daltonize, deficiency_matrices
+
+try:
+    import tifffile
+except ImportError:  # Optional, only needed for memory-mapped TIFF files
+    tifffile = None
+
+DEFAULT_TILE_PIXELS = 1 << 20  # About 1 megapixel, roughly 24 MB of float64 scratch per tile
+MAX_DECODE_PIXELS = 100_000_000  # Largest input decoded whole, about 300 MB as RGB
+
+def iter_tiles(height, width, tile_pixels=DEFAULT_TILE_PIXELS):
+    """
+    Yield (row slice, column slice) pairs covering an image in row-major order.
+
+    Tiles span full rows (strips) unless a single row is larger than `tile_pixels`.
+    """
+    cols = max(1, min(width, tile_pixels))
+    rows = max(1, tile_pixels // cols)
+    for top in range(0, height, rows):
+        for left in range(0, width, cols):
+            yield slice(top, min(top + rows, height)), slice(left, min(left + cols, width))
+
+def daltonize_tiled(image_array, deficiency, out=None, tile_pixels=DEFAULT_TILE_PIXELS, lut_size=None,
+                    severity=1.0):
+    """
+    Apply daltonization tile by tile.
+
+    Parameters:
+        image_array (numpy array): RGB(A) image, may be a read-only memory map.
+        deficiency (str): Key of `deficiency_matrices`.
+        out (numpy array, optional): uint8 array of shape (H, W, 3) to write into, may be a
+            writable memory map. A new array is allocated when omitted.
+        tile_pixels (int): Upper bound for the number of pixels transformed at once.
+        lut_size (int, optional): Forwarded to `daltonize()`.
+        severity (float): Forwarded to `daltonize()`.
+
+    Returns:
+        numpy array: `out`, holding the daltonized image.
+    """
+    if deficiency not in deficiency_matrices:
+        raise ValueError("Invalid deficiency type.")
+
+    height, width = image_array.shape[:2]
+    if out is None:
+        out = np.empty((height, width, 3), dtype=np.uint8)
+
+    for rows, cols in iter_tiles(height, width, tile_pixels):
+        daltonize(image_array[rows, cols], deficiency, lut_size, severity, out=out[rows, cols])
+    return out
+
+def open_input(path, shape=None, max_decode_pixels=MAX_DECODE_PIXELS):
+    """
+    Open an image for tiled reading.
+
+    Parameters:
+        path (str): .npy, .raw/.rgb (requires `shape`), .tif/.tiff or any format PIL can read.
+        shape (tuple, optional): (height, width, channels) of a raw uint8 file.
+        max_decode_pixels (int): Largest image decoded whole when it cannot be memory-mapped.
+
+    Returns:
+        numpy array: A read-only memory map where the format allows it, otherwise the decoded image.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".npy":
+        return np.load(path, mmap_mode="r")
+    if extension in (".raw", ".rgb"):
+        if shape is None:
+            raise ValueError("Raw input needs an explicit (height, width, channels) shape.")
+        return np.memmap(path, dtype=np.uint8, mode="r", shape=tuple(shape))
+    if extension in (".tif", ".tiff") and tifffile is not None:
+        try:
+            return tifffile.memmap(path, mode="r")
+        except ValueError:
+            pass  # Compressed or tiled TIFF, cannot be mapped
+
+    hint = " (or install tifffile to map uncompressed TIFFs)" if extension in (".tif", ".tiff") and tifffile is None else ""
+    too_large = (f"{path} is too large to decode whole and cannot be memory-mapped; convert it to .npy "
+                 f"or .raw{hint} to process it tile by tile.")
+    try:
+        image = Image.open(path)  # Reads the header only
+    except Image.DecompressionBombError:
+        raise ValueError(too_large) from None
+    with image:
+        if image.width * image.height > max_decode_pixels:
+            raise ValueError(too_large)
+        return np.asarray(image.convert("RGB"))
+
+def open_output(path, shape):
+    """
+    Create an output buffer that writes straight to `path` where the format allows it.
+
+    Returns:
+        tuple: (uint8 array of `shape`, True if it is a memory map backed by `path`).
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".npy":
+        return np.lib.format.open_memmap(path, mode="w+", dtype=np.uint8, shape=shape), True
+    if extension in (".raw", ".rgb"):
+        return np.memmap(path, dtype=np.uint8, mode="w+", shape=shape), True
+    if extension in (".tif", ".tiff") and tifffile is not None:
+        return tifffile.memmap(path, shape=shape, dtype=np.uint8, photometric="rgb"), True
+    return np.empty(shape, dtype=np.uint8), False
+
+def daltonize_file(source, target, deficiency, shape=None, tile_pixels=DEFAULT_TILE_PIXELS, lut_size=None,
+                   severity=1.0):
+    """
+    Daltonize an image file tile by tile and write the result to `target`.
+
+    With memory-mapped input and output formats only one tile is in memory at a time;
+    otherwise the decoded image and the result are held, but never the float64 intermediate.
+    """
+    image_array = open_input(source, shape)
+    out, mapped = open_output(target, image_array.shape[:2] + (3,))
+    daltonize_tiled(image_array, deficiency, out, tile_pixels, lut_size, severity)
+
+    if mapped:
+        out.flush()
+    else:
+        Image.fromarray(out).save(target)
+    return target
+
+def main():
+    parser = argparse.ArgumentParser(description="Daltonize very large images tile by tile.")
+    parser.add_argument("source", help="Input image (.npy, .raw, .tif or any PIL format)")
+    parser.add_argument("target", help="Output image (.npy, .raw and .tif are written through memory maps)")
+    parser.add_argument("-d", "--deficiency", required=True, choices=list(deficiency_matrices))
+    parser.add_argument("--shape", type=int, nargs=3, metavar=("HEIGHT", "WIDTH", "CHANNELS"),
+                        help="Shape of a raw uint8 input")
+    parser.add_argument("--tile-pixels", type=int, default=DEFAULT_TILE_PIXELS,
+                        help="Maximum number of pixels transformed at once")
+    parser.add_argument("--lut-size", type=int, help="Use cached lookup tables of this size (e.g. 256)")
+    parser.add_argument("--severity", type=float, default=1.0, help="Severity for protan/deutan/tritan (0-1)")
+    args = parser.parse_args()
+
+    daltonize_file(args.source, args.target, args.deficiency, args.shape, args.tile_pixels, args.lut_size,
+                   args.severity)
+    print(f"Saved {args.target}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+#########  ***** THREADED CAPTURE / PROCESS / DISPLAY PIPELINE  ******  ##########
+
+#  Building blocks for running the color recognition tool on live video. Capture and
+#  processing run in their own threads and hand frames over through small queues that
+#  drop the oldest frame when full, so a slow stage shows the newest frame instead of lagging.
+
+import glob
+import os
+import queue
+import threading
+import time
+
+import cv2
+
+FRAME_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp", ".tif", ".tiff")
+
+class DropOldestQueue(queue.Queue):
+    """Bounded queue whose `put_latest()` discards the oldest item instead of blocking."""
+
+    def __init__(self, maxsize=2):
+        super().__init__(maxsize)
+        self.dropped = 0
+
+    def put_latest(self, item):
+        while True:
+            try:
+                self.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    self.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+
+class StageStats:
+    """Smoothed per-stage timings (milliseconds) and frame rate, safe to update from several threads."""
+
+    def __init__(self, smoothing=0.9):
+        self.smoothing = smoothing
+        self.stage_ms = {}
+        self.fps = 0.0
+        self._last_frame = None
+        self._lock = threading.Lock()
+
+    def record(self, stage, seconds):
+        """Add one measurement for `stage`."""
+        ms = seconds * 1000
+        with self._lock:
+            previous = self.stage_ms.get(stage)
+            self.stage_ms[stage] = ms if previous is None else previous * self.smoothing + ms * (1 - self.smoothing)
+
+    def tick(self):
+        """Mark one displayed frame and update the frame rate."""
+        now = time.perf_counter()
+        with self._lock:
+            if self._last_frame is not None and now > self._last_frame:
+                fps = 1.0 / (now - self._last_frame)
+                self.fps = fps if self.fps == 0 else self.fps * self.smoothing + fps * (1 - self.smoothing)
+            self._last_frame = now
+
+    def lines(self):
+        """Return the overlay text, one string per line."""
+        with self._lock:
+            stages = "  ".join(f"{name}: {ms:.1f}ms" for name, ms in self.stage_ms.items())
+            return [f"FPS: {self.fps:.1f}", stages]
+
+def draw_stats_overlay(frame, stats, origin=(10, 60), dropped=0):
+    """Draw the frame rate, per-stage timings and dropped frame count onto `frame`."""
+    lines = stats.lines() + [f"Dropped: {dropped}"]
+    x, y = origin
+    for line in lines:
+        cv2.putText(frame, line, (x, y), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 255), 2)
+        y += 25
+    return frame
+
+def frame_source(source, fps=None):
+    """
+    Yield BGR frames from a webcam index, a video file or a directory of frames.
+
+    Parameters:
+        source (int or str): Webcam index (or its string form), video file or directory.
+        fps (float, optional): Playback rate for files and directories. Defaults to the
+            video's own rate, or 30 for directories. Webcams are paced by the device.
+    """
+    if isinstance(source, str) and os.path.isdir(source):
+        paths = sorted(p for p in glob.glob(os.path.join(source, "*")) if p.lower().endswith(FRAME_EXTENSIONS))
+        interval = 1.0 / (fps or 30)
+        for path in paths:
+            started = time.perf_counter()
+            frame = cv2.imread(path)
+            if frame is None:
+                print(f"Error: Unable to load image at {path}")
+                continue
+            yield frame
+            time.sleep(max(0.0, interval - (time.perf_counter() - started)))
+        return
+
+    is_camera = isinstance(source, int) or (isinstance(source, str) and source.isdigit())
+    capture = cv2.VideoCapture(int(source) if is_camera else source)
+    if not capture.isOpened():
+        raise ValueError(f"Unable to open video source {source!r}")
+
+    interval = 0.0
+    if not is_camera:
+        interval = 1.0 / (fps or capture.get(cv2.CAP_PROP_FPS) or 30)
+    try:
+        while True:
+            started = time.perf_counter()
+            ok, frame = capture.read()
+            if not ok:
+                break
+            yield frame
+            if interval:
+                time.sleep(max(0.0, interval - (time.perf_counter() - started)))
+    finally:
+        capture.release()
+
+def start_capture_thread(source, output, stats, stop_event, fps=None):
+    """
+    Read frames from `source` into `output` until the source ends or `stop_event` is set.
+
+    Items are (frame, capture timestamp); None is queued once the source is exhausted.
+    """
+    def run():
+        frames = frame_source(source, fps)
+        while not stop_event.is_set():
+            started = time.perf_counter()
+            frame = next(frames, None)
+            if frame is None:
+                break
+            stats.record("capture", time.perf_counter() - started)
+            output.put_latest((frame, started))
+        output.put_latest(None)
+
+    thread = threading.Thread(target=run, name="capture", daemon=True)
+    thread.start()
+    return thread
+
+def start_process_thread(process, source_queue, output, stats, stop_event):
+    """
+    Apply `process(frame)` to frames from `source_queue` and pass the results on.
+
+    Items are (original frame, processed frame, capture timestamp); None is forwarded.
+    """
+    def run():
+        while not stop_event.is_set():
+            try:
+                item = source_queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if item is None:
+                output.put_latest(None)
+                break
+            frame, captured = item
+            started = time.perf_counter()
+            processed = process(frame)
+            stats.record("process", time.perf_counter() - started)
+            output.put_latest((frame, processed, captured))
+
+    thread = threading.Thread(target=run, name="process", daemon=True)
+    thread.start()
+    return thread